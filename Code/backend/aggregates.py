@@ -0,0 +1,274 @@
+"""
+Per-office aggregate counters for application statistics.
+
+Database mutations apply each application to its office's counters as a
+delta, so stats endpoints read a handful of numbers instead of scanning
+every application on each request. Processing times are kept as a sparse
+histogram of whole days, which gives exact percentiles without storing or
+sorting individual durations.
+"""
+
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+PENDING_STATUSES = ("Submitted", "In Progress")
+
+OfficeKey = Tuple[str, str]
+
+# (submitted, completed, rejected) as epoch seconds, None where missing or unparseable
+Timestamps = Tuple[Optional[float], Optional[float], Optional[float]]
+
+PERCENTILES = (50, 90, 99)
+
+
+def office_key(app: dict) -> OfficeKey:
+    """(target_office_level, target_office_name) of an application"""
+    return (app.get("target_office_level"), app.get("target_office_name"))
+
+
+def parse_timestamp(value) -> Optional[float]:
+    """Epoch seconds of an ISO timestamp or datetime (naive times are UTC)"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def application_times(app: dict) -> Timestamps:
+    """Parse an application's submitted, completed and rejected dates once"""
+    return (
+        parse_timestamp(app.get("submitted_date")),
+        parse_timestamp(app.get("completed_date")),
+        parse_timestamp(app.get("rejected_date")),
+    )
+
+
+def processing_days(app: dict, times: Timestamps = None) -> Optional[int]:
+    """Whole days from submission to completion, or None if not completed.
+
+    Pass the application's already parsed times to skip parsing.
+    """
+    if app.get("status") != "Completed" or not app.get("completed_date"):
+        return None
+    submitted, completed, _ = times if times is not None else application_times(app)
+    if submitted is None or completed is None:
+        return None
+    return int((completed - submitted) // 86400)
+
+
+class OfficeAggregate:
+    """Status, service type and processing time counters for a set of applications"""
+
+    __slots__ = ("total", "status_counts", "type_counts", "rejected",
+                 "processing_days_sum", "processing_count", "processing_histogram")
+
+    def __init__(self):
+        self.total = 0
+        self.status_counts: Dict[str, int] = {}
+        self.type_counts: Dict[str, int] = {}
+        self.rejected = 0
+        self.processing_days_sum = 0
+        self.processing_count = 0
+        # days -> number of completed applications; published baselines only
+        # contribute to the mean, so percentiles cover individual records
+        self.processing_histogram: Dict[int, int] = {}
+
+    @classmethod
+    def from_summary(cls, summary: dict) -> "OfficeAggregate":
+        """Build counters from a published summary (totals, not individual records)"""
+        aggregate = cls()
+        total = summary.get("total_applications", 0)
+        completed = summary.get("completed", 0)
+        pending = summary.get("pending", 0)
+        in_progress = summary.get("in_progress", 0)
+        aggregate.total = total
+        for status, count in (("Completed", completed),
+                              ("In Progress", in_progress),
+                              ("Submitted", pending - in_progress),
+                              ("Rejected", total - completed - pending)):
+            if count > 0:
+                aggregate.status_counts[status] = count
+        aggregate.type_counts = dict(summary.get("applications_by_type", {}))
+        aggregate.rejected = summary.get("rejected", 0)
+        if "avg_processing_time" in summary and completed > 0:
+            aggregate.processing_days_sum = summary["avg_processing_time"] * completed
+            aggregate.processing_count = completed
+        return aggregate
+
+    def copy(self) -> "OfficeAggregate":
+        aggregate = OfficeAggregate()
+        aggregate.merge(self)
+        return aggregate
+
+    def apply(self, app: dict, sign: int = 1, days: Optional[int] = None):
+        """Add (sign=1) or remove (sign=-1) one application.
+
+        days is the application's processing_days(), computed by the caller.
+        """
+        self.total += sign
+        _bump(self.status_counts, app.get("status"), sign)
+        _bump(self.type_counts, app.get("service_type", "unknown"), sign)
+        if app.get("status") == "Rejected" or app.get("approved") == False:
+            self.rejected += sign
+        if days is not None:
+            self.processing_days_sum += sign * days
+            self.processing_count += sign
+            _bump(self.processing_histogram, days, sign)
+
+    def apply_counts(self, status: str, service_type: str, count: int, rejected: int = 0,
+                     days: Optional[int] = None):
+        """Add a pre-counted group of applications sharing status, service type
+        and processing days"""
+        self.total += count
+        _bump(self.status_counts, status, count)
+        _bump(self.type_counts, service_type, count)
+        self.rejected += rejected
+        if days is not None:
+            self.processing_days_sum += days * count
+            self.processing_count += count
+            _bump(self.processing_histogram, days, count)
+
+    def merge(self, other: "OfficeAggregate", sign: int = 1):
+        """Add (sign=1) or subtract (sign=-1) another aggregate"""
+        self.total += sign * other.total
+        for status, count in other.status_counts.items():
+            _bump(self.status_counts, status, sign * count)
+        for service_type, count in other.type_counts.items():
+            _bump(self.type_counts, service_type, sign * count)
+        self.rejected += sign * other.rejected
+        self.processing_days_sum += sign * other.processing_days_sum
+        self.processing_count += sign * other.processing_count
+        for days, count in other.processing_histogram.items():
+            _bump(self.processing_histogram, days, sign * count)
+
+    @property
+    def completed(self) -> int:
+        return self.status_counts.get("Completed", 0)
+
+    @property
+    def in_progress(self) -> int:
+        return self.status_counts.get("In Progress", 0)
+
+    @property
+    def pending(self) -> int:
+        return sum(self.status_counts.get(status, 0) for status in PENDING_STATUSES)
+
+    @property
+    def efficiency(self) -> float:
+        return (self.completed / self.total * 100) if self.total > 0 else 0
+
+    def avg_processing_time(self, default: float = 0) -> float:
+        if self.processing_count <= 0:
+            return default
+        return self.processing_days_sum / self.processing_count
+
+    def processing_percentile(self, percent: float) -> Optional[int]:
+        """Processing days at the given percentile (nearest rank), or None"""
+        count = sum(self.processing_histogram.values())
+        if count <= 0:
+            return None
+        rank = max(1, -(-count * percent // 100))
+        seen = 0
+        for days in sorted(self.processing_histogram):
+            seen += self.processing_histogram[days]
+            if seen >= rank:
+                return days
+        return days
+
+    def processing_percentiles(self) -> Dict[str, Optional[int]]:
+        """{"processing_time_p50": ..., "processing_time_p90": ..., "processing_time_p99": ...}"""
+        return {
+            f"processing_time_p{percent}": self.processing_percentile(percent)
+            for percent in PERCENTILES
+        }
+
+    def to_stats(self, office_id: str, office_name: str, office_level: str,
+                 default_avg_time: float = 0) -> dict:
+        """Render as a SubordinateOfficeStats dict"""
+        return {
+            "office_id": office_id,
+            "office_name": office_name,
+            "office_level": office_level,
+            "total_applications": self.total,
+            "completed": self.completed,
+            "pending": self.pending,
+            "rejected": self.rejected,
+            "in_progress": self.in_progress,
+            "efficiency": round(self.efficiency, 2),
+            "avg_processing_time": round(self.avg_processing_time(default_avg_time), 1),
+            "applications_by_type": dict(self.type_counts),
+            **self.processing_percentiles()
+        }
+
+
+class AggregateStore:
+    """OfficeAggregate per (office_level, office_name), maintained as deltas"""
+
+    def __init__(self):
+        self._offices: Dict[OfficeKey, OfficeAggregate] = {}
+
+    def add(self, app: dict, days: Optional[int] = None):
+        key = office_key(app)
+        aggregate = self._offices.get(key)
+        if aggregate is None:
+            aggregate = self._offices[key] = OfficeAggregate()
+        aggregate.apply(app, 1, days)
+
+    def remove(self, app: dict, days: Optional[int] = None):
+        aggregate = self._offices.get(office_key(app))
+        if aggregate is None:
+            return
+        aggregate.apply(app, -1, days)
+        if aggregate.total <= 0:
+            del self._offices[office_key(app)]
+
+    def add_counts(self, key: OfficeKey, *counts, **kwargs):
+        """Add a pre-counted group to an office, see OfficeAggregate.apply_counts"""
+        aggregate = self._offices.get(key)
+        if aggregate is None:
+            aggregate = self._offices[key] = OfficeAggregate()
+        aggregate.apply_counts(*counts, **kwargs)
+
+    def load(self, aggregates: Dict[OfficeKey, OfficeAggregate]):
+        """Replace every office's counters with precomputed ones"""
+        self._offices = dict(aggregates)
+
+    def state(self) -> Dict[OfficeKey, OfficeAggregate]:
+        """Counters for a snapshot; restore them with load()"""
+        return self._offices
+
+    def rebuild(self, apps: Iterable[dict],
+                days_func: Callable[[dict], Optional[int]] = processing_days):
+        self._offices = {}
+        for app in apps:
+            self.add(app, days_func(app))
+
+    def get(self, office_level: str, office_name: str) -> OfficeAggregate:
+        """Aggregate for one office (empty if it has no applications)"""
+        return self._offices.get((office_level, office_name)) or OfficeAggregate()
+
+    def offices(self):
+        """(office_key, aggregate) pairs for every office with applications"""
+        return self._offices.items()
+
+    def combined(self, predicate) -> OfficeAggregate:
+        """Sum of the aggregates of every office whose key matches predicate"""
+        result = OfficeAggregate()
+        for key, aggregate in self._offices.items():
+            if predicate(key):
+                result.merge(aggregate)
+        return result
+
+
+def _bump(counts: Dict, key, delta: int):
+    value = counts.get(key, 0) + delta
+    if value:
+        counts[key] = value
+    else:
+        counts.pop(key, None)
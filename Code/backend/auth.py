@@ -1,16 +1,32 @@
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
+import asyncio
+import threading
+import time
 from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
 
+import metrics
+
 # Security settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production-make-it-long-and-random")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+# bcrypt work runs in a pool so it never blocks the event loop.
+# bcrypt releases the GIL, so threads scale across cores; "process" is available
+# for builds where it does not.
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+# Verified tokens kept in memory (0 disables the cache)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+
 # HTTP Bearer token scheme
 security = HTTPBearer()
 
@@ -36,6 +52,51 @@ def get_password_hash(password: str) -> str:
         print(f"Password hashing error: {e}")
         raise
 
+_password_executor: Optional[Executor] = None
+
+def get_password_executor() -> Executor:
+    """Get (creating on first use) the pool that runs bcrypt"""
+    global _password_executor
+    if _password_executor is None:
+        if PASSWORD_HASH_EXECUTOR == "process":
+            _password_executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        else:
+            _password_executor = ThreadPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt"
+            )
+    return _password_executor
+
+def shutdown_password_executor():
+    """Stop the bcrypt pool (called on application shutdown)"""
+    global _password_executor
+    if _password_executor is not None:
+        _password_executor.shutdown(wait=False)
+        _password_executor = None
+
+def _timed_call(func, *args):
+    """(result, seconds) of func(*args); runs in the pool, so it also works across processes"""
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    result, seconds = await loop.run_in_executor(
+        get_password_executor(), _timed_call, verify_password, plain_password, hashed_password
+    )
+    metrics.bcrypt_seconds.observe(seconds, "verify")
+    return result
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    result, seconds = await loop.run_in_executor(
+        get_password_executor(), _timed_call, get_password_hash, password
+    )
+    metrics.bcrypt_seconds.observe(seconds, "hash")
+    return result
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -60,9 +121,81 @@ def decode_token(token: str) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+class TokenCache:
+    """Bounded LRU of verified tokens and the users they resolve to.
+
+    Entries live until the token's exp, and are dropped when the user
+    record changes so a cached user is never staler than the database.
+    """
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()  # token -> (user, exp)
+        self._tokens_by_user = {}  # user_id -> set of tokens
+        self._lock = threading.Lock()
+    
+    def get(self, token: str) -> Optional[dict]:
+        """Cached user for a token, or None if absent or expired"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user, exp = entry
+            if exp is not None and exp <= time.time():
+                self._discard(token)
+                return None
+            self._entries.move_to_end(token)
+            return user
+    
+    def put(self, token: str, payload: dict, user: dict):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._discard(token)
+            self._entries[token] = (user, payload.get("exp"))
+            self._tokens_by_user.setdefault(user["id"], set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+    
+    def invalidate_user(self, user_id: Optional[str] = None):
+        """Drop entries for one user, or every entry when user_id is None"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+                self._tokens_by_user.clear()
+                return
+            for token in self._tokens_by_user.pop(user_id, ()):
+                self._entries.pop(token, None)
+    
+    def _discard(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            tokens = self._tokens_by_user.get(entry[0]["id"])
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_by_user[entry[0]["id"]]
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+def _get_db():
+    """Database with the token cache subscribed to user changes"""
+    from database import db
+    if token_cache.invalidate_user not in db.user_listeners:
+        db.user_listeners.append(token_cache.invalidate_user)
+    return db
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get the current authenticated user from the token"""
-    token = credentials.credentials
+    return user_from_token(credentials.credentials)
+
+def user_from_token(token: str):
+    """Resolve a bearer token to its user (for callers that cannot send headers)"""
+    db = _get_db()
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+    
     payload = decode_token(token)
     
     user_id = payload.get("sub")
@@ -73,7 +206,6 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    from database import db
     user = db.get_user_by_id(user_id)
     if user is None:
         raise HTTPException(
@@ -82,6 +214,7 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    token_cache.put(token, payload, user)
     return user
 
 def require_official(current_user: dict = Depends(get_current_user)):
@@ -0,0 +1,360 @@
+"""
+Benchmark the hot endpoints against a generated dataset.
+
+Seeds a dataset with generate_sample_applications.py (cached under
+data/bench), then for every storage configuration drives the app either
+in-process through an ASGI client, through a local uvicorn server, or both,
+and reports throughput and p50/p95/p99 latency per endpoint:
+
+    python benchmark.py --applications 500000 --backend json sqlite --persistence json flush
+    python benchmark.py --env TOKEN_CACHE_SIZE=0 --output results/no-token-cache.json
+    python benchmark.py --compare results/last-release.json
+    python benchmark.py --applications 1000000 --citizens 100000 --startup 3 --mode
+
+--startup N times loading and indexing the data (`database.db.load()`) N times
+for the json backend with and without the binary snapshot and keeps the
+best of each. Each configuration runs in a fresh process because the database is
+configured from the environment at import time. Results are written as JSON
+so runs can be compared across releases with --compare.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (method, path, account used)
+ENDPOINTS = {
+    "login": ("POST", "/api/auth/login", "office"),
+    "get_hierarchy_stats": ("GET", "/api/monitor/hierarchy-stats", "monitor"),
+    "get_office_applications": ("GET", "/api/office/applications", "office"),
+    "get_received_messages": ("GET", "/api/messages/received", "office"),
+}
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], errors: int, seconds: float) -> dict:
+    latencies = sorted(latencies)
+    to_ms = lambda value: round(value * 1000, 3)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "throughput": round(len(latencies) / seconds, 1) if seconds > 0 else 0.0,
+        "p50_ms": to_ms(percentile(latencies, 50)),
+        "p95_ms": to_ms(percentile(latencies, 95)),
+        "p99_ms": to_ms(percentile(latencies, 99)),
+        "max_ms": to_ms(latencies[-1]) if latencies else 0.0,
+    }
+
+
+# Dataset
+def dataset_dir(args) -> str:
+    name = f"a{args.applications}-c{args.citizens}-m{args.messages}-s{args.seed}"
+    return os.path.abspath(os.path.join(args.data_root, name))
+
+
+def ensure_dataset(args) -> dict:
+    """Generate the dataset unless a complete one is cached; return its manifest"""
+    directory = dataset_dir(args)
+    manifest_path = os.path.join(directory, "dataset.json")
+    if not os.path.exists(manifest_path):
+        print(f"Seeding {directory}...")
+        subprocess.run([
+            sys.executable, os.path.join(BACKEND_DIR, "generate_sample_applications.py"),
+            "--applications", str(args.applications), "--citizens", str(args.citizens),
+            "--messages", str(args.messages), "--seed", str(args.seed),
+            "--password", args.password, "--out", directory,
+        ], cwd=BACKEND_DIR, check=True)
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+# Load generation
+async def login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    response = await client.post("/api/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def run_endpoints(client: httpx.AsyncClient, plan: dict) -> Dict[str, dict]:
+    """Hit each endpoint with plan["concurrency"] workers for plan["duration"] seconds"""
+    accounts = {
+        "office": plan["office_email"],
+        "monitor": plan["monitor_email"],
+    }
+    tokens = {name: await login(client, email, plan["password"]) for name, email in accounts.items()}
+
+    results = {}
+    for name in plan["endpoints"]:
+        method, path, account = ENDPOINTS[name]
+        if name == "login":
+            request = {"json": {"email": accounts[account], "password": plan["password"]}}
+        else:
+            request = {"headers": {"Authorization": f"Bearer {tokens[account]}"}}
+
+        for _ in range(plan["warmup"]):
+            await client.request(method, path, **request)
+
+        latencies: List[float] = []
+        errors = 0
+        started = time.perf_counter()
+        deadline = started + plan["duration"]
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                sent = time.perf_counter()
+                response = await client.request(method, path, **request)
+                await response.aread()
+                latencies.append(time.perf_counter() - sent)
+                if response.status_code >= 400:
+                    errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(plan["concurrency"])))
+        results[name] = summarize(latencies, errors, time.perf_counter() - started)
+        print(f"    {name:<26} {results[name]['throughput']:>9.1f} req/s  "
+              f"p50 {results[name]['p50_ms']:>8.2f}ms  p95 {results[name]['p95_ms']:>8.2f}ms  "
+              f"p99 {results[name]['p99_ms']:>8.2f}ms", flush=True)
+    return results
+
+
+async def run_asgi(plan: dict) -> Dict[str, dict]:
+    """In-process run; the caller has already set up the environment"""
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        return await run_endpoints(client, plan)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_uvicorn(plan: dict, env: dict, startup_timeout: float) -> Dict[str, dict]:
+    """Start a local uvicorn server with env and drive it over HTTP"""
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            try:
+                if httpx.get(f"{base_url}/health").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("uvicorn did not start in time")
+            time.sleep(0.2)
+
+        async def drive():
+            limits = httpx.Limits(max_connections=plan["concurrency"])
+            async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+                return await run_endpoints(client, plan)
+
+        return asyncio.run(drive())
+    finally:
+        server.terminate()
+        server.wait()
+
+
+# Configurations
+def configurations(args) -> List[dict]:
+    """Every backend/persistence combination to run (persistence only applies to json)"""
+    configs = []
+    for backend in args.backend:
+        for persistence in (args.persistence if backend == "json" else ["-"]):
+            label = backend if backend != "json" else f"json-{persistence}"
+            configs.append({"label": label, "backend": backend, "persistence": persistence})
+    return configs
+
+
+def config_env(args, config: dict) -> dict:
+    directory = dataset_dir(args)
+    env = dict(os.environ)
+    env.update({
+        "DB_BACKEND": config["backend"],
+        "DB_DATA_DIR": directory,
+        "DB_SQLITE_PATH": os.path.join(directory, "sarkaha.db"),
+    })
+    if config["persistence"] != "-":
+        env["DB_PERSISTENCE_MODE"] = config["persistence"]
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+STARTUP_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import database
+database.db.load()
+print(json.dumps({"seconds": time.perf_counter() - started, "applications": len(database.db.applications)}))
+"""
+
+
+def measure_startup(args) -> Dict[str, dict]:
+    """Best-of-N time to import and load the database from JSON and from the snapshots"""
+    env = config_env(args, {"backend": "json", "persistence": "json"})
+    # Write a snapshot that matches the current JSON files
+    subprocess.run([sys.executable, "-c", "import database; database.db.load(); database.db.write_snapshot()"],
+                   cwd=BACKEND_DIR, env={**env, "DB_SNAPSHOT": "true"}, check=True)
+    results = {}
+    for label, snapshot in (("json", "false"), ("snapshot", "true")):
+        timings = []
+        for _ in range(args.startup):
+            output = subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT], cwd=BACKEND_DIR,
+                env={**env, "DB_SNAPSHOT": snapshot}, stdout=subprocess.PIPE, text=True, check=True
+            ).stdout
+            timings.append(json.loads(output.rstrip("\n").splitlines()[-1])["seconds"])
+        results[label] = {"best_s": round(min(timings), 3), "runs_s": [round(t, 3) for t in timings]}
+        print(f"    startup from {label:<9} best {results[label]['best_s']:>8.3f}s", flush=True)
+    if results["snapshot"]["best_s"]:
+        speedup = results["json"]["best_s"] / results["snapshot"]["best_s"]
+        print(f"    snapshot speedup x{speedup:.2f}")
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline_path: str):
+    """Print throughput and p99 against an earlier results file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} ({baseline.get('revision')}):")
+    for label, modes in results["runs"].items():
+        for mode, endpoints in modes.items():
+            for name, current in endpoints.items():
+                before = baseline.get("runs", {}).get(label, {}).get(mode, {}).get(name)
+                if not before:
+                    continue
+                throughput = current["throughput"] / before["throughput"] if before["throughput"] else 0
+                p99 = current["p99_ms"] / before["p99_ms"] if before["p99_ms"] else 0
+                print(f"  {label:<12} {mode:<8} {name:<26} throughput x{throughput:.2f}  p99 x{p99:.2f}")
+    for label, current in results.get("startup", {}).items():
+        before = baseline.get("startup", {}).get(label)
+        if before and before["best_s"]:
+            print(f"  startup from {label:<9} x{current['best_s'] / before['best_s']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot API endpoints")
+    parser.add_argument("--applications", type=int, default=100000)
+    parser.add_argument("--citizens", type=int, default=20000)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-root", default=os.path.join(BACKEND_DIR, "data", "bench"))
+    parser.add_argument("--password", default="password123")
+    parser.add_argument("--backend", nargs="+", choices=["json", "sqlite"], default=["json"])
+    parser.add_argument("--persistence", nargs="+", choices=["json", "wal", "flush"], default=["json"],
+                        help="persistence modes to run for the json backend")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the app, e.g. TOKEN_CACHE_SIZE=0")
+    parser.add_argument("--mode", nargs="*", choices=["asgi", "uvicorn"], default=["asgi", "uvicorn"],
+                        help="how to drive the endpoints (none to only measure startup)")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=3, help="unmeasured requests per endpoint")
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    parser.add_argument("--startup", type=int, default=0, metavar="N",
+                        help="also time N json-backend startups with and without the snapshot")
+    parser.add_argument("--output", help="results file (default: data/bench/results-<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--asgi-worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child process of an asgi run: environment is set, print results as JSON
+    if args.asgi_worker:
+        results = asyncio.run(run_asgi(json.loads(args.asgi_worker)))
+        print(json.dumps(results))
+        return
+
+    manifest = ensure_dataset(args)
+    plan = {
+        "office_email": manifest["busiest_offices"][0]["email"],
+        "monitor_email": manifest["national_monitor"],
+        "password": args.password,
+        "endpoints": args.endpoints,
+        "duration": args.duration,
+        "concurrency": args.concurrency,
+        "warmup": args.warmup,
+    }
+
+    results = {
+        "started": datetime.utcnow().isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dataset": manifest["counts"],
+        "plan": {k: v for k, v in plan.items() if k != "password"},
+        "env": args.env,
+        "runs": {},
+    }
+    if args.startup:
+        print("startup", flush=True)
+        results["startup"] = measure_startup(args)
+    for config in configurations(args):
+        env = config_env(args, config)
+        runs = results["runs"].setdefault(config["label"], {})
+        for mode in args.mode:
+            print(f"{config['label']} / {mode}", flush=True)
+            if mode == "asgi":
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--asgi-worker", json.dumps(plan)],
+                    cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE, text=True, check=True
+                ).stdout
+                lines = output.rstrip("\n").splitlines()
+                print("\n".join(lines[:-1]))
+                runs[mode] = json.loads(lines[-1])
+            else:
+                runs[mode] = run_uvicorn(plan, env, args.startup_timeout)
+
+    output = args.output or os.path.join(
+        args.data_root, f"results-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
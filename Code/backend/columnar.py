@@ -0,0 +1,248 @@
+"""
+Columnar mirror of the applications collection for vectorized stats.
+
+Office, status and service type are dictionary-encoded into integer
+arrays, and submission/completion times and processing days are kept as
+float arrays (NaN when missing), so whole-collection group-bys run as a
+few NumPy bincount/unique calls instead of a Python loop over dicts. The
+Database keeps it in sync on every application change and uses it to
+build the office aggregates at startup and for multi-office rollups.
+
+NumPy is optional: without it available() is False and the Database
+falls back to the per-record counters.
+"""
+
+from typing import Dict, Hashable, Iterable, List, Optional
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from aggregates import OfficeAggregate, OfficeKey, Timestamps, office_key
+
+COLUMNAR_STATS = os.getenv("DB_COLUMNAR_STATS", "true").lower() == "true"
+
+
+def available() -> bool:
+    """True when columnar stats are enabled and NumPy is installed"""
+    return COLUMNAR_STATS and np is not None
+
+
+class ValueDictionary:
+    """Dictionary encoding: each distinct value gets a small integer code"""
+
+    def __init__(self):
+        self.codes: Dict[Hashable, int] = {}
+        self.values: List[Hashable] = []
+
+    def encode(self, value: Hashable) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class ColumnarApplications:
+    """Applications as parallel NumPy columns, one row per application"""
+
+    COLUMNS = {
+        "office": "int32",
+        "status": "int32",
+        "service_type": "int32",
+        "rejected": "bool",
+        "submitted": "float64",
+        "completed": "float64",
+        "days": "float64",
+    }
+
+    def __init__(self, capacity: int = 1024):
+        self.offices = ValueDictionary()
+        self.statuses = ValueDictionary()
+        self.service_types = ValueDictionary()
+        self.row_of: Dict[str, int] = {}
+        self.ids: List[str] = []
+        self.size = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        self.capacity = max(capacity, 16)
+        for name, dtype in self.COLUMNS.items():
+            setattr(self, name, np.zeros(self.capacity, dtype=dtype))
+
+    def _grow(self, needed: int):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+        self.capacity = capacity
+
+    def _encode(self, app: dict, times: Timestamps, days: Optional[int]) -> tuple:
+        submitted, completed, _ = times
+        return (
+            self.offices.encode(office_key(app)),
+            self.statuses.encode(app.get("status")),
+            self.service_types.encode(app.get("service_type", "unknown")),
+            app.get("status") == "Rejected" or app.get("approved") == False,
+            np.nan if submitted is None else submitted,
+            np.nan if completed is None else completed,
+            np.nan if days is None else days,
+        )
+
+    def put(self, app_id: str, app: dict, times: Timestamps, days: Optional[int]):
+        """Insert or overwrite the row of an application"""
+        row = self.row_of.get(app_id)
+        if row is None:
+            if self.size >= self.capacity:
+                self._grow(self.size + 1)
+            row = self.row_of[app_id] = self.size
+            self.ids.append(app_id)
+            self.size += 1
+        for name, value in zip(self.COLUMNS, self._encode(app, times, days)):
+            getattr(self, name)[row] = value
+
+    def remove(self, app_id: str):
+        """Drop an application's row by moving the last row into its place"""
+        row = self.row_of.pop(app_id, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            moved_id = self.ids[last]
+            for name in self.COLUMNS:
+                column = getattr(self, name)
+                column[row] = column[last]
+            self.ids[row] = moved_id
+            self.row_of[moved_id] = row
+        self.ids.pop()
+        self.size -= 1
+
+    def rebuild(self, apps: Dict[str, dict], times: Dict[str, Timestamps], days_func):
+        """Load a whole collection, one column at a time"""
+        self.offices = ValueDictionary()
+        self.statuses = ValueDictionary()
+        self.service_types = ValueDictionary()
+        self.ids = list(apps)
+        self.row_of = {app_id: row for row, app_id in enumerate(self.ids)}
+        self.size = len(self.ids)
+        self._allocate(self.size * 2)
+        records = list(apps.values())
+        nan = float("nan")
+        columns = {
+            "office": [self.offices.encode(office_key(app)) for app in records],
+            "status": [self.statuses.encode(app.get("status")) for app in records],
+            "service_type": [self.service_types.encode(app.get("service_type", "unknown"))
+                             for app in records],
+            "rejected": [app.get("status") == "Rejected" or app.get("approved") == False
+                         for app in records],
+            "submitted": [times[app_id][0] for app_id in self.ids],
+            "completed": [times[app_id][1] for app_id in self.ids],
+            "days": [days_func(app) for app in records],
+        }
+        for name, values in columns.items():
+            if self.COLUMNS[name] == "float64":
+                values = [nan if value is None else value for value in values]
+            getattr(self, name)[:self.size] = values
+
+    def office_rows(self, offices: Iterable[OfficeKey] = None, office_levels: Iterable[str] = None):
+        """Boolean mask of rows at the given offices or office levels (all rows if neither)"""
+        office = self.office[:self.size]
+        if offices is None and office_levels is None:
+            return np.ones(self.size, dtype=bool)
+        if offices is not None:
+            codes = [self.offices.codes[key] for key in offices if key in self.offices.codes]
+        else:
+            levels = set(office_levels)
+            codes = [code for code, key in enumerate(self.offices.values) if key[0] in levels]
+        return np.isin(office, np.array(codes, dtype=office.dtype))
+
+    def aggregate(self, mask=None) -> OfficeAggregate:
+        """Combined counters for the selected rows"""
+        if mask is None:
+            mask = np.ones(self.size, dtype=bool)
+        status = self.status[:self.size][mask]
+        service_type = self.service_type[:self.size][mask]
+        days = self.days[:self.size][mask]
+        aggregate = OfficeAggregate()
+        aggregate.total = int(status.size)
+        aggregate.status_counts = _count_dict(self.statuses, np.bincount(status, minlength=len(self.statuses)))
+        aggregate.type_counts = _count_dict(
+            self.service_types, np.bincount(service_type, minlength=len(self.service_types))
+        )
+        aggregate.rejected = int(np.count_nonzero(self.rejected[:self.size][mask]))
+        _add_days(aggregate, days[~np.isnan(days)])
+        return aggregate
+
+    def office_aggregates(self, mask=None) -> Dict[OfficeKey, OfficeAggregate]:
+        """Counters per office for the selected rows, via one bincount per breakdown"""
+        if mask is None:
+            mask = np.ones(self.size, dtype=bool)
+        office = self.office[:self.size][mask].astype(np.int64)
+        n_offices = len(self.offices)
+        n_statuses, n_types = len(self.statuses), len(self.service_types)
+        status_counts = np.bincount(
+            office * n_statuses + self.status[:self.size][mask], minlength=n_offices * n_statuses
+        ).reshape(n_offices, n_statuses)
+        type_counts = np.bincount(
+            office * n_types + self.service_type[:self.size][mask], minlength=n_offices * n_types
+        ).reshape(n_offices, n_types)
+        rejected = np.bincount(office, weights=self.rejected[:self.size][mask], minlength=n_offices)
+        totals = status_counts.sum(axis=1)
+
+        result = {}
+        for code in np.flatnonzero(totals):
+            aggregate = OfficeAggregate()
+            aggregate.total = int(totals[code])
+            aggregate.status_counts = _count_dict(self.statuses, status_counts[code])
+            aggregate.type_counts = _count_dict(self.service_types, type_counts[code])
+            aggregate.rejected = int(rejected[code])
+            result[self.offices.values[code]] = aggregate
+
+        days = self.days[:self.size][mask]
+        completed = ~np.isnan(days)
+        if completed.any():
+            day = days[completed].astype(np.int64)
+            first_day = int(day.min())
+            span = int(day.max()) - first_day + 1
+            keys = office[completed] * span + (day - first_day)
+            if n_offices * span <= 4 * keys.size + 4096:
+                counts = np.bincount(keys, minlength=n_offices * span)
+                keys = np.flatnonzero(counts)
+                counts = counts[keys]
+            else:
+                keys, counts = np.unique(keys, return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                code, offset = divmod(key, span)
+                aggregate = result[self.offices.values[code]]
+                aggregate.processing_days_sum += (first_day + offset) * count
+                aggregate.processing_count += count
+                aggregate.processing_histogram[first_day + offset] = count
+        return result
+
+
+def _count_dict(dictionary: ValueDictionary, counts) -> dict:
+    """{value: count} for the non-zero codes, in code order"""
+    return {dictionary.values[code]: int(counts[code]) for code in np.flatnonzero(counts)}
+
+
+def _add_days(aggregate: OfficeAggregate, days):
+    if not days.size:
+        return
+    days = days.astype(np.int64)
+    first_day = int(days.min())
+    counts = np.bincount(days - first_day)
+    values = np.flatnonzero(counts)
+    counts = counts[values]
+    for day, count in zip((values + first_day).tolist(), counts.tolist()):
+        aggregate.processing_days_sum += day * count
+        aggregate.processing_count += count
+        aggregate.processing_histogram[day] = count
@@ -4,159 +4,956 @@ Using Python dictionaries to store data.
 Easy to migrate to real DB later (MongoDB, PostgreSQL, etc.)
 """
 
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
+import atexit
 import json
+import logging
 import os
+import threading
+
+from persistence import (
+    WriteAheadLog, BackgroundFlusher, LogFollower, ProcessLock, atomic_write_json,
+    read_snapshot, write_snapshot
+)
+from indexes import HashIndex, OrderedIndex
+from aggregates import (
+    AggregateStore, OfficeAggregate, Timestamps, application_times, office_key, processing_days
+)
+from hierarchy import OfficeHierarchy
+from trends import TrendStore
+import columnar
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# "json" keeps everything in memory backed by JSON files, "sqlite" uses sqlite_database
+DB_BACKEND = os.getenv("DB_BACKEND", "json")
+DATA_DIR = os.getenv("DB_DATA_DIR", "data")
+SQLITE_PATH = os.getenv("DB_SQLITE_PATH", os.path.join(DATA_DIR, "sarkaha.db"))
+
+# "json" rewrites a collection file on every change,
+# "wal" appends each change to a log and compacts it periodically,
+# "flush" marks collections dirty and writes them from a background thread
+PERSISTENCE_MODE = os.getenv("DB_PERSISTENCE_MODE", "json")
+WAL_COMPACT_EVERY = int(os.getenv("DB_WAL_COMPACT_EVERY", "1000"))
+WAL_FSYNC = os.getenv("DB_WAL_FSYNC", "false").lower() == "true"
+FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "1.0"))
+FLUSH_MAX_DIRTY = int(os.getenv("DB_FLUSH_MAX_DIRTY", "100"))
+
+# Several worker processes sharing one data directory (uvicorn --workers N):
+# writes go through the WAL under a cross-process lock, and each worker
+# applies the others' entries every DB_SYNC_INTERVAL seconds (and right away
+# when a lookup by id or email misses). Implies DB_PERSISTENCE_MODE=wal.
+MULTIPROCESS = os.getenv("DB_MULTIPROCESS", "false").lower() == "true"
+SYNC_INTERVAL = float(os.getenv("DB_SYNC_INTERVAL", "0.1"))
+
+# Binary snapshot of each collection group and its indexes, written on
+# compaction and shutdown and preferred at load time while the group's JSON
+# files are unchanged. Bump SNAPSHOT_VERSION whenever an index or aggregate
+# layout changes.
+SNAPSHOT_ENABLED = os.getenv("DB_SNAPSHOT", "true").lower() == "true"
+SNAPSHOT_VERSION = 2
+
+# Load every collection group at server startup instead of on first use
+PRELOAD = os.getenv("DB_PRELOAD", "true").lower() == "true"
+
+# Collections are loaded in groups, each together with its indexes the first
+# time one of the group's attributes is used, so importing this module is
+# cheap and a messaging request never parses applications.json
+GROUPS = {
+    "users": ("citizens", "officials"),
+    "applications": ("applications",),
+    "messages": ("messages",),
+}
+GROUP_ATTRIBUTES = {
+    "users": ("citizens", "officials", "users", "users_by_email", "users_by_type",
+              "officials_by_level"),
+    "applications": ("applications", "applications_by_user", "applications_by_office",
+                     "application_pages", "application_times", "office_aggregates", "trends",
+                     "columns", "hierarchy"),
+    "messages": ("messages", "messages_by_sender", "messages_by_recipient"),
+}
+LAZY_ATTRIBUTES = {
+    attribute: group for group, attributes in GROUP_ATTRIBUTES.items() for attribute in attributes
+}
+COLLECTION_GROUPS = {
+    collection: group for group, collections in GROUPS.items() for collection in collections
+}
 
 class Database:
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", persistence_mode: str = None,
+                 multiprocess: bool = None):
         self.data_dir = data_dir
         os.makedirs(data_dir, exist_ok=True)
         
+        # Guards the collections against the background flusher
+        self._lock = threading.RLock()
+        
         self.citizens_file = os.path.join(data_dir, "citizens.json")
         self.officials_file = os.path.join(data_dir, "officials.json")
         self.applications_file = os.path.join(data_dir, "applications.json")
         self.messages_file = os.path.join(data_dir, "messages.json")
+        self.collection_files = {
+            "citizens": self.citizens_file,
+            "officials": self.officials_file,
+            "applications": self.applications_file,
+            "messages": self.messages_file,
+        }
+        self.snapshot_files = {
+            group: os.path.join(data_dir, f"snapshot-{group}.bin") for group in GROUPS
+        }
+        
+        # (inode, mtime, size) of each collection file as last read or written, so
+        # edits made by other processes can be picked up without a re-parse per call
+        # and a snapshot is only trusted for files that have not changed since
+        self._file_signatures = {}
+        # Collection groups loaded so far
+        self._loaded = set()
+        
+        self.persistence_mode = persistence_mode or PERSISTENCE_MODE
+        self.multiprocess = MULTIPROCESS if multiprocess is None else multiprocess
+        # Held exclusively while writing and shared while reading files (multi-process mode)
+        self._process_lock = None
+        if self.multiprocess:
+            if self.persistence_mode != "wal":
+                print(f"Multi-process mode uses the WAL instead of {self.persistence_mode!r} persistence")
+                self.persistence_mode = "wal"
+            self._process_lock = ProcessLock(os.path.join(data_dir, "wal.lock"))
+        self.wal = None
+        if self.persistence_mode == "wal":
+            self.wal = WriteAheadLog(os.path.join(data_dir, "wal.log"), fsync=WAL_FSYNC,
+                                     shared=self.multiprocess)
         
-        # Load existing data or initialize
-        self.citizens: Dict = self._load_json(self.citizens_file, {})
-        self.officials: Dict = self._load_json(self.officials_file, {})
-        self.applications: Dict = self._load_json(self.applications_file, {})
-        self.messages: Dict = self._load_json(self.messages_file, {})
+        # Coalesce changes and write them off the request path
+        self.flusher = None
+        self._dirty = set()
+        self._flush_lock = threading.Lock()
+        if self.persistence_mode == "flush":
+            self.flusher = BackgroundFlusher(self.flush, FLUSH_INTERVAL, FLUSH_MAX_DIRTY)
+            atexit.register(self.close)
         
+        # Callbacks taking a changed user_id (None means all users may have changed)
+        self.user_listeners = []
+        
+        # Apply the other workers' changes as they log them
+        self.follower = None
+        if self.multiprocess:
+            self.follower = LogFollower(self.sync, SYNC_INTERVAL)
+            atexit.register(self.close)
+    
+    def __getattr__(self, name: str):
+        """Load the collection group owning an attribute that is not loaded yet"""
+        group = LAZY_ATTRIBUTES.get(name)
+        if group is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        self._load_group(group)
+        return self.__dict__[name]
+    
+    def load(self):
+        """Load every collection group now rather than on first use"""
+        for group in GROUPS:
+            self._load_group(group)
+    
+    def _load_group(self, group: str):
+        """Load a group's collections and indexes, then publish them all at once"""
+        with self._lock, self._reading_files():
+            if group in self._loaded:
+                return
+            # The replay below reads the log to its end; the groups already
+            # loaded must have applied everything up to there as well
+            if self.multiprocess:
+                self._sync_locked()
+            # Built on a bare instance sharing our state, so that threads reading
+            # without the lock never see a collection whose indexes are half filled
+            staging = object.__new__(type(self))
+            staging.__dict__.update({
+                name: value for name, value in self.__dict__.items() if name not in LAZY_ATTRIBUTES
+            })
+            staging._loaded = set()
+            getattr(staging, f"_load_{group}")(self._read_snapshot(group))
+            # Replay changes logged since the last compaction
+            if self.wal is not None:
+                staging._replay_wal(GROUPS[group])
+            self.__dict__.update({name: staging.__dict__[name] for name in GROUP_ATTRIBUTES[group]})
+            self._loaded.add(group)
+    
+    def _load_users(self, snapshot: Optional[dict]):
+        self.citizens: Dict = self._load_collection("citizens", snapshot)
+        self.officials: Dict = self._load_collection("officials", snapshot)
         # Combine for legacy user methods
         self.users: Dict = {**self.citizens, **self.officials}
+        
+        # Secondary indexes, kept in sync by every create/update/delete
+        self.users_by_email = HashIndex(lambda u: u.get('email'))
+        self.users_by_type = HashIndex(lambda u: u.get('user_type'))
+        self.officials_by_level = HashIndex(
+            lambda u: u.get('office_level') if u.get('user_type') == 'official' else None
+        )
+        if not self._restore_indexes("users", snapshot):
+            self._rebuild_user_indexes()
+    
+    def _load_applications(self, snapshot: Optional[dict]):
+        self.applications: Dict = self._load_collection("applications", snapshot)
+        self.applications_by_user = HashIndex(lambda a: a.get('user_id'))
+        self.applications_by_office = HashIndex(
+            lambda a: (a.get('target_office_level'), a.get('target_office_name'))
+        )
+        # Newest-first paging per office or user, optionally narrowed by status or service_type
+        submitted = lambda a: a.get('submitted_date')
+        self.application_pages = {}
+        for scope, scope_key in (("office", office_key), ("user", lambda a: (a.get('user_id'),))):
+            self.application_pages[(scope, None)] = OrderedIndex(scope_key, submitted)
+            for field in ("status", "service_type"):
+                self.application_pages[(scope, field)] = OrderedIndex(
+                    lambda a, scope_key=scope_key, field=field: scope_key(a) + (a.get(field),),
+                    submitted
+                )
+        # Submitted/completed dates parsed once per record change (epoch seconds)
+        self.application_times: Dict[str, Timestamps] = {}
+        self.office_aggregates = AggregateStore()
+        self.trends = TrendStore()
+        # Vectorized mirror of the applications for rollups (None without NumPy)
+        self.columns = columnar.ColumnarApplications() if columnar.available() else None
+        self.hierarchy = OfficeHierarchy.load(os.path.join(self.data_dir, "hierarchy.json"))
+        if not self._restore_indexes("applications", snapshot):
+            self._rebuild_application_indexes()
+    
+    def _load_messages(self, snapshot: Optional[dict]):
+        self.messages: Dict = self._load_collection("messages", snapshot)
+        self.messages_by_sender = HashIndex(lambda m: m.get('sender_id'))
+        self.messages_by_recipient = HashIndex(lambda m: m.get('recipient_id'))
+        if not self._restore_indexes("messages", snapshot):
+            self.messages_by_sender.rebuild(self.messages)
+            self.messages_by_recipient.rebuild(self.messages)
+    
+    def _read_snapshot(self, group: str) -> Optional[dict]:
+        if not SNAPSHOT_ENABLED:
+            return None
+        filepath = self.snapshot_files[group]
+        with metrics.db_load_seconds.time(os.path.basename(filepath)):
+            return read_snapshot(filepath, SNAPSHOT_VERSION)
+    
+    def _load_collection(self, collection: str, snapshot: Optional[dict]) -> Dict:
+        """A collection from the snapshot if its file is unchanged since, else from JSON"""
+        filepath = self.collection_files[collection]
+        # Taken before reading, so a concurrent rewrite shows up as a mismatch later
+        signature = self._file_signatures[filepath] = self._file_signature(filepath)
+        if snapshot is not None and snapshot["signatures"].get(collection, False) == signature:
+            return snapshot["collections"][collection]
+        return self._load_json(filepath, {})
+    
+    def _indexes(self, group: str) -> Dict[str, object]:
+        """A group's HashIndex/OrderedIndex objects by a stable name"""
+        if group == "users":
+            return {
+                "users_by_email": self.users_by_email,
+                "users_by_type": self.users_by_type,
+                "officials_by_level": self.officials_by_level,
+            }
+        if group == "messages":
+            return {
+                "messages_by_sender": self.messages_by_sender,
+                "messages_by_recipient": self.messages_by_recipient,
+            }
+        indexes = {
+            "applications_by_user": self.applications_by_user,
+            "applications_by_office": self.applications_by_office,
+        }
+        for (scope, field), index in self.application_pages.items():
+            indexes[f"pages:{scope}:{field}"] = index
+        return indexes
+    
+    def _restore_indexes(self, group: str, snapshot: Optional[dict]) -> bool:
+        """Take a group's indexes from its snapshot if all its collections came from it too"""
+        if snapshot is None or any(
+            getattr(self, collection) is not snapshot["collections"].get(collection)
+            for collection in GROUPS[group]
+        ):
+            return False
+        state = snapshot["state"]
+        for name, index in self._indexes(group).items():
+            index.load_state(state["indexes"][name])
+        if group == "applications":
+            self.application_times = state["application_times"]
+            self.office_aggregates.load(state["office_aggregates"])
+            self.trends.load_state(state["trends"])
+            if self.columns is not None:
+                if state["columns"] is not None:
+                    self.columns = state["columns"]
+                else:
+                    self.columns.rebuild(
+                        self.applications, self.application_times,
+                        lambda app: processing_days(app, self.application_times[app['id']])
+                    )
+            self.hierarchy.rebuild(self.office_aggregates)
+        return True
+    
+    def _snapshot_state(self, group: str) -> dict:
+        """A group's indexes and derived counters for its snapshot"""
+        state = {"indexes": {name: index.state() for name, index in self._indexes(group).items()}}
+        if group == "applications":
+            state.update({
+                "application_times": self.application_times,
+                "office_aggregates": self.office_aggregates.state(),
+                "trends": self.trends.state(),
+                "columns": self.columns,
+            })
+        return state
+    
+    def _replay_wal(self, collections):
+        """Apply logged changes to the given loaded collections and their indexes.
+        
+        Entries already contained in a snapshot are applied again harmlessly.
+        """
+        for collection, record_id, record in self.wal.replay():
+            if collection in collections:
+                self._apply_logged(collection, record_id, record)
+    
+    def _apply_logged(self, collection: str, record_id: str, record: Optional[dict]):
+        """Put (or with record None, delete) a record through the indexed paths"""
+        records = getattr(self, collection)
+        existing = records.pop(record_id, None)
+        if collection == "applications":
+            if existing is not None:
+                self._unindex_application(existing)
+            if record is not None:
+                records[record_id] = record
+                self._index_application(record)
+        elif collection == "messages":
+            if existing is not None:
+                self.messages_by_sender.remove(record_id, existing)
+                self.messages_by_recipient.remove(record_id, existing)
+            if record is not None:
+                records[record_id] = record
+                self.messages_by_sender.add(record_id, record)
+                self.messages_by_recipient.add(record_id, record)
+        else:
+            if existing is not None:
+                self._unindex_user(record_id, existing)
+                self.users.pop(record_id, None)
+            if record is not None:
+                records[record_id] = record
+                self.users[record_id] = record
+                self.users_by_email.add(record_id, record)
+                self.users_by_type.add(record_id, record)
+                self.officials_by_level.add(record_id, record)
+    
+    def _reading_files(self):
+        """Keep other workers from compacting while collection files are read"""
+        return self._process_lock.shared() if self._process_lock is not None else nullcontext()
+    
+    @contextmanager
+    def _writing(self):
+        """Hold the database lock for a change; in multi-process mode also the
+        exclusive cross-process lock, with the other workers' changes applied"""
+        with self._lock:
+            if self._process_lock is None:
+                yield
+            else:
+                with self._process_lock.exclusive():
+                    self._sync_locked()
+                    yield
+    
+    def sync(self) -> bool:
+        """Apply changes other workers logged since the last sync (multi-process mode).
+        
+        Costs one stat when nothing changed. Returns True if anything was applied.
+        """
+        if not self.multiprocess or not self.wal.changed():
+            return False
+        with self._lock, self._process_lock.shared():
+            return self._sync_locked()
+    
+    def reading(self):
+        """Hold off writers and the log follower while reading shared state
+        that no method returns a copy of, such as hierarchy node aggregates"""
+        return self._lock
+    
+    def _sync_locked(self) -> bool:
+        if not self._loaded:
+            # Loading a group replays the whole log anyway
+            return False
+        entries = self.wal.follow()
+        if entries is None:
+            # Fell more than a compaction behind: start over from the files
+            groups, self._loaded = list(self._loaded), set()
+            for group in groups:
+                self._load_group(group)
+            self._notify_user_changed(None)
+            return True
+        for collection, record_id, record in entries:
+            if COLLECTION_GROUPS[collection] in self._loaded:
+                self._apply_logged(collection, record_id, record)
+                if COLLECTION_GROUPS[collection] == "users":
+                    self._notify_user_changed(record_id)
+        return bool(entries)
+    
+    def _rebuild_application_indexes(self):
+        """Build the application indexes and counters from the loaded collection"""
+        self.applications_by_user.rebuild(self.applications)
+        self.applications_by_office.rebuild(self.applications)
+        for index in self.application_pages.values():
+            index.rebuild(self.applications)
+        self.application_times = {
+            app_id: application_times(app) for app_id, app in self.applications.items()
+        }
+        days_func = lambda app: processing_days(app, self.application_times[app['id']])
+        self.trends.rebuild(self.applications.values(), lambda app: self.application_times[app['id']])
+        if self.columns is not None:
+            self.columns.rebuild(self.applications, self.application_times, days_func)
+            self.office_aggregates.load(self.columns.office_aggregates())
+        else:
+            self.office_aggregates.rebuild(self.applications.values(), days_func)
+        self.hierarchy.rebuild(self.office_aggregates)
+    
+    def _rebuild_user_indexes(self):
+        self.users_by_email.rebuild(self.users)
+        self.users_by_type.rebuild(self.users)
+        self.officials_by_level.rebuild(self.users)
+    
+    def _index_application(self, app: dict):
+        times = self.application_times[app['id']] = application_times(app)
+        days = processing_days(app, times)
+        self.applications_by_user.add(app['id'], app)
+        self.applications_by_office.add(app['id'], app)
+        for index in self.application_pages.values():
+            index.add(app['id'], app)
+        self.office_aggregates.add(app, days)
+        self.hierarchy.apply(app, 1, days)
+        self.trends.apply(app, times)
+        if self.columns is not None:
+            self.columns.put(app['id'], app, times, days)
+    
+    def _unindex_application(self, app: dict):
+        times = self.application_times.pop(app['id'], None)
+        days = processing_days(app, times)
+        self.applications_by_user.remove(app['id'], app)
+        self.applications_by_office.remove(app['id'], app)
+        for index in self.application_pages.values():
+            index.remove(app['id'], app)
+        self.office_aggregates.remove(app, days)
+        self.hierarchy.apply(app, -1, days)
+        self.trends.apply(app, times, -1)
+        if self.columns is not None:
+            self.columns.remove(app['id'])
     
     def _load_json(self, filepath: str, default: any) -> any:
-        """Load JSON file or return default"""
+        """Load JSON file or return default if it does not exist"""
+        if not os.path.exists(filepath):
+            return default
         try:
-            if os.path.exists(filepath):
+            with metrics.db_load_seconds.time(os.path.basename(filepath)):
                 with open(filepath, 'r') as f:
                     return json.load(f)
         except Exception as e:
-            print(f"Error loading {filepath}: {e}")
-        return default
+            # Never start from an empty collection that the next save would write back
+            raise RuntimeError(f"Error loading {filepath}: {e}") from e
     
-    def _save_json(self, filepath: str, data: any):
-        """Save data to JSON file"""
+    def _save_json(self, filepath: str, data: any) -> bool:
+        """Save data to JSON file (temp file + fsync + rename); False if it failed"""
         try:
-            with open(filepath, 'w') as f:
-                json.dump(data, f, indent=2, default=str)
-        except Exception as e:
-            print(f"Error saving {filepath}: {e}")
+            with metrics.db_persist_seconds.time(os.path.basename(filepath)):
+                atomic_write_json(filepath, data)
+        except Exception:
+            logger.exception("Error saving %s", filepath)
+            return False
+        if filepath in self._file_signatures:
+            self._file_signatures[filepath] = self._file_signature(filepath)
+        return True
+    
+    def _file_signature(self, filepath: str):
+        """(inode, mtime, size) of a file, or None if it does not exist"""
+        try:
+            stat = os.stat(filepath)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    
+    def _persist(self, collection: str, record_id: str):
+        """Persist a single changed record of a collection"""
+        self._persist_many(collection, [record_id])
+    
+    def _persist_many(self, collection: str, record_ids: List[str]):
+        """Persist changed records of a collection with one write"""
+        if not record_ids:
+            return
+        
+        if self.flusher is not None:
+            self._dirty.add(collection)
+            self.flusher.mark_dirty(len(record_ids))
+            return
+        
+        if self.wal is None:
+            self._save_json(self.collection_files[collection], getattr(self, collection))
+            return
+        
+        records = getattr(self, collection)
+        with metrics.db_persist_seconds.time("wal.log"):
+            self.wal.append_many(collection, [(record_id, records.get(record_id)) for record_id in record_ids])
+        if self.wal.entries >= WAL_COMPACT_EVERY:
+            self.compact()
+    
+    def _snapshot(self, collections) -> Dict[str, dict]:
+        """Copy collections (and their records) so they can be written without the lock"""
+        with self._lock:
+            return {
+                collection: {k: dict(v) for k, v in getattr(self, collection).items()}
+                for collection in collections
+            }
+    
+    def flush(self) -> bool:
+        """Write every dirty collection to disk.
+        
+        Collections that could not be written stay dirty for the next flush.
+        Returns False if any failed.
+        """
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                snapshot = self._snapshot(dirty)
+            failed = [
+                collection for collection, records in snapshot.items()
+                if not self._save_json(self.collection_files[collection], records)
+            ]
+            if failed:
+                with self._lock:
+                    self._dirty.update(failed)
+                return False
+            return True
+    
+    def compact(self) -> bool:
+        """Write full snapshots of every collection and reset the log.
+        
+        If any collection file cannot be written the log is kept (and no
+        binary snapshot written), so its changes survive a restart; the
+        next compaction tries again. Returns True if the log was reset.
+        """
+        with self._writing():
+            # The log is dropped as a whole, so every collection has to be written
+            self.load()
+            written = True
+            for collection, filepath in self.collection_files.items():
+                written = self._save_json(filepath, getattr(self, collection)) and written
+            if not written:
+                return False
+            if self.wal is not None:
+                self.wal.truncate()
+            if SNAPSHOT_ENABLED:
+                self.write_snapshot()
+            return True
+    
+    def write_snapshot(self) -> bool:
+        """Write each loaded collection group and its indexes to its binary snapshot.
+        
+        A group is skipped when one of its files was changed by someone else
+        or still has changes waiting for the flusher, since a snapshot is only
+        used while its files match the signatures recorded here. Changes in
+        the WAL are fine: they are replayed on top at load time. Returns False
+        if any loaded group was skipped or failed.
+        """
+        written = True
+        with self._lock:
+            for group in self._loaded:
+                written = self._write_group_snapshot(group) and written
+        return written
+    
+    def _write_group_snapshot(self, group: str) -> bool:
+        filepath = self.snapshot_files[group]
+        signatures = {}
+        for collection in GROUPS[group]:
+            collection_file = self.collection_files[collection]
+            signature = self._file_signatures.get(collection_file)
+            if collection in self._dirty or signature != self._file_signature(collection_file):
+                # Routine with several workers: another one compacted since we loaded
+                if not self.multiprocess:
+                    print(f"Not writing {filepath}: {collection_file} changed on disk")
+                return False
+            signatures[collection] = signature
+        payload = {
+            "signatures": signatures,
+            "collections": {collection: getattr(self, collection) for collection in GROUPS[group]},
+            "state": self._snapshot_state(group),
+        }
+        try:
+            with metrics.db_persist_seconds.time(os.path.basename(filepath)):
+                write_snapshot(filepath, payload, SNAPSHOT_VERSION)
+        except Exception:
+            logger.exception("Error saving %s", filepath)
+            return False
+        return True
+    
+    def close(self):
+        """Stop background work and write out pending changes"""
+        if self.follower is not None:
+            self.follower.stop()
+            self.follower = None
+        if self.flusher is not None:
+            self.flusher.stop()
+            if not self.flush():
+                logger.error("Unsaved changes to %s lost at shutdown", ", ".join(sorted(self._dirty)))
+        if SNAPSHOT_ENABLED:
+            self.write_snapshot()
+        if self.wal is not None:
+            self.wal.close()
     
     # User operations
     def create_user(self, user_data: dict) -> dict:
         """Create a new user"""
-        user_id = user_data['id']
-        user_type = user_data.get('user_type', 'citizen')
-        
-        if user_type == 'official':
-            self.officials[user_id] = user_data
-            self._save_json(self.officials_file, self.officials)
-        else:
-            self.citizens[user_id] = user_data
-            self._save_json(self.citizens_file, self.citizens)
-        
-        # Update combined dict
-        self.users[user_id] = user_data
-        return user_data
+        with self._writing():
+            user_id = user_data['id']
+            user_type = user_data.get('user_type', 'citizen')
+            
+            if user_id in self.users:
+                self._unindex_user(user_id, self.users[user_id])
+            
+            if user_type == 'official':
+                self.officials[user_id] = user_data
+                self._persist("officials", user_id)
+            else:
+                self.citizens[user_id] = user_data
+                self._persist("citizens", user_id)
+            
+            # Update combined dict
+            self.users[user_id] = user_data
+            self.users_by_email.add(user_id, user_data)
+            self.users_by_type.add(user_id, user_data)
+            self.officials_by_level.add(user_id, user_data)
+            self._notify_user_changed(user_id)
+            return user_data
+    
+    def create_users(self, users: List[dict]) -> int:
+        """Create (or replace) many users with one write per collection"""
+        with self._writing():
+            changed = {"citizens": [], "officials": []}
+            for user_data in users:
+                user_id = user_data['id']
+                if user_id in self.users:
+                    self._unindex_user(user_id, self.users[user_id])
+                collection = "officials" if user_data.get('user_type') == 'official' else "citizens"
+                getattr(self, collection)[user_id] = user_data
+                changed[collection].append(user_id)
+                self.users[user_id] = user_data
+                self.users_by_email.add(user_id, user_data)
+                self.users_by_type.add(user_id, user_data)
+                self.officials_by_level.add(user_id, user_data)
+            for collection, user_ids in changed.items():
+                self._persist_many(collection, user_ids)
+            self._notify_user_changed()
+            return len(users)
+    
+    def _unindex_user(self, user_id: str, user: dict):
+        self.users_by_email.remove(user_id, user)
+        self.users_by_type.remove(user_id, user)
+        self.officials_by_level.remove(user_id, user)
+    
+    def _notify_user_changed(self, user_id: str = None):
+        for listener in self.user_listeners:
+            listener(user_id)
     
     def get_user_by_email(self, email: str) -> dict:
         """Get user by email"""
-        for user in self.users.values():
-            if user.get('email') == email:
-                return user
-        return None
+        user = self.users_by_email.first(email)
+        # Another worker may have just registered them (multi-process mode)
+        if user is None and self.sync():
+            user = self.users_by_email.first(email)
+        return user
     
     def get_user_by_id(self, user_id: str) -> dict:
         """Get user by ID"""
-        return self.users.get(user_id)
+        user = self.users.get(user_id)
+        if user is None and self.sync():
+            user = self.users.get(user_id)
+        return user
+    
+    def reload_users(self, force: bool = False) -> bool:
+        """Re-read the user files if another process changed them on disk.
+        
+        Files with changes still waiting for the background flusher are left
+        alone. Returns True if anything was reloaded.
+        """
+        with self._lock:
+            # Not loaded yet: the first use reads the current files anyway.
+            # With several workers the files only change by compaction and
+            # the log follower keeps the users current.
+            if "users" not in self._loaded or self.multiprocess:
+                return False
+            changed = [
+                collection for collection in ("citizens", "officials")
+                if collection not in self._dirty and (
+                    force or self._file_signature(self.collection_files[collection])
+                    != self._file_signatures[self.collection_files[collection]]
+                )
+            ]
+            if not changed:
+                return False
+            
+            for collection in changed:
+                filepath = self.collection_files[collection]
+                self._file_signatures[filepath] = self._file_signature(filepath)
+                setattr(self, collection, self._load_json(filepath, {}))
+            # Logged changes are not in the files until the next compaction
+            if self.wal is not None:
+                for collection, record_id, record in self.wal.replay():
+                    if collection not in changed:
+                        continue
+                    records = getattr(self, collection)
+                    if record is None:
+                        records.pop(record_id, None)
+                    else:
+                        records[record_id] = record
+            
+            self.users = {**self.citizens, **self.officials}
+            self._rebuild_user_indexes()
+            self._notify_user_changed(None)
+            return True
     
     def get_all_users(self) -> List[dict]:
         """Get all users"""
-        # Reload to ensure we have latest data
-        self.citizens = self._load_json(self.citizens_file, {})
-        self.officials = self._load_json(self.officials_file, {})
-        self.users = {**self.citizens, **self.officials}
-        return list(self.users.values())
+        self.reload_users()
+        with self._lock:
+            return list(self.users.values())
+    
+    def get_officials(self, office_levels: List[str] = None) -> List[dict]:
+        """Get all officials, or only those at the given office levels"""
+        self.reload_users()
+        with self._lock:
+            if office_levels is None:
+                return self.users_by_type.get('official')
+            officials = []
+            for level in office_levels:
+                officials.extend(self.officials_by_level.get(level))
+            return officials
     
     # Application operations
     def create_application(self, app_data: dict) -> dict:
         """Create a new application"""
-        self.applications[app_data['id']] = app_data
-        self._save_json(self.applications_file, self.applications)
-        return app_data
+        with self._writing():
+            existing = self.applications.get(app_data['id'])
+            if existing is not None:
+                self._unindex_application(existing)
+            self.applications[app_data['id']] = app_data
+            self._index_application(app_data)
+            self._persist("applications", app_data['id'])
+            return app_data
+    
+    def create_applications(self, apps: List[dict], replace: bool = True) -> int:
+        """Create (or replace) many applications with a single persistence write.
+        
+        With replace=False existing ids are left untouched and skipped.
+        Returns the number of applications written.
+        """
+        with self._writing():
+            written = []
+            for app_data in apps:
+                existing = self.applications.get(app_data['id'])
+                if existing is not None:
+                    if not replace:
+                        continue
+                    self._unindex_application(existing)
+                self.applications[app_data['id']] = app_data
+                self._index_application(app_data)
+                written.append(app_data['id'])
+            self._persist_many("applications", written)
+            return len(written)
     
     def get_application_by_id(self, app_id: str) -> dict:
         """Get application by ID"""
-        return self.applications.get(app_id)
+        app = self.applications.get(app_id)
+        if app is None and self.sync():
+            app = self.applications.get(app_id)
+        return app
     
     def update_application(self, app_id: str, updates: dict) -> dict:
         """Update an application"""
-        if app_id in self.applications:
-            self.applications[app_id].update(updates)
-            self._save_json(self.applications_file, self.applications)
-            return self.applications[app_id]
-        return None
+        with self._writing():
+            if app_id in self.applications:
+                app = self.applications[app_id]
+                self._unindex_application(app)
+                app.update(updates)
+                self._index_application(app)
+                self._persist("applications", app_id)
+                return self.applications[app_id]
+            return None
+    
+    def update_applications(self, updates: Dict[str, dict]) -> Dict[str, dict]:
+        """Update several applications at once with a single persistence write.
+        
+        Returns the updated applications by id; unknown ids are skipped.
+        """
+        with self._writing():
+            updated = {}
+            for app_id, changes in updates.items():
+                app = self.applications.get(app_id)
+                if app is None:
+                    continue
+                self._unindex_application(app)
+                app.update(changes)
+                self._index_application(app)
+                updated[app_id] = app
+            self._persist_many("applications", list(updated))
+            return updated
     
     def delete_application(self, app_id: str) -> bool:
         """Delete an application"""
-        if app_id in self.applications:
-            del self.applications[app_id]
-            self._save_json(self.applications_file, self.applications)
-            return True
-        return False
+        with self._writing():
+            if app_id in self.applications:
+                self._unindex_application(self.applications.pop(app_id))
+                self._persist("applications", app_id)
+                return True
+            return False
     
     def get_applications_by_user(self, user_id: str) -> List[dict]:
         """Get all applications for a user"""
-        return [app for app in self.applications.values() if app.get('user_id') == user_id]
+        with self._lock:
+            return self.applications_by_user.get(user_id)
     
     def get_applications_by_office(self, office_level: str, office_name: str) -> List[dict]:
         """Get all applications for a specific office"""
-        return [
-            app for app in self.applications.values()
-            if app.get('target_office_level') == office_level and 
-               app.get('target_office_name') == office_name
-        ]
+        with self._lock:
+            return self.applications_by_office.get((office_level, office_name))
+    
+    def iter_applications_by_office(self, office_level: str, office_name: str):
+        """Yield an office's applications one at a time (for streaming exports).
+        
+        Only the id list is taken under the lock, so writers are not held up
+        for the length of an export.
+        """
+        with self._lock:
+            app_ids = self.applications_by_office.ids((office_level, office_name))
+        for app_id in app_ids:
+            app = self.applications.get(app_id)
+            if app is not None:
+                yield app
+    
+    def get_applications_page(self, office: Tuple[str, str] = None, user_id: str = None,
+                              status: str = None, service_type: str = None,
+                              before: Optional[Tuple[str, str]] = None,
+                              limit: int = 50) -> List[dict]:
+        """Get up to limit applications of an office or user, newest first.
+        
+        before is the (submitted_date, id) of the last item of the previous page.
+        """
+        scope, scope_key = ("office", tuple(office)) if office is not None else ("user", (user_id,))
+        if status is not None:
+            index, key = self.application_pages[(scope, "status")], scope_key + (status,)
+        elif service_type is not None:
+            index, key = self.application_pages[(scope, "service_type")], scope_key + (service_type,)
+        else:
+            index, key = self.application_pages[(scope, None)], scope_key
+        
+        page = []
+        with self._lock:
+            for app_id in index.iter_descending(key, before):
+                app = self.applications[app_id]
+                if service_type is not None and app.get('service_type') != service_type:
+                    continue
+                page.append(app)
+                if len(page) >= limit:
+                    break
+        return page
+    
+    def get_office_aggregate(self, office_level: str, office_name: str) -> OfficeAggregate:
+        """Get a copy of the status/type/processing-time counters for an office"""
+        with self._lock:
+            return self.office_aggregates.get(office_level, office_name).copy()
+    
+    def get_levels_aggregate(self, office_levels: List[str]) -> OfficeAggregate:
+        """Get combined counters for every office at the given levels"""
+        if self.columns is not None:
+            with self._lock:
+                return self.columns.aggregate(self.columns.office_rows(office_levels=office_levels))
+        with self._lock:
+            return self.office_aggregates.combined(lambda key: key[0] in office_levels)
+    
+    def get_trends(self, offices: List[Tuple[str, str]], **options) -> List[dict]:
+        """Daily or weekly submitted/completed/rejected counts, see TrendStore.series"""
+        with self._lock:
+            return self.trends.series(offices, **options)
+    
+    def collection_sizes(self) -> Dict[str, int]:
+        """Number of records in each loaded collection (without loading the others)"""
+        with self._lock:
+            return {
+                collection: len(getattr(self, collection))
+                for group in self._loaded for collection in GROUPS[group]
+            }
     
     def get_all_applications(self) -> List[dict]:
         """Get all applications"""
-        return list(self.applications.values())
+        with self._lock:
+            return list(self.applications.values())
     
     # Message operations
     def create_message(self, message_data: dict) -> dict:
         """Create a new message"""
-        self.messages[message_data['id']] = message_data
-        self._save_json(self.messages_file, self.messages)
-        return message_data
+        with self._writing():
+            existing = self.messages.get(message_data['id'])
+            if existing is not None:
+                self.messages_by_sender.remove(existing['id'], existing)
+                self.messages_by_recipient.remove(existing['id'], existing)
+            self.messages[message_data['id']] = message_data
+            self.messages_by_sender.add(message_data['id'], message_data)
+            self.messages_by_recipient.add(message_data['id'], message_data)
+            self._persist("messages", message_data['id'])
+            return message_data
+    
+    def create_messages(self, messages: List[dict]) -> int:
+        """Create (or replace) many messages with a single persistence write"""
+        with self._writing():
+            for message_data in messages:
+                existing = self.messages.get(message_data['id'])
+                if existing is not None:
+                    self.messages_by_sender.remove(existing['id'], existing)
+                    self.messages_by_recipient.remove(existing['id'], existing)
+                self.messages[message_data['id']] = message_data
+                self.messages_by_sender.add(message_data['id'], message_data)
+                self.messages_by_recipient.add(message_data['id'], message_data)
+            self._persist_many("messages", [message_data['id'] for message_data in messages])
+            return len(messages)
     
     def get_message_by_id(self, message_id: str) -> dict:
         """Get message by ID"""
-        return self.messages.get(message_id)
+        message = self.messages.get(message_id)
+        if message is None and self.sync():
+            message = self.messages.get(message_id)
+        return message
     
     def get_messages_for_user(self, user_id: str) -> List[dict]:
         """Get all messages for a user (sent or received)"""
-        return [msg for msg in self.messages.values() 
-                if msg.get('recipient_id') == user_id or msg.get('sender_id') == user_id]
+        with self._lock:
+            messages = {msg['id']: msg for msg in self.messages_by_recipient.get(user_id)}
+            for msg in self.messages_by_sender.get(user_id):
+                messages[msg['id']] = msg
+        return list(messages.values())
     
     def get_received_messages(self, user_id: str) -> List[dict]:
         """Get messages received by a user"""
-        return [msg for msg in self.messages.values() if msg.get('recipient_id') == user_id]
+        with self._lock:
+            return self.messages_by_recipient.get(user_id)
     
     def get_sent_messages(self, user_id: str) -> List[dict]:
         """Get messages sent by a user"""
-        return [msg for msg in self.messages.values() if msg.get('sender_id') == user_id]
+        with self._lock:
+            return self.messages_by_sender.get(user_id)
     
     def mark_message_read(self, message_id: str) -> dict:
         """Mark a message as read"""
-        if message_id in self.messages:
-            self.messages[message_id]['read'] = True
-            self._save_json(self.messages_file, self.messages)
-            return self.messages[message_id]
-        return None
+        with self._writing():
+            if message_id in self.messages:
+                self.messages[message_id]['read'] = True
+                self._persist("messages", message_id)
+                return self.messages[message_id]
+            return None
+
+def create_database(data_dir: str = DATA_DIR):
+    """Create the storage backend selected by DB_BACKEND"""
+    if DB_BACKEND == "sqlite":
+        from sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(SQLITE_PATH, data_dir, multiprocess=MULTIPROCESS)
+    return Database(data_dir)
 
 # Global database instance
-db = Database()
+db = create_database()
 
@@ -0,0 +1,137 @@
+"""
+In-process pub/sub hub behind the server-sent events stream.
+
+Routes publish small deltas to topics after a change is stored:
+``application:<id>``, ``office:<level>:<name>`` and ``user:<id>``. Each open
+/api/events stream holds a bounded queue subscribed to the topics its user
+may see, so open dashboards get pushes instead of re-fetching lists and
+stats. A client that falls behind gets a ``resync`` event and is
+disconnected instead of holding memory for it.
+"""
+
+from typing import Dict, Iterable, Optional, Set
+import asyncio
+import json
+import os
+import threading
+
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "100"))
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+
+def application_topic(app_id: str) -> str:
+    return f"application:{app_id}"
+
+
+def office_topic(office_level: str, office_name: str) -> str:
+    return f"office:{office_level}:{office_name}"
+
+
+def user_topic(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def format_event(event: str, data: dict) -> str:
+    """Encode one SSE frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class Subscription:
+    """One client's bounded queue of encoded events"""
+
+    def __init__(self, hub: "EventHub", topics: Set[str], queue_size: int):
+        self.hub = hub
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.loop = asyncio.get_running_loop()
+        self.overflowed = False
+
+    def deliver(self, message: str):
+        """Queue a message; safe to call from any thread"""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._put(message)
+        else:
+            self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message: str):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def stream(self, request=None):
+        """Yield SSE frames until the client disconnects or falls behind"""
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                if self.overflowed:
+                    yield format_event("resync", {})
+                    return
+                try:
+                    message = await asyncio.wait_for(self.queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if request is not None and await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                yield message
+        finally:
+            self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """Topic -> subscriptions registry"""
+
+    def __init__(self, queue_size: int = SSE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        """Subscribe to topics; must be called from the event loop"""
+        subscription = Subscription(self, set(topics), self.queue_size)
+        with self._lock:
+            for topic in subscription.topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[topic]
+
+    def publish(self, topics: Iterable[str], event: str, data: dict) -> int:
+        """Send one event to every subscriber of any of the topics (once each).
+
+        Returns the number of subscribers reached.
+        """
+        with self._lock:
+            targets = set()
+            for topic in topics:
+                targets.update(self._topics.get(topic, ()))
+        if not targets:
+            return 0
+        message = format_event(event, data)
+        for subscription in targets:
+            subscription.deliver(message)
+        return len(targets)
+
+    def subscriber_count(self, topic: Optional[str] = None) -> int:
+        with self._lock:
+            if topic is not None:
+                return len(self._topics.get(topic, ()))
+            return len({s for subscribers in self._topics.values() for s in subscribers})
+
+
+event_hub = EventHub()
@@ -0,0 +1,59 @@
+"""
+Streaming NDJSON/CSV encoders for application exports.
+
+Both encoders pull records from a generator and emit text in chunks of
+CHUNK_ROWS rows, so an export holds one chunk in memory at a time and the
+first bytes go out before the last record is read.
+"""
+
+from typing import Iterable, Iterator
+import csv
+import io
+import json
+
+from models import Application
+
+CHUNK_ROWS = 500
+
+EXPORT_FIELDS = list(Application.model_fields)
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def iter_ndjson(records: Iterable[dict]) -> Iterator[str]:
+    """One JSON object per line"""
+    lines = []
+    for record in records:
+        lines.append(json.dumps({field: record.get(field) for field in EXPORT_FIELDS}, default=str))
+        if len(lines) >= CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def iter_csv(records: Iterable[dict]) -> Iterator[str]:
+    """CSV with a header row of Application fields"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    rows = 0
+    for record in records:
+        writer.writerow(record)
+        rows += 1
+        if rows >= CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+ENCODERS = {
+    "ndjson": iter_ndjson,
+    "csv": iter_csv,
+}
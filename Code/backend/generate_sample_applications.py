@@ -1,24 +1,43 @@
 """
-Generate sample applications for all 33 wards in Pokhara
+Generate a synthetic dataset for load testing: an office hierarchy from
+wards up to the national office, officials and monitors for every node,
+citizens, applications and messages.
+
+Output is reproducible for a given --seed and written as it is generated,
+so millions of records never have to fit in memory:
+
+    python generate_sample_applications.py --applications 2000000 --out data/synthetic
+    DB_DATA_DIR=data/synthetic python main.py
+
+Formats:
+    json    collection files the JSON backend loads (point DB_DATA_DIR at --out)
+    ndjson  one record per line, e.g. for import_applications.py
+    db      the storage backend selected by DB_BACKEND (SQLite is filled through
+            its batch methods; the JSON backend gets the json files)
+
+dataset.json records the parameters and the busiest offices' accounts.
+
+Load is skewed the way production is: a few offices receive most of the
+applications (Zipf over offices), some citizens apply far more often than
+others, recent days are busier than old ones, Saturdays are quiet and some
+offices process much slower than the rest.
 """
+import argparse
+import bisect
 import json
-import uuid
+import math
+import os
 import random
-from datetime import datetime, timedelta
+import re
+import tempfile
+import time
+import uuid
+from datetime import datetime
 
-# Load existing data
-def load_json(filename):
-    try:
-        with open(f'data/{filename}', 'r') as f:
-            return json.load(f)
-    except:
-        return {}
+from persistence import file_mode
 
-def save_json(filename, data):
-    with open(f'data/{filename}', 'w') as f:
-        json.dump(data, f, indent=2)
+PROVINCES = ["Koshi", "Madhesh", "Bagmati", "Gandaki", "Lumbini", "Karnali", "Sudurpashchim"]
 
-# Sample data
 first_names = [
     "Ram", "Shyam", "Hari", "Krishna", "Laxmi", "Sita", "Gita", "Radha", "Maya", "Rita",
     "Amit", "Anjali", "Bikash", "Deepak", "Binod", "Sunil", "Sunita", "Kabita", "Anita", "Sarita",
@@ -34,116 +53,509 @@ last_names = [
 
 phone_prefixes = ["984", "985", "986", "974", "975", "976"]
 
-service_types = ["national-id", "birth-certificate", "marriage-certificate"]
-
-statuses = ["Submitted", "In Progress", "Completed", "Rejected"]
-
-# Generate random date within last 60 days
-def random_date(days_ago_max=60):
-    days_ago = random.randint(1, days_ago_max)
-    date = datetime.now() - timedelta(days=days_ago)
-    return date.isoformat()
-
-# Generate random phone number
-def random_phone():
-    prefix = random.choice(phone_prefixes)
-    number = ''.join([str(random.randint(0, 9)) for _ in range(7)])
-    return f"{prefix}{number}"
-
-# Generate random application
-def generate_application(ward_number, citizen_id):
-    app_id = str(uuid.uuid4())
-    service_type = random.choice(service_types)
-    status = random.choice(statuses)
-    
-    submitted_date = random_date(60)
-    completed_date = None
-    
-    if status == "Completed":
-        # Completed date is 3-15 days after submission
-        submitted_dt = datetime.fromisoformat(submitted_date)
-        completed_dt = submitted_dt + timedelta(days=random.randint(3, 15))
-        completed_date = completed_dt.isoformat()
-    
-    # Random approval
-    approved = None
-    rejection_message = None
-    if status == "Completed":
-        approved = True
-    elif status == "Rejected":
-        approved = False
-        rejection_messages = [
-            "Incomplete documentation provided. Please submit all required documents.",
-            "Photo quality does not meet requirements. Please provide a clearer photo.",
-            "Address verification failed. Please provide valid proof of residence.",
-            "Application form has errors. Please correct and resubmit.",
-            "Missing required signatures. Please sign all necessary fields.",
-            "Birth certificate original not provided. Copy is not acceptable.",
-            "Marriage proof documents are incomplete."
-        ]
-        rejection_message = random.choice(rejection_messages)
-    
-    application = {
-        "id": app_id,
-        "user_id": citizen_id,
-        "full_name": f"{random.choice(first_names)} {random.choice(last_names)}",
-        "email": f"citizen{random.randint(1000, 9999)}@example.com",
-        "phone": random_phone(),
-        "address": f"Pokhara-{ward_number}, Kaski",
-        "province": "Gandaki Province",
-        "district": "Kaski",
-        "municipality": "Pokhara Metropolitan City",
-        "ward": ward_number,
-        "service_type": service_type,
-        "target_office_level": "local",
-        "target_office_name": f"Ward {ward_number} - Pokhara Ward Office",
-        "estimated_days": random.randint(7, 21),
-        "status": status,
-        "submitted_date": submitted_date,
-        "completed_date": completed_date,
-        "current_stage": status,
-        "approved": approved,
-        "rejection_message": rejection_message
+# service type -> (share of applications, median processing days)
+service_types = {
+    "national-id": (0.35, 5),
+    "birth-certificate": (0.30, 3),
+    "marriage-certificate": (0.22, 4),
+    "land-certificate": (0.13, 12),
+}
+
+# Share of applications sent to offices at each level
+level_shares = {"local": 0.82, "district": 0.11, "province": 0.05, "national": 0.02}
+
+rejection_messages = [
+    "Incomplete documentation provided. Please submit all required documents.",
+    "Photo quality does not meet requirements. Please provide a clearer photo.",
+    "Address verification failed. Please provide valid proof of residence.",
+    "Application form has errors. Please correct and resubmit.",
+    "Missing required signatures. Please sign all necessary fields.",
+    "Birth certificate original not provided. Copy is not acceptable.",
+    "Marriage proof documents are incomplete."
+]
+
+message_subjects = [
+    ("Pending applications", "Please clear the applications pending for more than a week."),
+    ("Monthly report", "Submit the monthly service delivery report by Friday."),
+    ("Good job", "Processing times at your office improved this month. Keep it up."),
+    ("Document checks", "Re-verify citizenship documents before approving national ID requests."),
+    ("System maintenance", "The portal will be read-only on Saturday morning."),
+]
+
+in_progress_stages = ["Document Verification", "Field Verification", "Review", "Approval"]
+
+SECONDS_PER_DAY = 86400
+CITIZEN_NAMESPACE = uuid.UUID("6f1c1f0e-3d4b-4c1e-9a51-5b1d0c2f7a10")
+
+
+def slug(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+# Hierarchy
+def office_node(level: str, name: str) -> dict:
+    return {"id": f"{level}:{name}", "name": name, "level": level, "office": True}
+
+
+def group_node(level: str, name: str, monitor: str, children: list) -> dict:
+    return {"id": f"{level}:{name}", "name": name, "level": level, "monitor": monitor, "children": children}
+
+
+def build_hierarchy(args) -> dict:
+    """Nation -> provinces -> districts -> municipalities -> wards.
+
+    Gandaki/Kaski/Pokhara keep their real names and 33 wards so the
+    generated tree lines up with the sample data; the rest is numbered.
+    """
+    provinces = []
+    for province in PROVINCES[:args.provinces]:
+        districts = []
+        for d in range(1, args.districts + 1):
+            district = "Kaski" if (province, d) == ("Gandaki", 1) else f"{province} {d}"
+            municipalities = []
+            for m in range(1, args.municipalities + 1):
+                municipality = "Pokhara" if (district, m) == ("Kaski", 1) else f"{district}-{m}"
+                ward_count = 33 if municipality == "Pokhara" else args.wards
+                wards = [
+                    office_node("local", f"Ward {w} - {municipality} Ward Office")
+                    for w in range(1, ward_count + 1)
+                ]
+                monitor = ("Pokhara Metropolitan Monitor" if municipality == "Pokhara"
+                           else f"{municipality} Municipal Monitor")
+                municipalities.append(group_node("municipal", municipality, monitor, wards))
+            districts.append(group_node(
+                "district", district, f"{district} District Monitor",
+                [office_node("district", f"{district} District Office")] + municipalities
+            ))
+        provinces.append(group_node(
+            "province", province, f"{province} Province Monitor",
+            [office_node("province", f"{province} Province Office")] + districts
+        ))
+    return group_node(
+        "national", "Nepal", "National Monitor",
+        [office_node("national", "National Administration Office")] + provinces
+    )
+
+
+def walk(node: dict, ancestors: tuple = ()):
+    """Yield (node, ancestors) for a node and all its descendants"""
+    yield node, ancestors
+    for child in node.get("children", []):
+        yield from walk(child, ancestors + (node,))
+
+
+class Office:
+    """An application target with its place in the tree and its load profile"""
+
+    __slots__ = ("level", "name", "official_id", "monitors", "location", "slowness")
+
+    def __init__(self, node: dict, ancestors: tuple, rng: random.Random):
+        self.level = node["level"]
+        self.name = node["name"]
+        self.official_id = f"off-{slug(self.name)}"
+        self.monitors = [monitor_id(a) for a in ancestors if a.get("monitor")]
+        names = {a["level"]: a["name"] for a in ancestors}
+        self.location = (
+            f"{names['province']} Province" if "province" in names else None,
+            names.get("district"),
+            names.get("municipal"),
+        )
+        # Most offices are close to the median, a few are much slower
+        self.slowness = rng.lognormvariate(0, 0.35)
+
+
+def pick(rng: random.Random, cumulative: list, items: list):
+    """Weighted choice by cumulative weights"""
+    return items[min(bisect.bisect(cumulative, rng.random() * cumulative[-1]), len(items) - 1)]
+
+
+def monitor_id(node: dict) -> str:
+    return f"monitor-{slug(node['name'])}-{node['level']}"
+
+
+def offices_with_weights(hierarchy: dict, rng: random.Random, skew: float):
+    """Every office and the cumulative weights used to pick one per application"""
+    offices = [Office(node, ancestors, rng) for node, ancestors in walk(hierarchy) if node.get("office")]
+    weights = []
+    for level, share in level_shares.items():
+        level_offices = [o for o in offices if o.level == level]
+        # Zipf over a seeded random ranking of the offices at each level
+        ranks = list(range(1, len(level_offices) + 1))
+        rng.shuffle(ranks)
+        zipf = [1 / rank ** skew for rank in ranks]
+        total = sum(zipf)
+        weights.extend((office, share * w / total) for office, w in zip(level_offices, zipf))
+    cumulative = []
+    running = 0.0
+    for _, weight in weights:
+        running += weight
+        cumulative.append(running)
+    return [office for office, _ in weights], cumulative
+
+
+# Records
+def official_records(hierarchy: dict, offices: list, hashed_password: str, created_at: str):
+    for office in offices:
+        yield {
+            "id": office.official_id,
+            "email": f"{office.official_id}@example.gov.np",
+            "full_name": office.name,
+            "phone": "061-520000",
+            "user_type": "official",
+            "hashed_password": hashed_password,
+            "created_at": created_at,
+            "citizenship_number": None,
+            "office_level": office.level,
+            "office_name": office.name,
+        }
+    for node, _ in walk(hierarchy):
+        if not node.get("monitor"):
+            continue
+        below = {n["level"] for n, _ in walk(node) if n is not node and n.get("office")}
+        yield {
+            "id": monitor_id(node),
+            "email": f"{monitor_id(node)}@example.gov.np",
+            "full_name": node["monitor"],
+            "phone": "061-590000",
+            "user_type": "official",
+            "hashed_password": hashed_password,
+            "created_at": created_at,
+            "citizenship_number": None,
+            "office_level": node["level"],
+            "office_name": node["monitor"],
+            "is_monitor": True,
+            "monitors": sorted(below),
+        }
+
+
+def citizen_profile(seed: int, index: int) -> dict:
+    """Stable identity of citizen number index, derived without any stored state"""
+    citizen_uuid = uuid.uuid5(CITIZEN_NAMESPACE, f"{seed}:{index}")
+    h = citizen_uuid.int
+    first = first_names[h % len(first_names)]
+    last = last_names[(h >> 8) % len(last_names)]
+    return {
+        "id": str(citizen_uuid),
+        "email": f"{first}.{last}.{index}@example.com".lower(),
+        "full_name": f"{first} {last}",
+        "phone": f"{phone_prefixes[(h >> 16) % len(phone_prefixes)]}{(h >> 24) % 10 ** 7:07d}",
+        "citizenship_number": f"{(h >> 56) % 10 ** 12:012d}",
     }
-    
-    return application
 
-# Main execution
-print("Loading existing applications...")
-applications = load_json('applications.json')
 
-print("Loading citizens...")
-citizens = load_json('citizens.json')
+def citizen_records(args, hashed_password: str, created_at: str):
+    for index in range(args.citizens):
+        yield {
+            **citizen_profile(args.seed, index),
+            "user_type": "citizen",
+            "hashed_password": hashed_password,
+            "created_at": created_at,
+            "office_level": None,
+            "office_name": None,
+        }
+
+
+def iso(timestamp: float) -> str:
+    return datetime.utcfromtimestamp(timestamp).isoformat()
+
+
+class ApplicationGenerator:
+    """Draws applications one at a time from the skewed distributions"""
+
+    def __init__(self, args, offices: list, cumulative: list, rng: random.Random):
+        self.args = args
+        self.offices = offices
+        self.cumulative = cumulative
+        self.rng = rng
+        self.now = time.time() if args.now is None else args.now
+        self.types = list(service_types)
+        self.type_cumulative = []
+        running = 0.0
+        for share, _ in service_types.values():
+            running += share
+            self.type_cumulative.append(running)
+
+    def submitted_at(self) -> float:
+        """Submission time: newer days busier, Saturdays quiet, office hours only"""
+        rng = self.rng
+        while True:
+            # Density grows linearly towards today
+            age_days = self.args.days * (1 - math.sqrt(rng.random()))
+            day = math.floor((self.now - age_days * SECONDS_PER_DAY) / SECONDS_PER_DAY)
+            # 1970-01-01 was a Thursday, so day % 7 == 2 is a Saturday
+            if day % 7 != 2 or rng.random() < 0.2:
+                break
+        return day * SECONDS_PER_DAY + rng.uniform(4.25, 11.25) * 3600  # 10:00-17:00 NPT
+
+    def citizen(self) -> dict:
+        # u ** (1 + skew) piles most picks on the low citizen numbers
+        index = int(self.args.citizens * self.rng.random() ** (1 + self.args.skew))
+        return citizen_profile(self.args.seed, index)
+
+    def application(self) -> dict:
+        rng = self.rng
+        office = pick(rng, self.cumulative, self.offices)
+        service_type = pick(rng, self.type_cumulative, self.types)
+        citizen = self.citizen()
+        submitted = min(self.submitted_at(), self.now - 60)
+        median_days = service_types[service_type][1] * office.slowness
+        processing_days = rng.lognormvariate(math.log(median_days), 0.5)
+        finished = submitted + processing_days * SECONDS_PER_DAY
+
+        completed_date = rejected_date = approved = rejection_message = None
+        if finished <= self.now and rng.random() < 0.97:
+            if rng.random() < 0.07:
+                status, stage, progress = "Rejected", "Rejected", rng.choice([20, 40, 60])
+                approved = False
+                rejection_message = rng.choice(rejection_messages)
+                rejected_date = iso(submitted + rng.uniform(0.2, 1.0) * (finished - submitted))
+            else:
+                status, stage, progress = "Completed", "Completed", 100
+                approved = True
+                completed_date = iso(finished)
+        elif self.now - submitted < 3600 * 6 or rng.random() < 0.25:
+            status, stage, progress = "Submitted", "Document Verification", 10
+        else:
+            status = "In Progress"
+            stage = rng.choice(in_progress_stages)
+            progress = 20 + 20 * in_progress_stages.index(stage)
+
+        province, district, municipality = office.location
+        return {
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "user_id": citizen["id"],
+            "full_name": citizen["full_name"],
+            "email": citizen["email"],
+            "phone": citizen["phone"],
+            "address": ", ".join(part for part in (municipality, district) if part) or "Kathmandu",
+            "citizenship_number": citizen["citizenship_number"],
+            "province": province,
+            "district": district,
+            "municipality": municipality,
+            "service_type": service_type,
+            "target_office_level": office.level,
+            "target_office_name": office.name,
+            "estimated_days": max(1, round(median_days * 1.5)),
+            "status": status,
+            "submitted_date": iso(submitted),
+            "completed_date": completed_date,
+            "rejected_date": rejected_date,
+            "current_stage": stage,
+            "progress": progress,
+            "approved": approved,
+            "rejection_message": rejection_message,
+        }
+
+
+def message_records(args, offices: list, cumulative: list, monitor_names: dict, rng: random.Random, now: float):
+    """Monitors writing to offices below them, busiest offices most often"""
+    for _ in range(args.messages):
+        office = pick(rng, cumulative, offices)
+        if not office.monitors:
+            continue
+        sender = rng.choice(office.monitors)
+        subject, content = rng.choice(message_subjects)
+        created = now - args.days * SECONDS_PER_DAY * rng.random()
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "sender_id": sender,
+            "sender_office": monitor_names[sender],
+            "sender_name": monitor_names[sender],
+            "recipient_id": office.official_id,
+            "recipient_office": office.name,
+            "subject": subject,
+            "content": content,
+            "priority": rng.choice(["low", "medium", "medium", "high", "urgent"]),
+            "created_at": iso(created),
+            "read": rng.random() < 0.6,
+        }
+
+
+# Writers
+class FileWriter:
+    """Stream records to a temp file and move it into place on close"""
+
+    def __init__(self, filepath: str, ndjson: bool):
+        self.filepath = filepath
+        self.ndjson = ndjson
+        fd, self.temp_path = tempfile.mkstemp(dir=os.path.dirname(filepath) or ".", suffix=".tmp")
+        if hasattr(os, "fchmod"):
+            os.fchmod(fd, file_mode(filepath))
+        self.file = os.fdopen(fd, "w")
+        self.count = 0
+        if not ndjson:
+            self.file.write("{")
+
+    def write(self, record: dict):
+        if self.ndjson:
+            self.file.write(json.dumps(record))
+            self.file.write("\n")
+        else:
+            # One "id": record pair per line keeps the output greppable
+            self.file.write(",\n" if self.count else "\n")
+            self.file.write(f"{json.dumps(record['id'])}: {json.dumps(record)}")
+        self.count += 1
+
+    def close(self):
+        if not self.ndjson:
+            self.file.write("\n}\n")
+        self.file.close()
+        os.replace(self.temp_path, self.filepath)
 
-# Get a citizen ID (or create a dummy one)
-citizen_ids = list(citizens.keys()) if citizens else [str(uuid.uuid4())]
+    def abort(self):
+        self.file.close()
+        os.remove(self.temp_path)
 
-print("\nGenerating sample applications for all 33 wards...")
-generated_count = 0
 
-for ward_num in range(1, 34):
-    # Generate 25-40 applications per ward
-    num_apps = random.randint(25, 40)
-    print(f"Generating {num_apps} applications for Ward {ward_num}...")
-    
-    for _ in range(num_apps):
-        citizen_id = random.choice(citizen_ids)
-        app = generate_application(ward_num, citizen_id)
-        applications[app['id']] = app
-        generated_count += 1
+class BackendWriter:
+    """Buffer records and hand them to a backend batch method"""
+
+    def __init__(self, create_many, chunk_rows: int):
+        self.create_many = create_many
+        self.chunk_rows = chunk_rows
+        self.pending = []
+        self.count = 0
+
+    def write(self, record: dict):
+        self.pending.append(record)
+        self.count += 1
+        if len(self.pending) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.create_many(self.pending)
+            self.pending = []
+
+    def close(self):
+        self.flush()
+
+    def abort(self):
+        self.pending = []
+
+
+def open_writers(args):
+    """Writers for users, officials, applications and messages, plus the backend to close"""
+    if args.format == "db" and os.getenv("DB_BACKEND", "json") == "sqlite":
+        from sqlite_database import SQLiteDatabase
+        sqlite_path = os.getenv("DB_SQLITE_PATH", os.path.join(args.out, "sarkaha.db"))
+        backend = SQLiteDatabase(sqlite_path, args.out)
+        print(f"Writing to SQLite database {sqlite_path}")
+        return {
+            "citizens": BackendWriter(backend.create_users, args.chunk),
+            "officials": BackendWriter(backend.create_users, args.chunk),
+            "applications": BackendWriter(backend.create_applications, args.chunk),
+            "messages": BackendWriter(backend.create_messages, args.chunk),
+        }, backend
+
+    ndjson = args.format == "ndjson"
+    extension = "ndjson" if ndjson else "json"
+    if not ndjson:
+        # Stale log entries would be replayed over the fresh collections
+        wal_path = os.path.join(args.out, "wal.log")
+        if os.path.exists(wal_path):
+            os.remove(wal_path)
+    return {
+        name: FileWriter(os.path.join(args.out, f"{name}.{extension}"), ndjson)
+        for name in ("citizens", "officials", "applications", "messages")
+    }, None
+
+
+def write_manifest(args, hierarchy: dict, offices: list, cumulative: list, counts: dict):
+    """dataset.json: how the data was generated and which accounts see the most load"""
+    weights = [b - a for a, b in zip([0.0] + cumulative, cumulative)]
+    busiest = sorted(range(len(offices)), key=lambda i: weights[i], reverse=True)[:10]
+    manifest = {
+        "parameters": {k: v for k, v in vars(args).items() if k != "password"},
+        "counts": counts,
+        "busiest_offices": [
+            {"email": f"{offices[i].official_id}@example.gov.np", "office_level": offices[i].level,
+             "office_name": offices[i].name, "share": round(weights[i] / cumulative[-1], 4)}
+            for i in busiest
+        ],
+        "national_monitor": f"{monitor_id(hierarchy)}@example.gov.np",
+    }
+    with open(os.path.join(args.out, "dataset.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic load-testing dataset")
+    parser.add_argument("--applications", type=int, default=100000)
+    parser.add_argument("--citizens", type=int, default=20000)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--provinces", type=int, default=len(PROVINCES), choices=range(1, len(PROVINCES) + 1),
+                        metavar="1-7")
+    parser.add_argument("--districts", type=int, default=11, help="districts per province")
+    parser.add_argument("--municipalities", type=int, default=8, help="municipalities per district")
+    parser.add_argument("--wards", type=int, default=10, help="wards per municipality (Pokhara has 33)")
+    parser.add_argument("--days", type=int, default=365, help="spread submissions over this many days")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of office and citizen load")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--now", type=float, help="epoch seconds to treat as now (default: current time)")
+    parser.add_argument("--format", choices=["json", "ndjson", "db"], default="json")
+    parser.add_argument("--out", default=os.path.join("data", "synthetic"), help="output directory")
+    parser.add_argument("--password", default="password123", help="password of every generated user")
+    parser.add_argument("--chunk", type=int, default=10000, help="records per backend write (db format)")
+    args = parser.parse_args()
+    if args.format == "db" and os.getenv("DB_BACKEND", "json") != "sqlite":
+        print("DB_BACKEND is json: writing its collection files")
+
+    from auth import get_password_hash
+
+    started = time.perf_counter()
+    rng = random.Random(args.seed)
+    os.makedirs(args.out, exist_ok=True)
+    hierarchy = build_hierarchy(args)
+    with open(os.path.join(args.out, "hierarchy.json"), "w") as f:
+        json.dump(hierarchy, f, indent=2)
+    offices, cumulative = offices_with_weights(hierarchy, rng, args.skew)
+    print(f"Hierarchy: {len(offices)} offices")
+
+    hashed_password = get_password_hash(args.password)
+    now = time.time() if args.now is None else args.now
+    created_at = iso(now - args.days * SECONDS_PER_DAY)
+    writers, backend = open_writers(args)
+    try:
+        monitor_names = {}
+        for official in official_records(hierarchy, offices, hashed_password, created_at):
+            if official.get("is_monitor"):
+                monitor_names[official["id"]] = official["office_name"]
+            writers["officials"].write(official)
+        print(f"Officials: {writers['officials'].count}")
+
+        for citizen in citizen_records(args, hashed_password, created_at):
+            writers["citizens"].write(citizen)
+        print(f"Citizens: {writers['citizens'].count}")
 
-print(f"\nGenerated {generated_count} total applications")
-print(f"Total applications in database: {len(applications)}")
+        generator = ApplicationGenerator(args, offices, cumulative, rng)
+        report_every = max(args.applications // 10, 1)
+        for i in range(1, args.applications + 1):
+            writers["applications"].write(generator.application())
+            if i % report_every == 0:
+                seconds = time.perf_counter() - started
+                print(f"Applications: {i}/{args.applications} ({i / seconds:.0f}/s)", flush=True)
 
-print("\nSaving applications...")
-save_json('applications.json', applications)
+        for message in message_records(args, offices, cumulative, monitor_names, rng, generator.now):
+            writers["messages"].write(message)
+        print(f"Messages: {writers['messages'].count}")
+    except BaseException:
+        # Leave existing files alone rather than replacing them with partial ones
+        for writer in writers.values():
+            writer.abort()
+        raise
+    else:
+        for writer in writers.values():
+            writer.close()
+        write_manifest(args, hierarchy, offices, cumulative, {
+            name: writer.count for name, writer in writers.items()
+        })
+    finally:
+        if backend is not None:
+            backend.close()
 
-print("✅ Done! Sample applications generated successfully!")
+    print(f"✅ Done in {time.perf_counter() - started:.1f}s, written to {args.out}")
 
-# Print summary
-print("\n📊 Summary by Ward:")
-for ward_num in range(1, 34):
-    ward_apps = [app for app in applications.values() 
-                 if app.get('ward') == ward_num or app.get('target_office_name') == f"Ward {ward_num} - Pokhara Ward Office"]
-    print(f"Ward {ward_num:2d}: {len(ward_apps):3d} applications")
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Office hierarchy (ward -> municipality -> district -> province -> nation)
+and the rollup engine that keeps every node's stats up to date.
+
+The tree is loaded from data/hierarchy.json. A node either maps to a real
+office (``"office": true``, keyed by its level and name like applications'
+target office), carries a published ``baseline`` summary for offices that
+are not on the portal yet, or just groups its children. Each node's
+aggregate is built once, bottom-up, and afterwards every application
+change is applied to its office node and that node's ancestors.
+"""
+
+import json
+import os
+from typing import Dict, List, Optional
+
+from aggregates import AggregateStore, OfficeAggregate, office_key
+
+
+class HierarchyNode:
+    """One office in the hierarchy tree"""
+
+    __slots__ = ("id", "name", "level", "monitor", "office", "baseline",
+                 "parent", "children", "aggregate", "_stats")
+
+    def __init__(self, spec: dict, parent: "HierarchyNode" = None):
+        self.id = spec["id"]
+        self.name = spec["name"]
+        self.level = spec["level"]
+        self.monitor = spec.get("monitor")
+        self.office = (self.level, self.name) if spec.get("office") else None
+        self.baseline = OfficeAggregate.from_summary(spec["baseline"]) if "baseline" in spec else None
+        self.parent = parent
+        self.children: List[HierarchyNode] = [
+            HierarchyNode(child, self) for child in spec.get("children", [])
+        ]
+        self.aggregate = OfficeAggregate()
+        self._stats = None
+
+    def walk(self):
+        """Yield this node and all descendants, children before parents"""
+        for child in self.children:
+            yield from child.walk()
+        yield self
+
+    def stats(self) -> dict:
+        """SubordinateOfficeStats dict, cached until the aggregate changes"""
+        if self._stats is None:
+            self._stats = self.aggregate.to_stats(self.id, self.name, self.level)
+        return self._stats
+
+
+class OfficeHierarchy:
+    """Hierarchy tree with rolled-up aggregates on every node"""
+
+    def __init__(self, root_spec: dict = None):
+        self.root = HierarchyNode(root_spec) if root_spec else None
+        self.nodes: Dict[str, HierarchyNode] = {}
+        self._by_office: Dict[tuple, HierarchyNode] = {}
+        self._by_monitor: Dict[str, HierarchyNode] = {}
+        if self.root is not None:
+            for node in self.root.walk():
+                self.nodes[node.id] = node
+                if node.office is not None:
+                    self._by_office[node.office] = node
+                if node.monitor:
+                    self._by_monitor[node.monitor] = node
+
+    @classmethod
+    def load(cls, filepath: str) -> "OfficeHierarchy":
+        """Load the tree from JSON, or an empty hierarchy if there is none"""
+        if not os.path.exists(filepath):
+            return cls()
+        try:
+            with open(filepath, 'r') as f:
+                return cls(json.load(f))
+        except Exception as e:
+            print(f"Error loading {filepath}: {e}")
+            return cls()
+
+    def rebuild(self, store: AggregateStore):
+        """Compute every node's aggregate bottom-up from the office counters"""
+        if self.root is None:
+            return
+        for node in self.root.walk():
+            aggregate = node.baseline.copy() if node.baseline else OfficeAggregate()
+            if node.office is not None:
+                aggregate.merge(store.get(*node.office))
+            for child in node.children:
+                aggregate.merge(child.aggregate)
+            node.aggregate = aggregate
+            node._stats = None
+
+    def apply(self, app: dict, sign: int = 1, days: int = None):
+        """Add (sign=1) or remove (sign=-1) an application along its path to the root"""
+        node = self._by_office.get(office_key(app))
+        while node is not None:
+            node.aggregate.apply(app, sign, days)
+            node._stats = None
+            node = node.parent
+
+    def node_for_monitor(self, monitor_office: str) -> Optional[HierarchyNode]:
+        """Node watched by a monitoring account, by the account's office_name"""
+        return self._by_monitor.get(monitor_office)
@@ -0,0 +1,128 @@
+"""
+Bulk-import applications from an NDJSON file (one application per line).
+
+By default records are posted in batches to a running server, so they go
+through its Database and the server keeps serving:
+
+    python import_applications.py wards.ndjson --email ward3@example.com
+
+With --local the file is imported straight into the data directory. Only
+use that while the server is stopped.
+
+    python import_applications.py wards.ndjson --local --user-id <official id>
+
+Use - as the file name to read from stdin.
+"""
+import argparse
+import getpass
+import json
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+def print_progress(report: dict):
+    print(f"  {report['received']:>8} read  {report['imported']:>8} imported  "
+          f"{report['failed']:>6} failed  {report['rows_per_second']:>9.1f} rows/s", flush=True)
+
+
+def print_errors(errors: list):
+    for error in errors:
+        print(f"  line {error['line']}: {error['detail']}")
+
+
+def login(url: str, email: str, password: str) -> str:
+    request = urllib.request.Request(
+        f"{url}/api/auth/login",
+        data=json.dumps({"email": email, "password": password}).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)["access_token"]
+
+
+def post_batch(url: str, token: str, lines: list) -> dict:
+    request = urllib.request.Request(
+        f"{url}/api/applications/import",
+        data=b"".join(lines),
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "application/x-ndjson"},
+        method="POST"
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def import_remote(source, args) -> dict:
+    token = args.token or login(args.url, args.email, getpass.getpass("Password: "))
+    totals = {"received": 0, "imported": 0, "failed": 0}
+    started = time.perf_counter()
+    line_offset = 0
+    batch = []
+
+    def send():
+        nonlocal line_offset
+        report = post_batch(args.url, token, batch)
+        for key in totals:
+            totals[key] += report[key]
+        for error in report["errors"]:
+            error["line"] += line_offset
+        print_errors(report["errors"])
+        line_offset += len(batch)
+        batch.clear()
+        seconds = time.perf_counter() - started
+        print_progress({**totals, "rows_per_second": totals["received"] / seconds if seconds else 0})
+
+    for line in source:
+        batch.append(line if line.endswith(b"\n") else line + b"\n")
+        if len(batch) >= args.batch:
+            send()
+    if batch:
+        send()
+    seconds = time.perf_counter() - started
+    return {**totals, "seconds": round(seconds, 3)}
+
+
+def import_local(source, args) -> dict:
+    from database import db
+    from ingest import ApplicationImporter
+
+    importer = ApplicationImporter(db, args.user_id, on_progress=print_progress)
+    report = importer.run(source)
+    db.close()
+    print_errors(report["errors"])
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import applications from NDJSON")
+    parser.add_argument("file", help="NDJSON file, or - for stdin")
+    parser.add_argument("--url", default="http://localhost:8000", help="server to post to")
+    parser.add_argument("--token", help="access token of an official")
+    parser.add_argument("--email", help="log in as this official instead of passing --token")
+    parser.add_argument("--batch", type=int, default=5000, help="lines per request")
+    parser.add_argument("--local", action="store_true", help="write to the data directory directly")
+    parser.add_argument("--user-id", default="import", help="user_id for records without one (--local)")
+    args = parser.parse_args()
+
+    if not args.local and not (args.token or args.email):
+        parser.error("pass --token or --email (or --local)")
+
+    source = sys.stdin.buffer if args.file == "-" else open(args.file, "rb")
+    try:
+        print(f"Importing {args.file}...")
+        report = import_local(source, args) if args.local else import_remote(source, args)
+    except urllib.error.HTTPError as e:
+        print(f"❌ Server returned {e.code}: {e.read().decode(errors='replace')}")
+        sys.exit(1)
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+
+    print(f"✅ Imported {report['imported']} of {report['received']} applications "
+          f"({report['failed']} failed) in {report['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+In-memory secondary indexes for the Database collections.
+"""
+
+from bisect import bisect_left, insort
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+
+class HashIndex:
+    """Groups records by a key so lookups cost O(result) instead of O(N)"""
+
+    def __init__(self, key_func: Callable[[dict], Optional[Hashable]]):
+        self.key_func = key_func
+        # key -> {record_id: record}, kept in insertion order
+        self._buckets: Dict[Hashable, Dict[str, dict]] = {}
+
+    def add(self, record_id: str, record: dict):
+        """Index a record under its current key"""
+        key = self.key_func(record)
+        if key is None:
+            return
+        self._buckets.setdefault(key, {})[record_id] = record
+
+    def remove(self, record_id: str, record: dict):
+        """Remove a record; call before mutating fields used by the key"""
+        key = self.key_func(record)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return
+        bucket.pop(record_id, None)
+        if not bucket:
+            del self._buckets[key]
+
+    def get(self, key: Hashable) -> List[dict]:
+        """All records indexed under key"""
+        return list(self._buckets.get(key, {}).values())
+
+    def ids(self, key: Hashable) -> List[str]:
+        """Ids of all records indexed under key"""
+        return list(self._buckets.get(key, ()))
+
+    def first(self, key: Hashable) -> Optional[dict]:
+        """First record indexed under key, or None"""
+        bucket = self._buckets.get(key)
+        if not bucket:
+            return None
+        return next(iter(bucket.values()))
+
+    def rebuild(self, records: Dict[str, dict]):
+        """Re-index a whole collection"""
+        self._buckets = {}
+        for record_id, record in records.items():
+            self.add(record_id, record)
+
+    def state(self):
+        """Index contents for a snapshot (pickled with the records they point to)"""
+        return self._buckets
+
+    def load_state(self, state):
+        self._buckets = state
+
+
+class OrderedIndex:
+    """Groups record ids by a key, each group sorted by (sort value, record id)"""
+
+    def __init__(self, key_func: Callable[[dict], Optional[Hashable]],
+                 sort_func: Callable[[dict], str]):
+        self.key_func = key_func
+        self.sort_func = sort_func
+        # key -> ascending list of (sort value, record_id)
+        self._entries: Dict[Hashable, List[Tuple[str, str]]] = {}
+
+    def _entry(self, record_id: str, record: dict) -> Tuple[str, str]:
+        return (self.sort_func(record) or "", record_id)
+
+    def add(self, record_id: str, record: dict):
+        key = self.key_func(record)
+        if key is None:
+            return
+        insort(self._entries.setdefault(key, []), self._entry(record_id, record))
+
+    def remove(self, record_id: str, record: dict):
+        """Remove a record; call before mutating fields used by the key or sort"""
+        entries = self._entries.get(self.key_func(record))
+        if not entries:
+            return
+        entry = self._entry(record_id, record)
+        position = bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+        if not entries:
+            del self._entries[self.key_func(record)]
+
+    def iter_descending(self, key: Hashable, before: Tuple[str, str] = None) -> Iterator[str]:
+        """Record ids under key, newest first, starting strictly below before"""
+        entries = self._entries.get(key, [])
+        position = bisect_left(entries, before) if before is not None else len(entries)
+        for i in range(position - 1, -1, -1):
+            yield entries[i][1]
+
+    def rebuild(self, records: Dict[str, dict]):
+        self._entries = {}
+        for record_id, record in records.items():
+            key = self.key_func(record)
+            if key is not None:
+                self._entries.setdefault(key, []).append(self._entry(record_id, record))
+        for entries in self._entries.values():
+            entries.sort()
+
+    def state(self):
+        """Index contents for a snapshot"""
+        return self._entries
+
+    def load_state(self, state):
+        self._entries = state
@@ -0,0 +1,162 @@
+"""
+Streaming NDJSON import of applications.
+
+Lines are parsed and validated against ApplicationImport in chunks of
+IMPORT_CHUNK_ROWS, and each chunk of valid records goes through a single
+Database.create_applications call, so indexes, aggregates and trends stay
+consistent and a large file never has to fit in memory. Used by
+POST /api/applications/import and by import_applications.py.
+"""
+
+from datetime import datetime
+from typing import AsyncIterator, Callable, Iterable, List, Optional, Tuple
+import json
+import os
+import random
+import time
+import uuid
+
+from pydantic import ValidationError
+
+from models import ApplicationImport
+
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "1000"))
+MAX_REPORTED_ERRORS = 100
+
+
+def build_application(record: ApplicationImport, default_user_id: str) -> dict:
+    """Stored application for a validated import record, filling defaults
+    the way POST /api/applications does"""
+    application = record.model_dump(exclude_none=True)
+    application.setdefault("id", "APP" + str(uuid.uuid4())[:8].upper())
+    application.setdefault("user_id", default_user_id)
+    application.setdefault("status", "Submitted")
+    application.setdefault("current_stage", "Document Verification")
+    application.setdefault("estimated_days", random.randint(3, 7))
+    application.setdefault("progress", 10)
+    submitted = record.submitted_date or datetime.utcnow()
+    application["submitted_date"] = submitted.isoformat()
+    return application
+
+
+class ImportReport:
+    """Running counters for an import"""
+
+    def __init__(self):
+        self.received = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+        self.started = time.perf_counter()
+
+    def error(self, line: int, detail: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "detail": detail})
+
+    def to_dict(self) -> dict:
+        seconds = time.perf_counter() - self.started
+        return {
+            "received": self.received,
+            "imported": self.imported,
+            "failed": self.failed,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(self.received / seconds, 1) if seconds > 0 else 0.0,
+            "errors": self.errors,
+        }
+
+
+class ApplicationImporter:
+    """Feed NDJSON lines with add(); write each full chunk with flush().
+
+    office_allowed, if given, is called with (office_level, office_name)
+    and rejects records for offices the importer may not write to. Records
+    whose id already exists are rejected too: an import never replaces an
+    application. on_imported, if given, receives each written chunk.
+    """
+
+    def __init__(self, db, default_user_id: str,
+                 office_allowed: Optional[Callable[[Tuple[str, str]], bool]] = None,
+                 chunk_rows: int = IMPORT_CHUNK_ROWS,
+                 on_progress: Optional[Callable[[dict], None]] = None,
+                 on_imported: Optional[Callable[[List[dict]], None]] = None):
+        self.db = db
+        self.default_user_id = default_user_id
+        self.office_allowed = office_allowed
+        self.chunk_rows = chunk_rows
+        self.on_progress = on_progress
+        self.on_imported = on_imported
+        self.report = ImportReport()
+        self._line_number = 0
+        # (line number, raw str or bytes line); json.loads decodes bytes itself
+        self._pending: List[Tuple[int, object]] = []
+
+    def add(self, line) -> bool:
+        """Queue one line; True once a chunk is ready to flush"""
+        self._line_number += 1
+        if line.strip():
+            self._pending.append((self._line_number, line))
+        return len(self._pending) >= self.chunk_rows
+
+    def flush(self):
+        """Validate the queued lines and write the valid ones in one call"""
+        pending, self._pending = self._pending, []
+        applications = []
+        chunk_ids = set()
+        for line_number, line in pending:
+            self.report.received += 1
+            try:
+                record = ApplicationImport.model_validate(json.loads(line))
+            except ValueError as e:
+                # Bad UTF-8, bad JSON and pydantic's ValidationError are all ValueErrors
+                detail = _validation_detail(e) if isinstance(e, ValidationError) else f"Invalid JSON: {e}"
+                self.report.error(line_number, detail)
+                continue
+            office = (record.target_office_level, record.target_office_name)
+            if self.office_allowed is not None and not self.office_allowed(office):
+                self.report.error(line_number, f"Not allowed to import into {office[1]}")
+                continue
+            if record.id is not None and (record.id in chunk_ids or self.db.get_application_by_id(record.id)):
+                # Imports only add applications; changing one goes through the update routes
+                self.report.error(line_number, f"Application {record.id} already exists")
+                continue
+            application = build_application(record, self.default_user_id)
+            chunk_ids.add(application["id"])
+            applications.append(application)
+        if applications:
+            imported = self.db.create_applications(applications, replace=False)
+            # Ids created by another writer since the check above are skipped, not replaced
+            self.report.failed += len(applications) - imported
+            self.report.imported += imported
+            if self.on_imported is not None:
+                if imported < len(applications):
+                    applications = [a for a in applications if self.db.get_application_by_id(a["id"]) == a]
+                self.on_imported(applications)
+        if pending and self.on_progress is not None:
+            self.on_progress(self.report.to_dict())
+
+    def run(self, lines: Iterable) -> dict:
+        """Import every line of a (file-like) iterable"""
+        for line in lines:
+            if self.add(line):
+                self.flush()
+        self.flush()
+        return self.report.to_dict()
+
+
+async def aiter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a streamed request body into lines without buffering all of it"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+def _validation_detail(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+    )
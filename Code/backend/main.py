@@ -1,20 +1,32 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timedelta
+import asyncio
+import base64
+import json
 import uuid
-from typing import List
+from typing import List, Optional
 import random
 
 from models import (
     UserCreate, UserLogin, User, Token,
-    ApplicationCreate, ApplicationUpdate, Application,
+    ApplicationCreate, ApplicationUpdate, Application, ApplicationPage,
+    ApplicationBatchUpdate, ApplicationBatchResponse, ApplicationImportReport,
     OfficeStats, MessageCreate, Message,
-    HierarchyStats, SubordinateOfficeStats
+    HierarchyStats, SubordinateOfficeStats, TrendStats
 )
-from database import db
+from database import db, PRELOAD
+from responses import trusted, trusted_records
+import events
+import export
+import ingest
+import metrics
+import profiling
 from auth import (
-    get_password_hash, verify_password, create_access_token,
-    get_current_user, require_official
+    get_password_hash_async, verify_password_async, create_access_token,
+    get_current_user, require_official, shutdown_password_executor, user_from_token
 )
 
 app = FastAPI(
@@ -32,6 +44,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profile single requests on demand (X-Profile header, officials only)
+if profiling.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware, authorize=user_from_token)
+
+# Outermost, so CORS handling is timed too
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+    metrics.collection_size.set_function(
+        lambda: {(collection,): size for collection, size in db.collection_sizes().items()}
+    )
+
+@app.on_event("startup")
+def startup():
+    # Pay the data load before serving rather than on the first requests
+    if PRELOAD:
+        db.load()
+
+@app.on_event("shutdown")
+def shutdown():
+    shutdown_password_executor()
+    db.close()
+
+def _publish_application(application: dict, deleted: bool = False):
+    """Push an application change to its trackers, its applicant and its office"""
+    topics = [
+        events.application_topic(application["id"]),
+        events.user_topic(application.get("user_id")),
+        events.office_topic(application.get("target_office_level"),
+                            application.get("target_office_name")),
+    ]
+    if deleted:
+        events.event_hub.publish(topics, "application_deleted", {"id": application["id"]})
+    else:
+        data = {field: application.get(field) for field in Application.model_fields}
+        events.event_hub.publish(topics, "application", data)
+
 # ============= AUTH ROUTES =============
 
 @app.post("/api/auth/register", response_model=Token, status_code=status.HTTP_201_CREATED)
@@ -57,7 +105,7 @@ async def register(user_data: UserCreate):
     
     # Create user
     user_id = str(uuid.uuid4())
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     
     user = {
         "id": user_id,
@@ -93,7 +141,7 @@ async def login(credentials: UserLogin):
     """
     user = db.get_user_by_email(credentials.email)
     
-    if not user or not verify_password(credentials.password, user.get("hashed_password")):
+    if not user or not await verify_password_async(credentials.password, user.get("hashed_password")):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -154,9 +202,74 @@ async def create_application(
     }
     
     db.create_application(application)
+    _publish_application(application)
     
     return application
 
+def _encode_cursor(application: dict) -> str:
+    """Opaque cursor pointing just below an application in newest-first order"""
+    position = [application.get("submitted_date") or "", application["id"]]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def _decode_cursor(cursor: Optional[str]):
+    if not cursor:
+        return None
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        position = None
+    # Compared against stored (submitted_date, id) strings in the page indexes
+    if not (isinstance(position, list) and len(position) == 2
+            and all(isinstance(value, str) for value in position)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return tuple(position)
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in Application.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    if "id" not in selected:
+        selected.insert(0, "id")
+    return selected
+
+def _application_page(limit: int, cursor: Optional[str], fields: Optional[str], **scope) -> dict:
+    """Fetch one newest-first page of applications and project it"""
+    selected = _parse_fields(fields)
+    # Fetch one extra item to learn whether another page exists
+    items = db.get_applications_page(before=_decode_cursor(cursor), limit=limit + 1, **scope)
+    next_cursor = _encode_cursor(items[limit - 1]) if len(items) > limit else None
+    # Without a projection every Application field is returned, as on the list routes
+    selected = selected or list(Application.model_fields)
+    items = [{field: app.get(field) for field in selected} for app in items[:limit]]
+    return {"items": trusted_records(items, Application), "next_cursor": next_cursor}
+
+@app.get("/api/applications/page", response_model=ApplicationPage,
+         response_model_exclude_unset=True)
+async def get_my_applications_page(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    service_type: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get current user's applications one page at a time, newest first
+    """
+    return trusted(_application_page(
+        limit, cursor, fields,
+        user_id=current_user["id"], status=status_filter, service_type=service_type
+    ))
+
 @app.get("/api/applications/{application_id}", response_model=Application)
 async def get_application(application_id: str):
     """
@@ -170,7 +283,7 @@ async def get_application(application_id: str):
             detail="Application not found"
         )
     
-    return application
+    return trusted(application, Application)
 
 @app.get("/api/applications", response_model=List[Application])
 async def get_my_applications(current_user: dict = Depends(get_current_user)):
@@ -178,7 +291,91 @@ async def get_my_applications(current_user: dict = Depends(get_current_user)):
     Get all applications for current user
     """
     applications = db.get_applications_by_user(current_user["id"])
-    return applications
+    return trusted(applications, Application)
+
+def _application_changes(application: dict, update_data: ApplicationUpdate) -> dict:
+    """Fields to set on an application, stamping rejected_date on rejection"""
+    updates = {k: v for k, v in update_data.dict(exclude={"id"}).items() if v is not None}
+    if updates.get("status") == "Rejected" and application.get("status") != "Rejected":
+        updates["rejected_date"] = datetime.utcnow().isoformat()
+    return updates
+
+MAX_BATCH_UPDATE = 500
+
+@app.put("/api/applications/batch", response_model=ApplicationBatchResponse)
+async def update_applications(
+    batch: ApplicationBatchUpdate,
+    current_user: dict = Depends(require_official)
+):
+    """
+    Update many applications of current official's office in one write.
+    
+    Every item is checked first; the valid ones are applied together and
+    each item gets its own status code (200, 403, 404, or 409 for an id
+    repeated in the batch).
+    """
+    if len(batch.items) > MAX_BATCH_UPDATE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_UPDATE} applications can be updated at once"
+        )
+    
+    office = (current_user.get("office_level"), current_user.get("office_name"))
+    results = []
+    accepted = {}
+    updates = {}
+    for item in batch.items:
+        result = {"id": item.id, "status_code": status.HTTP_200_OK}
+        results.append(result)
+        application = db.get_application_by_id(item.id)
+        if item.id in updates:
+            result.update(status_code=status.HTTP_409_CONFLICT,
+                          detail="Application appears more than once in the batch")
+        elif not application:
+            result.update(status_code=status.HTTP_404_NOT_FOUND, detail="Application not found")
+        elif (application.get("target_office_level"), application.get("target_office_name")) != office:
+            result.update(status_code=status.HTTP_403_FORBIDDEN,
+                          detail="You don't have permission to update this application")
+        else:
+            accepted[item.id] = result
+            updates[item.id] = _application_changes(application, item)
+    
+    updated = db.update_applications(updates)
+    for app_id, application in updated.items():
+        accepted[app_id]["application"] = application
+        _publish_application(application)
+    
+    return {"updated": len(updated), "results": results}
+
+@app.post("/api/applications/import", response_model=ApplicationImportReport)
+async def import_applications(
+    request: Request,
+    current_user: dict = Depends(require_official)
+):
+    """
+    Import applications from an NDJSON body, one ApplicationImport per line.
+    
+    The body is read as a stream and written in chunks from a worker thread,
+    so the server keeps serving during large imports. Officials can import
+    into their own office, monitors also into every office they oversee.
+    Records whose id already exists are rejected, never replaced.
+    """
+    allowed_offices = {(current_user.get("office_level"), current_user.get("office_name"))}
+    if current_user.get("is_monitor"):
+        allowed_offices.update(_monitored_offices(current_user))
+    
+    def publish_imported(applications: List[dict]):
+        for application in applications:
+            _publish_application(application)
+    
+    importer = ingest.ApplicationImporter(db, current_user["id"], allowed_offices.__contains__,
+                                          on_imported=publish_imported)
+    async for line in ingest.aiter_lines(request.stream()):
+        if importer.add(line):
+            await run_in_threadpool(importer.flush)
+    await run_in_threadpool(importer.flush)
+    
+    return importer.report.to_dict()
 
 @app.put("/api/applications/{application_id}", response_model=Application)
 async def update_application(
@@ -206,8 +403,9 @@ async def update_application(
         )
     
     # Update application
-    updates = {k: v for k, v in update_data.dict().items() if v is not None}
+    updates = _application_changes(application, update_data)
     updated_app = db.update_application(application_id, updates)
+    _publish_application(updated_app)
     
     return updated_app
 
@@ -246,6 +444,7 @@ async def delete_application(
     success = db.delete_application(application_id)
     
     if success:
+        _publish_application(application, deleted=True)
         return {"message": "Application deleted successfully", "id": application_id}
     else:
         raise HTTPException(
@@ -264,21 +463,54 @@ async def get_office_applications(current_user: dict = Depends(require_official)
         current_user["office_level"],
         current_user["office_name"]
     )
-    return applications
+    return trusted(applications, Application)
+
+@app.get("/api/office/applications/page", response_model=ApplicationPage,
+         response_model_exclude_unset=True)
+async def get_office_applications_page(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    service_type: Optional[str] = None,
+    current_user: dict = Depends(require_official)
+):
+    """
+    Get current official's office applications one page at a time, newest first
+    """
+    return trusted(_application_page(
+        limit, cursor, fields,
+        office=(current_user["office_level"], current_user["office_name"]),
+        status=status_filter, service_type=service_type
+    ))
+
+@app.get("/api/office/applications/export")
+async def export_office_applications(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    current_user: dict = Depends(require_official)
+):
+    """
+    Stream all applications of current official's office as NDJSON or CSV
+    """
+    records = db.iter_applications_by_office(
+        current_user["office_level"],
+        current_user["office_name"]
+    )
+    return _export_response(records, export_format, current_user["office_name"])
 
 @app.get("/api/office/stats", response_model=OfficeStats)
 async def get_office_stats(current_user: dict = Depends(require_official)):
     """
     Get statistics for current official's office
     """
-    applications = db.get_applications_by_office(
+    aggregate = db.get_office_aggregate(
         current_user["office_level"],
         current_user["office_name"]
     )
     
-    total = len(applications)
-    completed = len([app for app in applications if app.get("status") == "Approved"])
-    pending = len([app for app in applications if app.get("status") in ["Submitted", "In Progress"]])
+    total = aggregate.total
+    completed = aggregate.status_counts.get("Approved", 0)
+    pending = aggregate.pending
     
     efficiency = (completed / total * 100) if total > 0 else 0
     avg_processing_time = 3.5  # Mock data for now
@@ -290,9 +522,32 @@ async def get_office_stats(current_user: dict = Depends(require_official)):
         "completed": completed,
         "pending": pending,
         "efficiency": round(efficiency, 2),
-        "avg_processing_time": avg_processing_time
+        "avg_processing_time": avg_processing_time,
+        **aggregate.processing_percentiles()
     }
 
+def _trend_response(office_id: str, offices: List[tuple], days: int, interval: str,
+                    status_filter: Optional[str], service_type: Optional[str]) -> dict:
+    buckets = db.get_trends(
+        offices, days=days, interval=interval, status=status_filter, service_type=service_type
+    )
+    return trusted({"office_id": office_id, "interval": interval, "days": days, "buckets": buckets})
+
+@app.get("/api/office/trends", response_model=TrendStats)
+async def get_office_trends(
+    days: int = Query(90, ge=1, le=366),
+    interval: str = Query("day", pattern="^(day|week)$"),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    service_type: Optional[str] = None,
+    current_user: dict = Depends(require_official)
+):
+    """
+    Daily or weekly submitted/completed/rejected counts for current official's office
+    """
+    office = (current_user["office_level"], current_user["office_name"])
+    return _trend_response(f"{office[0]}:{office[1]}", [office], days, interval,
+                           status_filter, service_type)
+
 @app.get("/api/hierarchy/subordinates")
 async def get_subordinate_offices(current_user: dict = Depends(require_official)):
     """
@@ -311,916 +566,150 @@ async def get_subordinate_offices(current_user: dict = Depends(require_official)
 
 # ============= HIERARCHY MONITORING ROUTES =============
 
-@app.get("/api/monitor/hierarchy-stats", response_model=HierarchyStats)
-async def get_hierarchy_stats(current_user: dict = Depends(require_official)):
-    """
-    Get comprehensive hierarchy statistics for monitoring accounts
-    """
+def _require_monitor(current_user: dict):
     if not current_user.get("is_monitor"):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only monitoring accounts can access this endpoint"
         )
-    
-    monitor_level = current_user["office_level"]
-    monitored_levels = current_user.get("monitors", [])
-    
-    # Special handling for National Monitor
-    if current_user.get("office_name") == "National Monitor":
-        # Get all applications
-        all_applications = db.get_all_applications()
-        
-        # Calculate Gandaki data by summing all districts in Gandaki
-        # This includes: Kaski (from municipalities), Baglung, Gorkha, Lamjung, Manang, Mustang, Myagdi, Nawalpur, Parbat, Syangja, Tanahun
-        
-        # Get Pokhara ward applications (for Kaski calculation)
-        pokhara_ward_apps = [app for app in all_applications 
-                            if app.get("target_office_level") == "local" 
-                            and "Pokhara Ward Office" in app.get("target_office_name", "")]
-        
-        # Calculate Pokhara stats (sum of all ward applications)
-        pokhara_total = len(pokhara_ward_apps)
-        pokhara_completed = len([a for a in pokhara_ward_apps if a.get("status") == "Completed"])
-        pokhara_pending = len([a for a in pokhara_ward_apps if a.get("status") in ["Submitted", "In Progress"]])
-        pokhara_rejected = len([a for a in pokhara_ward_apps if a.get("status") == "Rejected" or a.get("approved") == False])
-        pokhara_in_progress = len([a for a in pokhara_ward_apps if a.get("status") == "In Progress"])
-        
-        # Pokhara applications by type
-        pokhara_apps_by_type = {}
-        for app in pokhara_ward_apps:
-            service_type = app.get("service_type", "unknown")
-            pokhara_apps_by_type[service_type] = pokhara_apps_by_type.get(service_type, 0) + 1
-        
-        # Mock data for other municipalities in Kaski (same as used in Gandaki and Kaski monitors)
-        annapurna_total = 324
-        annapurna_completed = 278
-        annapurna_pending = 38
-        annapurna_rejected = 8
-        annapurna_in_progress = 26
-        annapurna_apps_by_type = {
-            "national-id": 112,
-            "birth-certificate": 98,
-            "marriage-certificate": 76,
-            "land-certificate": 38
-        }
-        
-        machhapuchchhre_total = 267
-        machhapuchchhre_completed = 221
-        machhapuchchhre_pending = 35
-        machhapuchchhre_rejected = 11
-        machhapuchchhre_in_progress = 28
-        machhapuchchhre_apps_by_type = {
-            "national-id": 89,
-            "birth-certificate": 82,
-            "marriage-certificate": 63,
-            "land-certificate": 33
-        }
-        
-        madi_total = 198
-        madi_completed = 167
-        madi_pending = 24
-        madi_rejected = 7
-        madi_in_progress = 19
-        madi_apps_by_type = {
-            "national-id": 67,
-            "birth-certificate": 58,
-            "marriage-certificate": 47,
-            "land-certificate": 26
-        }
-        
-        rupa_total = 156
-        rupa_completed = 128
-        rupa_pending = 21
-        rupa_rejected = 7
-        rupa_in_progress = 16
-        rupa_apps_by_type = {
-            "national-id": 52,
-            "birth-certificate": 47,
-            "marriage-certificate": 38,
-            "land-certificate": 19
-        }
-        
-        # Calculate Kaski district total (sum of all municipalities)
-        kaski_total = pokhara_total + annapurna_total + machhapuchchhre_total + madi_total + rupa_total
-        kaski_completed = pokhara_completed + annapurna_completed + machhapuchchhre_completed + madi_completed + rupa_completed
-        kaski_pending = pokhara_pending + annapurna_pending + machhapuchchhre_pending + madi_pending + rupa_pending
-        kaski_rejected = pokhara_rejected + annapurna_rejected + machhapuchchhre_rejected + madi_rejected + rupa_rejected
-        kaski_in_progress = pokhara_in_progress + annapurna_in_progress + machhapuchchhre_in_progress + madi_in_progress + rupa_in_progress
-        
-        # Mock data for other districts in Gandaki
-        baglung_total = 1245
-        baglung_completed = 1089
-        baglung_pending = 132
-        baglung_rejected = 24
-        baglung_in_progress = 98
-        
-        gorkha_total = 1567
-        gorkha_completed = 1342
-        gorkha_pending = 178
-        gorkha_rejected = 47
-        gorkha_in_progress = 125
-        
-        lamjung_total = 987
-        lamjung_completed = 856
-        lamjung_pending = 108
-        lamjung_rejected = 23
-        lamjung_in_progress = 78
-        
-        manang_total = 234
-        manang_completed = 198
-        manang_pending = 28
-        manang_rejected = 8
-        manang_in_progress = 19
-        
-        mustang_total = 312
-        mustang_completed = 267
-        mustang_pending = 35
-        mustang_rejected = 10
-        mustang_in_progress = 24
-        
-        myagdi_total = 678
-        myagdi_completed = 589
-        myagdi_pending = 72
-        myagdi_rejected = 17
-        myagdi_in_progress = 54
-        
-        nawalpur_total = 1456
-        nawalpur_completed = 1278
-        nawalpur_pending = 145
-        nawalpur_rejected = 33
-        nawalpur_in_progress = 108
-        
-        parbat_total = 892
-        parbat_completed = 768
-        parbat_pending = 98
-        parbat_rejected = 26
-        parbat_in_progress = 71
-        
-        syangja_total = 1123
-        syangja_completed = 967
-        syangja_pending = 124
-        syangja_rejected = 32
-        syangja_in_progress = 89
-        
-        tanahun_total = 1345
-        tanahun_completed = 1156
-        tanahun_pending = 156
-        tanahun_rejected = 33
-        tanahun_in_progress = 112
-        
-        # Sum all districts in Gandaki to get Gandaki total
-        gandaki_total = (kaski_total + baglung_total + gorkha_total + lamjung_total + 
-                        manang_total + mustang_total + myagdi_total + nawalpur_total + 
-                        parbat_total + syangja_total + tanahun_total)
-        gandaki_completed = (kaski_completed + baglung_completed + gorkha_completed + lamjung_completed + 
-                           manang_completed + mustang_completed + myagdi_completed + nawalpur_completed + 
-                           parbat_completed + syangja_completed + tanahun_completed)
-        gandaki_pending = (kaski_pending + baglung_pending + gorkha_pending + lamjung_pending + 
-                         manang_pending + mustang_pending + myagdi_pending + nawalpur_pending + 
-                         parbat_pending + syangja_pending + tanahun_pending)
-        gandaki_rejected = (kaski_rejected + baglung_rejected + gorkha_rejected + lamjung_rejected + 
-                          manang_rejected + mustang_rejected + myagdi_rejected + nawalpur_rejected + 
-                          parbat_rejected + syangja_rejected + tanahun_rejected)
-        gandaki_in_progress = (kaski_in_progress + baglung_in_progress + gorkha_in_progress + lamjung_in_progress + 
-                              manang_in_progress + mustang_in_progress + myagdi_in_progress + nawalpur_in_progress + 
-                              parbat_in_progress + syangja_in_progress + tanahun_in_progress)
-        
-        gandaki_efficiency = (gandaki_completed / gandaki_total * 100) if gandaki_total > 0 else 0
-        
-        # Calculate Gandaki avg processing time from Pokhara (real data)
-        pokhara_completed_with_dates = [a for a in pokhara_ward_apps if a.get("status") == "Completed" and a.get("completed_date")]
-        if pokhara_completed_with_dates:
-            total_days = 0
-            for a in pokhara_completed_with_dates:
-                completed_str = a["completed_date"].replace('Z', '').replace('+00:00', '')
-                submitted_str = a["submitted_date"].replace('Z', '').replace('+00:00', '')
-                completed_dt = datetime.fromisoformat(completed_str)
-                submitted_dt = datetime.fromisoformat(submitted_str)
-                total_days += (completed_dt - submitted_dt).days
-            gandaki_avg_time = total_days / len(pokhara_completed_with_dates)
-        else:
-            gandaki_avg_time = 3.5
-        
-        # Aggregate applications by type for all districts in Gandaki
-        gandaki_apps_by_type = {}
-        for app_type, count in pokhara_apps_by_type.items():
-            gandaki_apps_by_type[app_type] = gandaki_apps_by_type.get(app_type, 0) + count
-        for app_type, count in annapurna_apps_by_type.items():
-            gandaki_apps_by_type[app_type] = gandaki_apps_by_type.get(app_type, 0) + count
-        for app_type, count in machhapuchchhre_apps_by_type.items():
-            gandaki_apps_by_type[app_type] = gandaki_apps_by_type.get(app_type, 0) + count
-        for app_type, count in madi_apps_by_type.items():
-            gandaki_apps_by_type[app_type] = gandaki_apps_by_type.get(app_type, 0) + count
-        for app_type, count in rupa_apps_by_type.items():
-            gandaki_apps_by_type[app_type] = gandaki_apps_by_type.get(app_type, 0) + count
-        # Add mock types for other districts
-        gandaki_apps_by_type["national-id"] = gandaki_apps_by_type.get("national-id", 0) + 2000
-        gandaki_apps_by_type["birth-certificate"] = gandaki_apps_by_type.get("birth-certificate", 0) + 1700
-        gandaki_apps_by_type["marriage-certificate"] = gandaki_apps_by_type.get("marriage-certificate", 0) + 1400
-        gandaki_apps_by_type["land-certificate"] = gandaki_apps_by_type.get("land-certificate", 0) + 900
-        
-        # Generate mock data for other 6 provinces (for display only)
-        # Nepal has 7 provinces: Koshi, Madhesh, Bagmati, Gandaki, Lumbini, Karnali, Sudurpashchim
-        subordinate_offices_data = [
-            {
-                "office_id": "province:Gandaki",
-                "office_name": "Gandaki",
-                "office_level": "province",
-                "total_applications": gandaki_total,
-                "completed": gandaki_completed,
-                "pending": gandaki_pending,
-                "rejected": gandaki_rejected,
-                "in_progress": gandaki_in_progress,
-                "efficiency": round(gandaki_efficiency, 2),
-                "avg_processing_time": round(gandaki_avg_time, 1),
-                "applications_by_type": gandaki_apps_by_type
-            },
-            {
-                "office_id": "province:Koshi",
-                "office_name": "Koshi",
-                "office_level": "province",
-                "total_applications": 15432,
-                "completed": 13258,
-                "pending": 1824,
-                "rejected": 350,
-                "in_progress": 1345,
-                "efficiency": 85.9,
-                "avg_processing_time": 4.3,
-                "applications_by_type": {
-                    "national-id": 5124,
-                    "birth-certificate": 4421,
-                    "marriage-certificate": 3645,
-                    "land-certificate": 2242
-                }
-            },
-            {
-                "office_id": "province:Madhesh",
-                "office_name": "Madhesh",
-                "office_level": "province",
-                "total_applications": 18765,
-                "completed": 16089,
-                "pending": 2134,
-                "rejected": 542,
-                "in_progress": 1587,
-                "efficiency": 85.7,
-                "avg_processing_time": 4.6,
-                "applications_by_type": {
-                    "national-id": 6234,
-                    "birth-certificate": 5387,
-                    "marriage-certificate": 4445,
-                    "land-certificate": 2699
-                }
-            },
-            {
-                "office_id": "province:Bagmati",
-                "office_name": "Bagmati",
-                "office_level": "province",
-                "total_applications": 23456,
-                "completed": 20321,
-                "pending": 2567,
-                "rejected": 568,
-                "in_progress": 1898,
-                "efficiency": 86.6,
-                "avg_processing_time": 4.1,
-                "applications_by_type": {
-                    "national-id": 7789,
-                    "birth-certificate": 6723,
-                    "marriage-certificate": 5545,
-                    "land-certificate": 3399
-                }
-            },
-            {
-                "office_id": "province:Lumbini",
-                "office_name": "Lumbini",
-                "office_level": "province",
-                "total_applications": 16789,
-                "completed": 14321,
-                "pending": 1987,
-                "rejected": 481,
-                "in_progress": 1476,
-                "efficiency": 85.3,
-                "avg_processing_time": 4.5,
-                "applications_by_type": {
-                    "national-id": 5578,
-                    "birth-certificate": 4812,
-                    "marriage-certificate": 3976,
-                    "land-certificate": 2423
-                }
-            },
-            {
-                "office_id": "province:Karnali",
-                "office_name": "Karnali",
-                "office_level": "province",
-                "total_applications": 8765,
-                "completed": 7234,
-                "pending": 1234,
-                "rejected": 297,
-                "in_progress": 912,
-                "efficiency": 82.5,
-                "avg_processing_time": 5.2,
-                "applications_by_type": {
-                    "national-id": 2912,
-                    "birth-certificate": 2514,
-                    "marriage-certificate": 2076,
-                    "land-certificate": 1263
-                }
-            },
-            {
-                "office_id": "province:Sudurpashchim",
-                "office_name": "Sudurpashchim",
-                "office_level": "province",
-                "total_applications": 11234,
-                "completed": 9456,
-                "pending": 1456,
-                "rejected": 322,
-                "in_progress": 1078,
-                "efficiency": 84.2,
-                "avg_processing_time": 4.8,
-                "applications_by_type": {
-                    "national-id": 3734,
-                    "birth-certificate": 3223,
-                    "marriage-certificate": 2661,
-                    "land-certificate": 1616
-                }
-            }
-        ]
-        
-        total_apps = sum([office["total_applications"] for office in subordinate_offices_data])
-        completed_apps = sum([office["completed"] for office in subordinate_offices_data])
-        overall_efficiency = (completed_apps / total_apps * 100) if total_apps > 0 else 0
-        
-        return {
-            "monitor_office": current_user["office_name"],
-            "monitor_level": monitor_level,
-            "total_subordinates": len(subordinate_offices_data),
-            "total_applications": total_apps,
-            "overall_efficiency": round(overall_efficiency, 2),
-            "subordinate_offices": subordinate_offices_data
-        }
-    
-    # Special handling for Gandaki Province Monitor
-    if current_user.get("office_name") == "Gandaki Province Monitor":
-        # Get all applications
-        all_applications = db.get_all_applications()
-        
-        # Calculate Kaski data by summing all municipalities in Kaski
-        # This includes: Pokhara (from wards), Annapurna, Machhapuchchhre, Madi, Rupa
-        # For Kaski, we need to sum all applications from municipalities in Kaski district
-        
-        # Get Pokhara ward applications
-        pokhara_ward_apps = [app for app in all_applications 
-                            if app.get("target_office_level") == "local" 
-                            and "Pokhara Ward Office" in app.get("target_office_name", "")]
-        
-        # Calculate Pokhara stats (sum of all ward applications)
-        pokhara_total = len(pokhara_ward_apps)
-        pokhara_completed = len([a for a in pokhara_ward_apps if a.get("status") == "Completed"])
-        pokhara_pending = len([a for a in pokhara_ward_apps if a.get("status") in ["Submitted", "In Progress"]])
-        pokhara_rejected = len([a for a in pokhara_ward_apps if a.get("status") == "Rejected" or a.get("approved") == False])
-        pokhara_in_progress = len([a for a in pokhara_ward_apps if a.get("status") == "In Progress"])
-        
-        # Pokhara applications by type
-        pokhara_apps_by_type = {}
-        for app in pokhara_ward_apps:
-            service_type = app.get("service_type", "unknown")
-            pokhara_apps_by_type[service_type] = pokhara_apps_by_type.get(service_type, 0) + 1
-        
-        # Mock data for other municipalities in Kaski (Annapurna, Machhapuchchhre, Madi, Rupa)
-        # These are the same values used in Kaski District Monitor
-        annapurna_total = 324
-        annapurna_completed = 278
-        annapurna_pending = 38
-        annapurna_rejected = 8
-        annapurna_in_progress = 26
-        annapurna_apps_by_type = {
-            "national-id": 112,
-            "birth-certificate": 98,
-            "marriage-certificate": 76,
-            "land-certificate": 38
-        }
-        
-        machhapuchchhre_total = 267
-        machhapuchchhre_completed = 221
-        machhapuchchhre_pending = 35
-        machhapuchchhre_rejected = 11
-        machhapuchchhre_in_progress = 28
-        machhapuchchhre_apps_by_type = {
-            "national-id": 89,
-            "birth-certificate": 82,
-            "marriage-certificate": 63,
-            "land-certificate": 33
-        }
-        
-        madi_total = 198
-        madi_completed = 167
-        madi_pending = 24
-        madi_rejected = 7
-        madi_in_progress = 19
-        madi_apps_by_type = {
-            "national-id": 67,
-            "birth-certificate": 58,
-            "marriage-certificate": 47,
-            "land-certificate": 26
-        }
-        
-        rupa_total = 156
-        rupa_completed = 128
-        rupa_pending = 21
-        rupa_rejected = 7
-        rupa_in_progress = 16
-        rupa_apps_by_type = {
-            "national-id": 52,
-            "birth-certificate": 47,
-            "marriage-certificate": 38,
-            "land-certificate": 19
-        }
-        
-        # Sum all municipalities in Kaski to get Kaski total
-        kaski_total = pokhara_total + annapurna_total + machhapuchchhre_total + madi_total + rupa_total
-        kaski_completed = pokhara_completed + annapurna_completed + machhapuchchhre_completed + madi_completed + rupa_completed
-        kaski_pending = pokhara_pending + annapurna_pending + machhapuchchhre_pending + madi_pending + rupa_pending
-        kaski_rejected = pokhara_rejected + annapurna_rejected + machhapuchchhre_rejected + madi_rejected + rupa_rejected
-        kaski_in_progress = pokhara_in_progress + annapurna_in_progress + machhapuchchhre_in_progress + madi_in_progress + rupa_in_progress
-        
-        kaski_efficiency = (kaski_completed / kaski_total * 100) if kaski_total > 0 else 0
-        
-        # Calculate Kaski avg processing time from Pokhara (real data)
-        pokhara_completed_with_dates = [a for a in pokhara_ward_apps if a.get("status") == "Completed" and a.get("completed_date")]
-        if pokhara_completed_with_dates:
-            total_days = 0
-            for a in pokhara_completed_with_dates:
-                completed_str = a["completed_date"].replace('Z', '').replace('+00:00', '')
-                submitted_str = a["submitted_date"].replace('Z', '').replace('+00:00', '')
-                completed_dt = datetime.fromisoformat(completed_str)
-                submitted_dt = datetime.fromisoformat(submitted_str)
-                total_days += (completed_dt - submitted_dt).days
-            kaski_avg_time = total_days / len(pokhara_completed_with_dates)
-        else:
-            kaski_avg_time = 3.5
-        
-        # Aggregate applications by type for all municipalities in Kaski
-        kaski_apps_by_type = {}
-        for app_type, count in pokhara_apps_by_type.items():
-            kaski_apps_by_type[app_type] = kaski_apps_by_type.get(app_type, 0) + count
-        for app_type, count in annapurna_apps_by_type.items():
-            kaski_apps_by_type[app_type] = kaski_apps_by_type.get(app_type, 0) + count
-        for app_type, count in machhapuchchhre_apps_by_type.items():
-            kaski_apps_by_type[app_type] = kaski_apps_by_type.get(app_type, 0) + count
-        for app_type, count in madi_apps_by_type.items():
-            kaski_apps_by_type[app_type] = kaski_apps_by_type.get(app_type, 0) + count
-        for app_type, count in rupa_apps_by_type.items():
-            kaski_apps_by_type[app_type] = kaski_apps_by_type.get(app_type, 0) + count
-        
-        # Generate mock data for other districts (for display only)
-        # Gandaki Province has 11 districts: Baglung, Gorkha, Kaski, Lamjung, Manang, Mustang, Myagdi, Nawalpur, Parbat, Syangja, Tanahun
-        subordinate_offices_data = [
-            {
-                "office_id": "district:Kaski",
-                "office_name": "Kaski",
-                "office_level": "district",
-                "total_applications": kaski_total,
-                "completed": kaski_completed,
-                "pending": kaski_pending,
-                "rejected": kaski_rejected,
-                "in_progress": kaski_in_progress,
-                "efficiency": round(kaski_efficiency, 2),
-                "avg_processing_time": round(kaski_avg_time, 1),
-                "applications_by_type": kaski_apps_by_type
-            },
-            {
-                "office_id": "district:Baglung",
-                "office_name": "Baglung",
-                "office_level": "district",
-                "total_applications": 1245,
-                "completed": 1089,
-                "pending": 132,
-                "rejected": 24,
-                "in_progress": 98,
-                "efficiency": 87.5,
-                "avg_processing_time": 4.3,
-                "applications_by_type": {
-                    "national-id": 412,
-                    "birth-certificate": 356,
-                    "marriage-certificate": 287,
-                    "land-certificate": 190
-                }
-            },
-            {
-                "office_id": "district:Gorkha",
-                "office_name": "Gorkha",
-                "office_level": "district",
-                "total_applications": 1567,
-                "completed": 1342,
-                "pending": 178,
-                "rejected": 47,
-                "in_progress": 125,
-                "efficiency": 85.6,
-                "avg_processing_time": 4.7,
-                "applications_by_type": {
-                    "national-id": 521,
-                    "birth-certificate": 445,
-                    "marriage-certificate": 367,
-                    "land-certificate": 234
-                }
-            },
-            {
-                "office_id": "district:Lamjung",
-                "office_name": "Lamjung",
-                "office_level": "district",
-                "total_applications": 987,
-                "completed": 856,
-                "pending": 108,
-                "rejected": 23,
-                "in_progress": 78,
-                "efficiency": 86.7,
-                "avg_processing_time": 4.1,
-                "applications_by_type": {
-                    "national-id": 328,
-                    "birth-certificate": 284,
-                    "marriage-certificate": 234,
-                    "land-certificate": 141
-                }
-            },
-            {
-                "office_id": "district:Manang",
-                "office_name": "Manang",
-                "office_level": "district",
-                "total_applications": 234,
-                "completed": 198,
-                "pending": 28,
-                "rejected": 8,
-                "in_progress": 19,
-                "efficiency": 84.6,
-                "avg_processing_time": 5.2,
-                "applications_by_type": {
-                    "national-id": 78,
-                    "birth-certificate": 67,
-                    "marriage-certificate": 55,
-                    "land-certificate": 34
-                }
-            },
-            {
-                "office_id": "district:Mustang",
-                "office_name": "Mustang",
-                "office_level": "district",
-                "total_applications": 312,
-                "completed": 267,
-                "pending": 35,
-                "rejected": 10,
-                "in_progress": 24,
-                "efficiency": 85.6,
-                "avg_processing_time": 5.5,
-                "applications_by_type": {
-                    "national-id": 104,
-                    "birth-certificate": 89,
-                    "marriage-certificate": 73,
-                    "land-certificate": 46
-                }
-            },
-            {
-                "office_id": "district:Myagdi",
-                "office_name": "Myagdi",
-                "office_level": "district",
-                "total_applications": 678,
-                "completed": 589,
-                "pending": 72,
-                "rejected": 17,
-                "in_progress": 54,
-                "efficiency": 86.9,
-                "avg_processing_time": 4.4,
-                "applications_by_type": {
-                    "national-id": 225,
-                    "birth-certificate": 194,
-                    "marriage-certificate": 160,
-                    "land-certificate": 99
-                }
-            },
-            {
-                "office_id": "district:Nawalpur",
-                "office_name": "Nawalpur",
-                "office_level": "district",
-                "total_applications": 1456,
-                "completed": 1278,
-                "pending": 145,
-                "rejected": 33,
-                "in_progress": 108,
-                "efficiency": 87.8,
-                "avg_processing_time": 4.0,
-                "applications_by_type": {
-                    "national-id": 484,
-                    "birth-certificate": 418,
-                    "marriage-certificate": 345,
-                    "land-certificate": 209
-                }
-            },
-            {
-                "office_id": "district:Parbat",
-                "office_name": "Parbat",
-                "office_level": "district",
-                "total_applications": 892,
-                "completed": 768,
-                "pending": 98,
-                "rejected": 26,
-                "in_progress": 71,
-                "efficiency": 86.1,
-                "avg_processing_time": 4.6,
-                "applications_by_type": {
-                    "national-id": 296,
-                    "birth-certificate": 256,
-                    "marriage-certificate": 211,
-                    "land-certificate": 129
-                }
-            },
-            {
-                "office_id": "district:Syangja",
-                "office_name": "Syangja",
-                "office_level": "district",
-                "total_applications": 1123,
-                "completed": 967,
-                "pending": 124,
-                "rejected": 32,
-                "in_progress": 89,
-                "efficiency": 86.1,
-                "avg_processing_time": 4.2,
-                "applications_by_type": {
-                    "national-id": 373,
-                    "birth-certificate": 322,
-                    "marriage-certificate": 266,
-                    "land-certificate": 162
-                }
-            },
-            {
-                "office_id": "district:Tanahun",
-                "office_name": "Tanahun",
-                "office_level": "district",
-                "total_applications": 1345,
-                "completed": 1156,
-                "pending": 156,
-                "rejected": 33,
-                "in_progress": 112,
-                "efficiency": 86.0,
-                "avg_processing_time": 4.5,
-                "applications_by_type": {
-                    "national-id": 447,
-                    "birth-certificate": 386,
-                    "marriage-certificate": 318,
-                    "land-certificate": 194
-                }
-            }
-        ]
-        
-        total_apps = sum([office["total_applications"] for office in subordinate_offices_data])
-        completed_apps = sum([office["completed"] for office in subordinate_offices_data])
-        overall_efficiency = (completed_apps / total_apps * 100) if total_apps > 0 else 0
-        
-        return {
-            "monitor_office": current_user["office_name"],
-            "monitor_level": monitor_level,
-            "total_subordinates": len(subordinate_offices_data),
-            "total_applications": total_apps,
-            "overall_efficiency": round(overall_efficiency, 2),
-            "subordinate_offices": subordinate_offices_data
-        }
-    
-    # Special handling for Kaski District Monitor
-    if current_user.get("office_name") == "Kaski District Monitor":
-        # Get all applications
-        all_applications = db.get_all_applications()
-        
-        # Calculate Pokhara data from all ward applications
-        # Sum of all Pokhara ward applications = total applications for Pokhara
-        pokhara_ward_apps = [app for app in all_applications 
-                            if app.get("target_office_level") == "local" 
-                            and "Pokhara Ward Office" in app.get("target_office_name", "")]
-        
-        # Calculate Pokhara stats (sum of all ward applications)
-        pokhara_total = len(pokhara_ward_apps)  # Sum of all ward applications
-        pokhara_completed = len([a for a in pokhara_ward_apps if a.get("status") == "Completed"])
-        pokhara_pending = len([a for a in pokhara_ward_apps if a.get("status") in ["Submitted", "In Progress"]])
-        pokhara_rejected = len([a for a in pokhara_ward_apps if a.get("status") == "Rejected" or a.get("approved") == False])
-        pokhara_in_progress = len([a for a in pokhara_ward_apps if a.get("status") == "In Progress"])
-        
-        pokhara_efficiency = (pokhara_completed / pokhara_total * 100) if pokhara_total > 0 else 0
-        
-        # Calculate Pokhara avg processing time
-        pokhara_completed_with_dates = [a for a in pokhara_ward_apps if a.get("status") == "Completed" and a.get("completed_date")]
-        if pokhara_completed_with_dates:
-            total_days = 0
-            for a in pokhara_completed_with_dates:
-                completed_str = a["completed_date"].replace('Z', '').replace('+00:00', '')
-                submitted_str = a["submitted_date"].replace('Z', '').replace('+00:00', '')
-                completed_dt = datetime.fromisoformat(completed_str)
-                submitted_dt = datetime.fromisoformat(submitted_str)
-                total_days += (completed_dt - submitted_dt).days
-            pokhara_avg_time = total_days / len(pokhara_completed_with_dates)
-        else:
-            pokhara_avg_time = 3.5
-        
-        # Pokhara applications by type
-        pokhara_apps_by_type = {}
-        for app in pokhara_ward_apps:
-            service_type = app.get("service_type", "unknown")
-            pokhara_apps_by_type[service_type] = pokhara_apps_by_type.get(service_type, 0) + 1
-        
-        # Generate mock data for other municipalities (for display only)
-        subordinate_offices_data = [
-            {
-                "office_id": "municipal:Pokhara",
-                "office_name": "Pokhara",
-                "office_level": "municipal",
-                "total_applications": pokhara_total,
-                "completed": pokhara_completed,
-                "pending": pokhara_pending,
-                "rejected": pokhara_rejected,
-                "in_progress": pokhara_in_progress,
-                "efficiency": round(pokhara_efficiency, 2),
-                "avg_processing_time": round(pokhara_avg_time, 1),
-                "applications_by_type": pokhara_apps_by_type
-            },
-            {
-                "office_id": "municipal:Annapurna",
-                "office_name": "Annapurna",
-                "office_level": "municipal",
-                "total_applications": 324,
-                "completed": 278,
-                "pending": 38,
-                "rejected": 8,
-                "in_progress": 26,
-                "efficiency": 85.8,
-                "avg_processing_time": 4.2,
-                "applications_by_type": {
-                    "national-id": 112,
-                    "birth-certificate": 98,
-                    "marriage-certificate": 76,
-                    "land-certificate": 38
-                }
-            },
-            {
-                "office_id": "municipal:Machhapuchchhre",
-                "office_name": "Machhapuchchhre",
-                "office_level": "municipal",
-                "total_applications": 267,
-                "completed": 221,
-                "pending": 35,
-                "rejected": 11,
-                "in_progress": 28,
-                "efficiency": 82.8,
-                "avg_processing_time": 4.8,
-                "applications_by_type": {
-                    "national-id": 89,
-                    "birth-certificate": 82,
-                    "marriage-certificate": 63,
-                    "land-certificate": 33
-                }
-            },
-            {
-                "office_id": "municipal:Madi",
-                "office_name": "Madi",
-                "office_level": "municipal",
-                "total_applications": 198,
-                "completed": 167,
-                "pending": 24,
-                "rejected": 7,
-                "in_progress": 19,
-                "efficiency": 84.3,
-                "avg_processing_time": 4.5,
-                "applications_by_type": {
-                    "national-id": 67,
-                    "birth-certificate": 58,
-                    "marriage-certificate": 47,
-                    "land-certificate": 26
-                }
-            },
-            {
-                "office_id": "municipal:Rupa",
-                "office_name": "Rupa",
-                "office_level": "municipal",
-                "total_applications": 156,
-                "completed": 128,
-                "pending": 21,
-                "rejected": 7,
-                "in_progress": 16,
-                "efficiency": 82.1,
-                "avg_processing_time": 5.1,
-                "applications_by_type": {
-                    "national-id": 52,
-                    "birth-certificate": 47,
-                    "marriage-certificate": 38,
-                    "land-certificate": 19
-                }
-            }
-        ]
-        
-        total_apps = sum([office["total_applications"] for office in subordinate_offices_data])
-        completed_apps = sum([office["completed"] for office in subordinate_offices_data])
-        overall_efficiency = (completed_apps / total_apps * 100) if total_apps > 0 else 0
-        
-        return {
-            "monitor_office": current_user["office_name"],
-            "monitor_level": monitor_level,
-            "total_subordinates": len(subordinate_offices_data),
-            "total_applications": total_apps,
-            "overall_efficiency": round(overall_efficiency, 2),
-            "subordinate_offices": subordinate_offices_data
-        }
-    
-    # Original logic for other monitors
-    # Get all applications
-    all_applications = db.get_all_applications()
-    
-    # Get all officials to find all subordinate offices
-    all_officials = [u for u in db.get_all_users() if u.get("user_type") == "official"]
-    
-    # Create a map of all subordinate offices
+
+def _subordinate_offices(monitored_levels: List[str]) -> dict:
+    """Map "level:name" to office info for every non-monitor office at the given levels"""
     subordinate_office_ids = {}
-    
-    # First, collect all subordinate offices from officials database
-    for official in all_officials:
+    for official in db.get_officials(monitored_levels):
         office_level = official.get("office_level")
         office_name = official.get("office_name")
         
-        # Check if this office is monitored and not a monitor account itself
-        if office_level in monitored_levels and not official.get("is_monitor"):
+        # Skip monitor accounts themselves
+        if not official.get("is_monitor"):
             office_key = f"{office_level}:{office_name}"
             if office_key not in subordinate_office_ids:
                 subordinate_office_ids[office_key] = {
                     "office_name": office_name,
-                    "office_level": office_level,
-                    "applications": []
+                    "office_level": office_level
                 }
+    return subordinate_office_ids
+
+def _monitored_offices(current_user: dict) -> List[tuple]:
+    """(office_level, office_name) of every office a monitor oversees"""
+    node = db.hierarchy.node_for_monitor(current_user.get("office_name"))
+    if node is not None:
+        return [n.office for n in node.walk() if n.office is not None]
+    offices = _subordinate_offices(current_user.get("monitors", []))
+    return [(office["office_level"], office["office_name"]) for office in offices.values()]
+
+def _export_response(records, export_format: str, name: str) -> StreamingResponse:
+    """Stream records as NDJSON or CSV"""
+    filename = "".join(c if c.isalnum() else "_" for c in name) + "." + export_format
+    return StreamingResponse(
+        export.ENCODERS[export_format](records),
+        media_type=export.MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/monitor/hierarchy-stats", response_model=HierarchyStats)
+async def get_hierarchy_stats(current_user: dict = Depends(require_official)):
+    """
+    Get comprehensive hierarchy statistics for monitoring accounts
+    """
+    _require_monitor(current_user)
+    
+    monitor_level = current_user["office_level"]
+    monitored_levels = current_user.get("monitors", [])
     
-    # Now assign applications to their respective offices
-    for app in all_applications:
-        office_level = app.get("target_office_level")
-        office_name = app.get("target_office_name")
-        office_key = f"{office_level}:{office_name}"
+    # Monitors placed in the office hierarchy read their node's rolled-up children
+    node = db.hierarchy.node_for_monitor(current_user.get("office_name"))
+    if node is not None:
+        # Node aggregates change with every write
+        with db.reading():
+            subordinate_offices_data = [child.stats() for child in node.children]
+            total_applications = node.aggregate.total
+            overall_efficiency = node.aggregate.efficiency
         
-        # Add application to office if it exists in our subordinate offices
-        if office_key in subordinate_office_ids:
-            subordinate_office_ids[office_key]["applications"].append(app)
+        return trusted({
+            "monitor_office": current_user["office_name"],
+            "monitor_level": monitor_level,
+            "total_subordinates": len(subordinate_offices_data),
+            "total_applications": total_applications,
+            "overall_efficiency": round(overall_efficiency, 2),
+            "subordinate_offices": subordinate_offices_data
+        })
+    
+    # Other monitors: every non-monitor office at the monitored levels
+    subordinate_office_ids = _subordinate_offices(monitored_levels)
     
-    # Calculate stats for each office
+    # Read stats for each office from its aggregate counters
     subordinate_offices_data = []
     for office_key, office_data in subordinate_office_ids.items():
-        apps = office_data["applications"]
-        total = len(apps)
-        completed = len([a for a in apps if a.get("status") == "Completed"])
-        pending = len([a for a in apps if a.get("status") in ["Submitted", "In Progress"]])
-        rejected = len([a for a in apps if a.get("status") == "Rejected" or a.get("approved") == False])
-        in_progress = len([a for a in apps if a.get("status") == "In Progress"])
-        
-        efficiency = (completed / total * 100) if total > 0 else 0
-        
-        # Calculate avg processing time
-        completed_with_dates = [a for a in apps if a.get("status") == "Completed" and a.get("completed_date")]
-        if completed_with_dates:
-            total_days = 0
-            for a in completed_with_dates:
-                completed_str = a["completed_date"].replace('Z', '').replace('+00:00', '')
-                submitted_str = a["submitted_date"].replace('Z', '').replace('+00:00', '')
-                completed_dt = datetime.fromisoformat(completed_str)
-                submitted_dt = datetime.fromisoformat(submitted_str)
-                total_days += (completed_dt - submitted_dt).days
-            avg_time = total_days / len(completed_with_dates)
-        else:
-            avg_time = 0
-        
-        # Applications by type
-        apps_by_type = {}
-        for app in apps:
-            service_type = app.get("service_type", "unknown")
-            apps_by_type[service_type] = apps_by_type.get(service_type, 0) + 1
-        
-        subordinate_offices_data.append({
-            "office_id": office_key,
-            "office_name": office_data["office_name"],
-            "office_level": office_data["office_level"],
-            "total_applications": total,
-            "completed": completed,
-            "pending": pending,
-            "rejected": rejected,
-            "in_progress": in_progress,
-            "efficiency": round(efficiency, 2),
-            "avg_processing_time": round(avg_time, 1),
-            "applications_by_type": apps_by_type
-        })
+        aggregate = db.get_office_aggregate(office_data["office_level"], office_data["office_name"])
+        subordinate_offices_data.append(
+            aggregate.to_stats(office_key, office_data["office_name"], office_data["office_level"])
+        )
     
     # Calculate overall stats
-    total_apps = len([app for app in all_applications 
-                      if app.get("target_office_level") in monitored_levels])
-    completed_apps = len([app for app in all_applications 
-                          if app.get("target_office_level") in monitored_levels 
-                          and app.get("status") == "Completed"])
+    monitored = db.get_levels_aggregate(monitored_levels)
+    total_apps = monitored.total
+    completed_apps = monitored.completed
     overall_efficiency = (completed_apps / total_apps * 100) if total_apps > 0 else 0
     
-    return {
+    return trusted({
         "monitor_office": current_user["office_name"],
         "monitor_level": monitor_level,
         "total_subordinates": len(subordinate_offices_data),
         "total_applications": total_apps,
         "overall_efficiency": round(overall_efficiency, 2),
         "subordinate_offices": subordinate_offices_data
-    }
+    })
+
+@app.get("/api/monitor/trends", response_model=TrendStats)
+async def get_monitor_trends(
+    office_id: Optional[str] = None,
+    days: int = Query(90, ge=1, le=366),
+    interval: str = Query("day", pattern="^(day|week)$"),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    service_type: Optional[str] = None,
+    current_user: dict = Depends(require_official)
+):
+    """
+    Daily or weekly submitted/completed/rejected counts across monitored offices.
+    
+    office_id narrows the chart to one subordinate office, as given by
+    hierarchy-stats.
+    """
+    _require_monitor(current_user)
+    offices = _monitored_offices(current_user)
+    if office_id is not None:
+        monitor_node = db.hierarchy.node_for_monitor(current_user.get("office_name"))
+        node = db.hierarchy.nodes.get(office_id)
+        office = tuple(office_id.split(":", 1))
+        if node is not None and monitor_node is not None and node in set(monitor_node.walk()):
+            offices = [n.office for n in node.walk() if n.office is not None]
+        elif office in offices:
+            offices = [office]
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Office not found among monitored offices"
+            )
+    return _trend_response(office_id or current_user["office_name"], offices, days, interval,
+                           status_filter, service_type)
+
+@app.get("/api/monitor/applications/export")
+async def export_monitored_applications(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    current_user: dict = Depends(require_official)
+):
+    """
+    Stream the applications of every office a monitor oversees as NDJSON or CSV
+    """
+    _require_monitor(current_user)
+    offices = _monitored_offices(current_user)
+    records = (
+        application
+        for office_level, office_name in offices
+        for application in db.iter_applications_by_office(office_level, office_name)
+    )
+    return _export_response(records, export_format, current_user["office_name"])
 
 # ============= MESSAGING ROUTES =============
 
@@ -1254,6 +743,7 @@ async def send_message(
     }
     
     db.create_message(message)
+    events.event_hub.publish([events.user_topic(message["recipient_id"])], "message", message)
     return message
 
 @app.get("/api/messages/received", response_model=List[Message])
@@ -1264,7 +754,7 @@ async def get_received_messages(current_user: dict = Depends(get_current_user)):
     messages = db.get_received_messages(current_user["id"])
     # Sort by created_at descending
     messages.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-    return messages
+    return trusted(messages, Message)
 
 @app.get("/api/messages/sent", response_model=List[Message])
 async def get_sent_messages(current_user: dict = Depends(get_current_user)):
@@ -1273,7 +763,7 @@ async def get_sent_messages(current_user: dict = Depends(get_current_user)):
     """
     messages = db.get_sent_messages(current_user["id"])
     messages.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-    return messages
+    return trusted(messages, Message)
 
 @app.put("/api/messages/{message_id}/read")
 async def mark_message_as_read(
@@ -1298,6 +788,9 @@ async def mark_message_as_read(
         )
     
     updated_message = db.mark_message_read(message_id)
+    events.event_hub.publish(
+        [events.user_topic(current_user["id"])], "message_read", {"id": message_id}
+    )
     return updated_message
 
 @app.get("/api/officials", response_model=List[User])
@@ -1305,8 +798,106 @@ async def get_all_officials(current_user: dict = Depends(require_official)):
     """
     Get list of all officials (for messaging)
     """
-    officials = [user for user in db.get_all_users() if user.get("user_type") == "official"]
-    return officials
+    officials = db.get_officials()
+    return trusted(officials, User)
+
+# ============= EVENT STREAM =============
+
+MAX_TRACKED_APPLICATIONS = 50
+
+def _event_topics(user: dict) -> List[str]:
+    """Topics a user may follow: their own, their office's and monitored offices'"""
+    topics = [events.user_topic(user["id"])]
+    if user.get("user_type") == "official":
+        topics.append(events.office_topic(user.get("office_level"), user.get("office_name")))
+        if user.get("is_monitor"):
+            topics.extend(events.office_topic(*office) for office in _monitored_offices(user))
+    return topics
+
+@app.get("/api/events")
+async def stream_events(
+    request: Request,
+    token: Optional[str] = None,
+    applications: Optional[str] = None
+):
+    """
+    Server-sent events for application status and inbox changes.
+    
+    EventSource cannot send headers, so the access token comes as a query
+    parameter. applications is a comma-separated list of application ids to
+    track (like GET /api/applications/{id}, no login needed).
+    """
+    application_ids = [a.strip() for a in (applications or "").split(",") if a.strip()]
+    if len(application_ids) > MAX_TRACKED_APPLICATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_TRACKED_APPLICATIONS} applications can be tracked"
+        )
+    topics = [events.application_topic(app_id) for app_id in application_ids]
+    if token:
+        topics.extend(_event_topics(user_from_token(token)))
+    if not topics:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide a token or applications to track"
+        )
+    
+    subscription = events.event_hub.subscribe(topics)
+    return StreamingResponse(
+        subscription.stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ============= PROFILING =============
+
+def _require_profiling():
+    if not profiling.PROFILING_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiling is disabled")
+
+def _profile_response(name: str) -> FileResponse:
+    path = profiling.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    media_type = "text/plain" if name.endswith(".collapsed") else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=name, headers={"X-Profile-Id": name})
+
+@app.post("/api/profiling/window")
+async def profile_window(
+    seconds: float = Query(10, gt=0, le=profiling.MAX_PROFILE_SECONDS),
+    format: str = Query("collapsed", pattern="^(collapsed|pstats)$"),
+    current_user: dict = Depends(require_official)
+):
+    """
+    Profile everything the server runs for the next few seconds and return the profile
+    """
+    _require_profiling()
+    session = profiling.ProfileSession(format, f"window-{seconds:g}s")
+    try:
+        session.start()
+    except profiling.ProfilerBusy:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Another profile is being captured")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        name = session.stop()
+    return _profile_response(name)
+
+@app.get("/api/profiling/profiles")
+async def list_profiles(current_user: dict = Depends(require_official)):
+    """
+    List saved profiles, newest first
+    """
+    _require_profiling()
+    return profiling.list_profiles()
+
+@app.get("/api/profiling/profiles/{name}")
+async def get_profile(name: str, current_user: dict = Depends(require_official)):
+    """
+    Download a saved profile
+    """
+    _require_profiling()
+    return _profile_response(name)
 
 # ============= HEALTH CHECK =============
 
@@ -1328,6 +919,21 @@ async def health():
     """
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(request: Request):
+    """
+    Prometheus metrics (sync, so collection counts never block the event loop)
+    """
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not metrics.authorized(request.headers.get("authorization")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
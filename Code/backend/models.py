@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, create_model
 from typing import Optional, Literal
-from datetime import datetime
+from datetime import date, datetime
 
 # User Models
 class UserBase(BaseModel):
@@ -45,6 +45,32 @@ class ApplicationCreate(BaseModel):
     target_office_level: str
     target_office_name: str
 
+class ApplicationImport(ApplicationCreate):
+    # Historic records may carry their own id, dates and outcome
+    id: Optional[str] = None
+    user_id: Optional[str] = None
+    submitted_date: Optional[datetime] = None
+    status: Optional[str] = None
+    current_stage: Optional[str] = None
+    estimated_days: Optional[int] = None
+    progress: Optional[int] = None
+    approved: Optional[bool] = None
+    rejection_message: Optional[str] = None
+    completed_date: Optional[str] = None
+    rejected_date: Optional[str] = None
+
+class ImportLineError(BaseModel):
+    line: int
+    detail: str
+
+class ApplicationImportReport(BaseModel):
+    received: int
+    imported: int
+    failed: int
+    seconds: float
+    rows_per_second: float
+    errors: list[ImportLineError]
+
 class ApplicationUpdate(BaseModel):
     status: Optional[str] = None
     current_stage: Optional[str] = None
@@ -73,6 +99,35 @@ class Application(BaseModel):
     approved: Optional[bool] = None
     rejection_message: Optional[str] = None
     completed_date: Optional[str] = None
+    rejected_date: Optional[str] = None
+
+class ApplicationBatchItem(ApplicationUpdate):
+    id: str
+
+class ApplicationBatchUpdate(BaseModel):
+    items: list[ApplicationBatchItem]
+
+class ApplicationBatchResult(BaseModel):
+    id: str
+    status_code: int
+    detail: Optional[str] = None
+    application: Optional[Application] = None
+
+class ApplicationBatchResponse(BaseModel):
+    updated: int
+    results: list[ApplicationBatchResult]
+
+# Application with every field optional, for projected records: routes
+# returning it set response_model_exclude_unset so unselected fields stay out
+ApplicationFields = create_model(
+    "ApplicationFields",
+    **{name: (Optional[field.annotation], None) for name, field in Application.model_fields.items()}
+)
+
+class ApplicationPage(BaseModel):
+    # Application records, reduced to the requested fields when projected
+    items: list[ApplicationFields]
+    next_cursor: Optional[str] = None
 
 # Office/Hierarchy Models
 class OfficeStats(BaseModel):
@@ -83,6 +138,9 @@ class OfficeStats(BaseModel):
     pending: int
     efficiency: float
     avg_processing_time: float
+    processing_time_p50: Optional[int] = None
+    processing_time_p90: Optional[int] = None
+    processing_time_p99: Optional[int] = None
 
 # Message Models
 class MessageCreate(BaseModel):
@@ -118,6 +176,21 @@ class SubordinateOfficeStats(BaseModel):
     efficiency: float
     avg_processing_time: float
     applications_by_type: dict
+    processing_time_p50: Optional[int] = None
+    processing_time_p90: Optional[int] = None
+    processing_time_p99: Optional[int] = None
+
+class TrendBucket(BaseModel):
+    start: date
+    submitted: int
+    completed: int
+    rejected: int
+
+class TrendStats(BaseModel):
+    office_id: str
+    interval: Literal["day", "week"]
+    days: int
+    buckets: list[TrendBucket]
 
 class HierarchyStats(BaseModel):
     monitor_office: str
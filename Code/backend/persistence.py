@@ -0,0 +1,452 @@
+"""
+Persistence helpers for the JSON file database.
+
+The write-ahead log stores one JSON line per mutation so that a status
+change costs a single append instead of rewriting the whole collection.
+The log is folded back into the JSON snapshot files during compaction.
+The background flusher instead coalesces changes and rewrites dirty
+collections from a separate thread. The binary snapshot is a pickle of the
+loaded collections and their indexes, read at startup instead of parsing
+and re-indexing the JSON files when those have not changed since.
+
+In multi-process mode every worker appends to the same log under an
+exclusive ProcessLock and follows what the others append, so the log is
+also the change feed between workers; compaction rotates it to
+``wal.log.1`` rather than truncating it, so slower followers can finish
+reading the old entries.
+"""
+
+import gc
+import json
+import logging
+import os
+import pickle
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no multi-process mode
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"SARKAHA-SNAPSHOT"
+# Format version and payload length
+SNAPSHOT_HEADER = struct.Struct(">IQ")
+
+
+# Read once: os.umask can only be queried by setting it, which is not thread-safe
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def file_mode(filepath: str) -> int:
+    """Permission bits for a file about to replace filepath.
+
+    mkstemp creates temp files as 0600, so replacing a file with one would
+    silently drop group and other access. Keep the existing file's bits, or
+    use what a plain open() would give a new file.
+    """
+    try:
+        return os.stat(filepath).st_mode & 0o7777
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+def _atomic_write(filepath: str, mode: str, suffix: str, write):
+    """Call write(f) on a temp file, fsync it and rename it over filepath.
+
+    Readers (and a restart after a crash) see either the old file or the new
+    one, never a truncated mix. The file keeps its permission bits.
+    """
+    directory = os.path.dirname(filepath) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=suffix)
+    try:
+        if hasattr(os, "fchmod"):
+            os.fchmod(fd, file_mode(filepath))
+        with os.fdopen(fd, mode) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(filepath: str, data):
+    """Write pretty-printed JSON atomically"""
+    _atomic_write(filepath, 'w', ".json", lambda f: json.dump(data, f, indent=2, default=str))
+
+
+def write_snapshot(filepath: str, payload: dict, version: int):
+    """Pickle payload behind a magic/version/length header, atomically.
+    
+    The pickle is streamed to the file and the length filled in afterwards,
+    so a large snapshot is never held in memory twice.
+    """
+    def write(f):
+        f.write(SNAPSHOT_MAGIC)
+        header_at = f.tell()
+        f.write(SNAPSHOT_HEADER.pack(version, 0))
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        length = f.tell() - header_at - SNAPSHOT_HEADER.size
+        f.seek(header_at)
+        f.write(SNAPSHOT_HEADER.pack(version, length))
+        f.seek(0, os.SEEK_END)
+
+    _atomic_write(filepath, 'wb', ".bin", write)
+
+
+def read_snapshot(filepath: str, version: int) -> Optional[dict]:
+    """Payload of a snapshot written with this version, or None if there is no usable one"""
+    if not os.path.exists(filepath):
+        return None
+    try:
+        with open(filepath, 'rb') as f:
+            if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                raise ValueError("not a snapshot file")
+            file_version, length = SNAPSHOT_HEADER.unpack(f.read(SNAPSHOT_HEADER.size))
+            if file_version != version:
+                print(f"Ignoring {filepath}: format version {file_version}, expected {version}")
+                return None
+            available = os.fstat(f.fileno()).st_size - f.tell()
+            if available != length:
+                raise ValueError(f"expected {length} bytes, found {available}")
+            # Millions of new containers would otherwise trigger a cyclic GC
+            # pass every few hundred allocations, roughly doubling the load time
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                return pickle.load(f)
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+    except Exception as e:
+        print(f"Ignoring {filepath}: {e}")
+        return None
+
+
+class ProcessLock:
+    """Advisory file lock shared by the worker processes of one data directory.
+    
+    Re-entrant within the process. Callers serialize on their own thread
+    lock first, so the lock state here is only touched by one thread at a
+    time. Asking for the shared lock while holding the exclusive one keeps
+    it exclusive.
+    """
+
+    def __init__(self, filepath: str):
+        if fcntl is None:
+            raise RuntimeError("Multi-process mode needs fcntl (POSIX only)")
+        self.filepath = filepath
+        self._fd = os.open(filepath, os.O_RDWR | os.O_CREAT, 0o644)
+        self._mode = None
+        self._depth = 0
+
+    @contextmanager
+    def exclusive(self):
+        self._acquire(fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @contextmanager
+    def shared(self):
+        self._acquire(fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _acquire(self, mode: int):
+        if self._depth == 0:
+            fcntl.flock(self._fd, mode)
+            self._mode = mode
+        elif mode == fcntl.LOCK_EX and self._mode == fcntl.LOCK_SH:
+            # flock would convert the lock, letting another process in between
+            raise RuntimeError("Cannot upgrade a shared lock to an exclusive one")
+        self._depth += 1
+
+    def _release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._mode = None
+
+
+def _inode(filepath: str) -> Optional[int]:
+    try:
+        return os.stat(filepath).st_ino
+    except FileNotFoundError:
+        return None
+
+
+def _segment(f) -> int:
+    """Rotation count from a log's header line (0 without one); leaves f at offset 0"""
+    first = f.readline()
+    f.seek(0)
+    try:
+        return json.loads(first)["segment"]
+    except (ValueError, KeyError, TypeError):
+        return 0
+
+
+def _parse_entry(line: bytes, filepath: str):
+    """(collection, record_id, record) of a log line, or None if it is blank,
+    corrupt or the segment header"""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        print(f"Skipping corrupt entry in {filepath}")
+        return None
+    if "segment" in entry:
+        return None
+    record = entry.get("record") if entry.get("op") == "put" else None
+    return entry["collection"], entry["id"], record
+
+
+class WriteAheadLog:
+    """Append-only log of record-level mutations"""
+
+    def __init__(self, filepath: str, fsync: bool = False, shared: bool = False):
+        self.filepath = filepath
+        self.rotated_path = filepath + ".1"
+        self.fsync = fsync
+        # Appended to and followed by several processes (see module docstring)
+        self.shared = shared
+        self.entries = 0
+        # (segment, offset) of the log read up to, for follow(). Shared logs
+        # start with a {"segment": n} line counting rotations (none means 0);
+        # inode numbers would not do, as a new log may reuse a deleted one's
+        self.position: Optional[Tuple[int, int]] = None
+        # (inode, size, mtime) of the log at position, for changed()
+        self._seen = None
+        self._file = None
+        if shared and not os.path.exists(filepath):
+            open(filepath, 'a').close()
+
+    def replay(self):
+        """Yield (collection, record_id, record) for every logged mutation.
+
+        record is None for deletes. A torn trailing line (crash mid-append)
+        is skipped.
+        """
+        self.entries = 0
+        if not os.path.exists(self.filepath):
+            return
+        with open(self.filepath, 'rb') as f:
+            segment = _segment(f)
+            for line in f:
+                parsed = _parse_entry(line, self.filepath)
+                if parsed is None:
+                    continue
+                self.entries += 1
+                yield parsed
+            self._set_position(segment, f)
+
+    def _set_position(self, segment: int, f):
+        stat = os.fstat(f.fileno())
+        self.position = (segment, f.tell())
+        self._seen = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def changed(self) -> bool:
+        """True if the log was appended to or rotated since the last read (one stat)"""
+        if self.position is None:
+            return False
+        try:
+            stat = os.stat(self.filepath)
+        except FileNotFoundError:
+            return True
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns) != self._seen
+
+    def follow(self) -> Optional[List[tuple]]:
+        """Entries appended since the last replay, follow or append, by any process.
+
+        Returns None if the log was rotated more than once meanwhile: the
+        entries in between are gone and the caller has to reload from the
+        compacted files.
+        """
+        segment, offset = self.position
+        entries = []
+        with open(self.filepath, 'rb') as f:
+            current = _segment(f)
+            if current != segment:
+                if current != segment + 1 or not os.path.exists(self.rotated_path):
+                    return None
+                with open(self.rotated_path, 'rb') as rotated:
+                    if _segment(rotated) != segment:
+                        return None
+                    entries.extend(self._read_from(rotated, offset))
+                offset = 0
+                self.entries = 0
+            new_entries = self._read_from(f, offset)
+            entries.extend(new_entries)
+            self.entries += len(new_entries)
+            self._set_position(current, f)
+        return entries
+
+    def _read_from(self, f, offset: int) -> List[tuple]:
+        """Entries of an open log after byte offset, leaving f at its end"""
+        f.seek(offset)
+        entries = []
+        for line in f:
+            parsed = _parse_entry(line, f.name)
+            if parsed is not None:
+                entries.append(parsed)
+        return entries
+
+    def append(self, collection: str, record_id: str, record: dict = None):
+        """Append a put (record given) or delete (record is None)"""
+        self.append_many(collection, [(record_id, record)])
+
+    def append_many(self, collection: str, records):
+        """Append (record_id, record) pairs with a single write and fsync"""
+        lines = []
+        for record_id, record in records:
+            entry = {
+                "op": "put" if record is not None else "delete",
+                "collection": collection,
+                "id": record_id,
+            }
+            if record is not None:
+                entry["record"] = record
+            lines.append(json.dumps(entry, default=str) + "\n")
+        if not lines:
+            return
+        if self.shared and self._file is not None \
+                and os.fstat(self._file.fileno()).st_ino != _inode(self.filepath):
+            # Another process rotated the log since our last append
+            self.close()
+        if self._file is None:
+            # Shared logs are read back below, hence a+
+            self._file = open(self.filepath, 'a+' if self.shared else 'a')
+        if self.shared:
+            # Terminate a line torn by a process that crashed mid-append,
+            # which would otherwise swallow our first entry
+            size = os.fstat(self._file.fileno()).st_size
+            if size and os.pread(self._file.fileno(), 1, size - 1) != b"\n":
+                lines.insert(0, "\n")
+        self._file.write("".join(lines))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.entries += len(lines)
+        if self.shared:
+            # Callers hold the exclusive lock and have followed up to here first
+            stat = os.fstat(self._file.fileno())
+            self.position = (self.position[0], stat.st_size)
+            self._seen = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def truncate(self):
+        """Drop all entries once they are folded into a snapshot.
+        
+        A shared log is moved to rotated_path instead, for other processes
+        that have not followed its last entries yet.
+        """
+        self.close()
+        segment = 0
+        if self.shared and os.path.exists(self.filepath):
+            with open(self.filepath, 'rb') as f:
+                segment = _segment(f) + 1
+            os.replace(self.filepath, self.rotated_path)
+        with open(self.filepath, 'w') as f:
+            if segment:
+                f.write(json.dumps({"segment": segment}) + "\n")
+        with open(self.filepath, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            self._set_position(segment, f)
+        self.entries = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BackgroundFlusher:
+    """Calls flush_func from a daemon thread to write coalesced changes.
+
+    A flush runs every interval seconds while changes are pending, or as soon
+    as max_dirty changes have accumulated. flush_func returns False (or
+    raises) when something was not written; the changes stay pending and
+    are retried after the next interval.
+    """
+
+    def __init__(self, flush_func, interval: float = 1.0, max_dirty: int = 100):
+        self.flush_func = flush_func
+        self.interval = interval
+        self.max_dirty = max_dirty
+        self._pending = 0
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="db-flusher", daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self, count: int = 1):
+        """Record changes; wakes the flusher once max_dirty is reached"""
+        with self._condition:
+            self._pending += count
+            if self._pending >= self.max_dirty:
+                self._condition.notify()
+
+    def _run(self):
+        failed = False
+        while True:
+            with self._condition:
+                # After a failed flush wait out the interval even with max_dirty pending
+                if not self._stopped and (failed or self._pending < self.max_dirty):
+                    self._condition.wait(self.interval)
+                pending, self._pending = self._pending, 0
+                stopped = self._stopped
+            failed = False
+            if pending:
+                try:
+                    failed = self.flush_func() is False
+                except Exception:
+                    logger.exception("Error flushing database")
+                    failed = True
+                if failed:
+                    # Retry on the next round instead of waiting for new changes
+                    with self._condition:
+                        self._pending += pending
+            if stopped:
+                return
+
+    def stop(self):
+        """Stop the thread after a final flush of pending changes"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+
+
+class LogFollower:
+    """Calls sync_func every interval seconds from a daemon thread"""
+
+    def __init__(self, sync_func, interval: float = 0.1):
+        self.sync_func = sync_func
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="db-follower", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sync_func()
+            except Exception as e:
+                print(f"Error following database log: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
@@ -0,0 +1,230 @@
+"""
+On-demand profiling of live requests, for officials, when PROFILING_ENABLED.
+
+Two ways to capture a profile:
+
+* one request: send it with ``X-Profile: collapsed`` (or ``pstats``) and an
+  official's bearer token; the response carries ``X-Profile-Id``
+* a time window: POST /api/profiling/window?seconds=10 profiles whatever the
+  server runs meanwhile and returns the profile
+
+"collapsed" samples the stacks of every thread (so sync routes running in
+the threadpool are included) and writes the folded-stacks format that
+flamegraph.pl and speedscope read. "pstats" runs cProfile on the event loop
+thread, which covers async routes such as get_hierarchy_stats exactly.
+Either way other requests running at the same time show up in the profile.
+
+Profiles are saved under PROFILE_DIR. With PROFILING_ENABLED=false the
+middleware is not installed at all.
+"""
+
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("data", "profiles"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+MAX_PROFILE_SECONDS = 60
+
+FORMATS = {"collapsed": ".collapsed", "pstats": ".pstats"}
+
+# Leaf frames of threads that are only waiting; their samples are dropped
+IDLE_FRAMES = {("selectors.py", "select"), ("threading.py", "wait"), ("queue.py", "get"),
+               ("thread.py", "_worker")}
+
+
+class ProfilerBusy(Exception):
+    """Another profile is already being captured"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples every thread's stack at a fixed interval into folded-stack counts"""
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.counts[";".join(reversed(stack))] += 1
+
+
+class ProfileSession:
+    """One capture: start(), then stop() saves the profile and returns its name"""
+
+    _lock = threading.Lock()
+
+    def __init__(self, profile_format: str, label: str):
+        if profile_format not in FORMATS:
+            raise ValueError(f"Unknown profile format {profile_format!r}")
+        self.format = profile_format
+        safe_label = "".join(c if c.isalnum() else "_" for c in label).strip("_") or "profile"
+        self.name = (f"{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}-{safe_label[:60]}-"
+                     f"{uuid.uuid4().hex[:6]}{FORMATS[profile_format]}")
+        self._sampler: Optional[StackSampler] = None
+        self._profile: Optional[cProfile.Profile] = None
+        self._started = 0.0
+
+    def start(self):
+        if not ProfileSession._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        self._started = time.perf_counter()
+        if self.format == "collapsed":
+            self._sampler = StackSampler()
+            self._sampler.start()
+        else:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self) -> str:
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, self.name)
+            if self._sampler is not None:
+                counts = self._sampler.stop()
+                with open(path, "w") as f:
+                    for stack, count in counts.most_common():
+                        f.write(f"{stack} {count}\n")
+            else:
+                self._profile.disable()
+                self._profile.dump_stats(path)
+            return self.name
+        finally:
+            ProfileSession._lock.release()
+
+    @property
+    def seconds(self) -> float:
+        return time.perf_counter() - self._started
+
+
+def profile_path(name: str) -> Optional[str]:
+    """Path of a saved profile, or None if there is no such file"""
+    if os.path.basename(name) != name or not name.endswith(tuple(FORMATS.values())):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def list_profiles() -> List[dict]:
+    """Saved profiles, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        path = profile_path(name)
+        if path is not None:
+            stat = os.stat(path)
+            profiles.append({
+                "name": name,
+                "size": stat.st_size,
+                "created_at": datetime.utcfromtimestamp(stat.st_mtime).isoformat(),
+            })
+    return sorted(profiles, key=lambda profile: profile["created_at"], reverse=True)
+
+
+class ProfilingMiddleware:
+    """Profile requests that ask for it with an X-Profile header"""
+
+    def __init__(self, app, authorize):
+        self.app = app
+        # Called with the bearer token; returns the user or raises
+        self.authorize = authorize
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        profile_format = headers.get(b"x-profile")
+        if profile_format is None:
+            await self.app(scope, receive, send)
+            return
+
+        error = self._check(headers, profile_format.decode("latin-1"))
+        if error is not None:
+            await _send_json(send, *error)
+            return
+
+        session = ProfileSession(profile_format.decode("latin-1"),
+                                 f"{scope['method']}-{scope['path']}")
+        try:
+            session.start()
+        except ProfilerBusy:
+            await _send_json(send, 409, "Another profile is being captured")
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", session.name.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            session.stop()
+
+    def _check(self, headers: dict, profile_format: str):
+        """(status, detail) if the request may not be profiled, else None"""
+        if profile_format not in FORMATS:
+            return 400, f"X-Profile must be one of {', '.join(FORMATS)}"
+        scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return 401, "Profiling requires an official's bearer token"
+        try:
+            user = self.authorize(token)
+        except Exception:
+            return 401, "Could not validate credentials"
+        if user.get("user_type") != "official":
+            return 403, "Only officials can profile requests"
+        return None
+
+
+async def _send_json(send, status_code: int, detail: str):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,632 @@
+"""
+SQLite storage backend with the same method surface as database.Database.
+
+Records are stored as JSON documents next to the columns we filter and
+group on, so nothing is loaded into memory except the office hierarchy
+rollup and trend counters, which are built on first use from GROUP BY
+queries over those columns. Select it with DB_BACKEND=sqlite.
+
+SQLite itself is safe to share between worker processes, but the rollups
+are per process. In multi-process mode every change to them is also logged
+to rollup_log in the same transaction, and each worker applies the others'
+deltas when PRAGMA data_version shows that another connection committed.
+"""
+
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+import sqlite3
+import threading
+
+from aggregates import AggregateStore, OfficeAggregate, application_times, processing_days
+from hierarchy import OfficeHierarchy
+from trends import TrendStore, event_days, finished_event
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT,
+    user_type TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+
+CREATE TABLE IF NOT EXISTS applications (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    office_level TEXT,
+    office_name TEXT,
+    status TEXT,
+    service_type TEXT,
+    submitted_date TEXT,
+    rejected INTEGER NOT NULL DEFAULT 0,
+    processing_days INTEGER,
+    submitted_day INTEGER,
+    finished_day INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_applications_user
+    ON applications(user_id, submitted_date);
+CREATE INDEX IF NOT EXISTS idx_applications_office
+    ON applications(office_level, office_name, submitted_date);
+CREATE INDEX IF NOT EXISTS idx_applications_office_status
+    ON applications(office_level, office_name, status, submitted_date);
+CREATE INDEX IF NOT EXISTS idx_applications_office_type
+    ON applications(office_level, office_name, service_type, submitted_date);
+CREATE INDEX IF NOT EXISTS idx_applications_stats
+    ON applications(office_level, office_name, status, service_type, rejected, processing_days);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    sender_id TEXT,
+    recipient_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages(sender_id);
+CREATE INDEX IF NOT EXISTS idx_messages_recipient ON messages(recipient_id);
+
+CREATE TABLE IF NOT EXISTS rollup_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    sign INTEGER NOT NULL,
+    processing_days INTEGER,
+    data TEXT NOT NULL
+);
+"""
+
+# Created after _migrate, as older databases lack the day columns
+TRENDS_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_applications_trends
+    ON applications(office_level, office_name, status, service_type, submitted_day, finished_day)
+"""
+
+# Rollup deltas kept for workers that have not applied them yet; one that
+# falls further behind rebuilds its rollups from the tables
+ROLLUP_LOG_KEEP = 100000
+ROLLUP_LOG_PRUNE_EVERY = 1000
+
+# Office counters grouped the same way OfficeAggregate counts them
+STATS_QUERY = """
+SELECT office_level, office_name, status, service_type,
+       COUNT(*), SUM(rejected), processing_days
+FROM applications
+{where}
+GROUP BY office_level, office_name, status, service_type, processing_days
+"""
+
+# Trend counters per UTC day, grouped the same way TrendStore counts them;
+# {day} is submitted_day or finished_day
+TRENDS_QUERY = """
+SELECT office_level, office_name, status, service_type, {day}, COUNT(*)
+FROM applications
+WHERE {day} IS NOT NULL
+GROUP BY office_level, office_name, status, service_type, {day}
+"""
+
+
+class SQLiteDatabase:
+    def __init__(self, db_path: str = "data/sarkaha.db", data_dir: str = "data",
+                 multiprocess: bool = False):
+        self.db_path = db_path
+        self.data_dir = data_dir
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+
+        # Routes and sync dependencies run on different threads
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.conn.execute(TRENDS_INDEX)
+
+        # First start: import the existing JSON collections
+        if self.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+            self.import_json(data_dir)
+
+        # Callbacks taking a changed user_id (None means all users may have changed)
+        self.user_listeners = []
+        self._hierarchy: Optional[OfficeHierarchy] = None
+        self._trends: Optional[TrendStore] = None
+        # Share the rollups with other worker processes through rollup_log
+        self.multiprocess = multiprocess
+        # Last rollup_log entry counted in our rollups, and the data_version seen then
+        self._rollup_seq = 0
+        self._data_version = None
+
+    def close(self):
+        """Close the connection"""
+        with self._lock:
+            self.conn.close()
+
+    def load(self):
+        """Build the hierarchy rollup and trend counters now rather than on first use"""
+        with self._lock:
+            if self._hierarchy is not None:
+                return
+            # One read transaction, so the rollups match the rollup_log position
+            started = not self.conn.in_transaction
+            if started:
+                self.conn.execute("BEGIN")
+            try:
+                self._rollup_seq = self.conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM rollup_log"
+                ).fetchone()[0]
+                self._data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+                trends = self._build_trends()
+                hierarchy = self._build_hierarchy()
+            finally:
+                if started:
+                    self.conn.commit()
+            self._trends = trends
+            self._hierarchy = hierarchy
+
+    @property
+    def hierarchy(self) -> OfficeHierarchy:
+        if self._hierarchy is None:
+            self.load()
+        else:
+            self.sync()
+        return self._hierarchy
+
+    @property
+    def trends(self) -> TrendStore:
+        if self._trends is None:
+            self.load()
+        else:
+            self.sync()
+        return self._trends
+
+    def reading(self):
+        """Hold off writers and rollup syncing while reading the in-memory
+        rollups, such as hierarchy node aggregates"""
+        return self._lock
+
+    def sync(self) -> bool:
+        """Apply rollup deltas that other workers committed (multi-process mode).
+        
+        Skipped while another thread holds the lock, as it is called from
+        the event loop; that thread's change is already counted. Returns
+        True if anything was applied.
+        """
+        if not self.multiprocess or self._hierarchy is None:
+            return False
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return False
+            self._data_version = version
+            return self._follow_rollups()
+        finally:
+            self._lock.release()
+
+    def _follow_rollups(self) -> bool:
+        """Apply rollup_log entries after the last one counted"""
+        oldest = self.conn.execute("SELECT MIN(seq) FROM rollup_log").fetchone()[0]
+        if oldest is not None and oldest > self._rollup_seq + 1:
+            # Entries we needed were pruned
+            self._hierarchy = self._trends = None
+            self.load()
+            return True
+        rows = self.conn.execute(
+            "SELECT seq, sign, processing_days, data FROM rollup_log WHERE seq > ? ORDER BY seq",
+            (self._rollup_seq,)
+        ).fetchall()
+        for seq, sign, days, data in rows:
+            app = json.loads(data)
+            self._hierarchy.apply(app, sign, days)
+            self._trends.apply(app, sign=sign)
+            self._rollup_seq = seq
+        return bool(rows)
+
+    @contextmanager
+    def _writing(self):
+        """Lock and transaction for an application change.
+        
+        The rollups are built first, since a write counted into them before
+        they exist would be counted twice. In multi-process mode the write
+        lock is taken up front and the other workers' deltas applied, so ours
+        follow them in rollup_log.
+        """
+        self.load()
+        with self._lock, self.conn:
+            if self.multiprocess:
+                self.conn.execute("BEGIN IMMEDIATE")
+                self._follow_rollups()
+            started_at = self._rollup_seq
+            yield
+            if self.multiprocess and \
+                    self._rollup_seq // ROLLUP_LOG_PRUNE_EVERY != started_at // ROLLUP_LOG_PRUNE_EVERY:
+                self.conn.execute("DELETE FROM rollup_log WHERE seq <= ?",
+                                  (self._rollup_seq - ROLLUP_LOG_KEEP,))
+
+    def _apply_rollups(self, app: dict, sign: int, days: Optional[int]):
+        """Count an application into (1) or out of (-1) the rollups"""
+        self._hierarchy.apply(app, sign, days)
+        self._trends.apply(app, sign=sign)
+        if self.multiprocess:
+            cursor = self.conn.execute(
+                "INSERT INTO rollup_log (sign, processing_days, data) VALUES (?, ?, ?)",
+                (sign, days, json.dumps(app))
+            )
+            self._rollup_seq = cursor.lastrowid
+
+    def _build_hierarchy(self) -> OfficeHierarchy:
+        """Seed the hierarchy rollup from one GROUP BY over all offices"""
+        hierarchy = OfficeHierarchy.load(os.path.join(self.data_dir, "hierarchy.json"))
+        store = AggregateStore()
+        for row in self.conn.execute(STATS_QUERY.format(where="")):
+            store.add_counts((row[0], row[1]), *row[2:])
+        hierarchy.rebuild(store)
+        return hierarchy
+
+    def _build_trends(self) -> TrendStore:
+        """Seed the trend counters from two GROUP BYs over the day columns"""
+        trends = TrendStore()
+        for row in self.conn.execute(TRENDS_QUERY.format(day="submitted_day")):
+            trends.add_counts((row[0], row[1]), row[4], "submitted", row[2], row[3], row[5])
+        for row in self.conn.execute(TRENDS_QUERY.format(day="finished_day")):
+            trends.add_counts((row[0], row[1]), row[4], finished_event(row[2]), row[2], row[3], row[5])
+        return trends
+
+    def _migrate(self):
+        """Add the trend day columns to a database created before them.
+
+        Fills them in from the stored documents once; later starts seed the
+        trend counters from the columns alone.
+        """
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(applications)")}
+        if "submitted_day" in columns:
+            return
+        with self._lock, self.conn:
+            self.conn.execute("ALTER TABLE applications ADD COLUMN submitted_day INTEGER")
+            self.conn.execute("ALTER TABLE applications ADD COLUMN finished_day INTEGER")
+            rows = self.conn.execute("SELECT id, data FROM applications").fetchall()
+            self.conn.executemany(
+                "UPDATE applications SET submitted_day = ?, finished_day = ? WHERE id = ?",
+                ((*event_days(json.loads(data)), app_id) for app_id, data in rows)
+            )
+
+    def import_json(self, data_dir: str):
+        """Load citizens, officials, applications and messages from JSON files"""
+        def load(name):
+            filepath = os.path.join(data_dir, name)
+            if not os.path.exists(filepath):
+                return {}
+            with open(filepath, 'r') as f:
+                return json.load(f)
+
+        with self._lock, self.conn:
+            for user in {**load("citizens.json"), **load("officials.json")}.values():
+                self._put_user(user)
+            for app in load("applications.json").values():
+                self._put_application(app)
+            for message in load("messages.json").values():
+                self._put_message(message)
+
+    def _put_user(self, user: dict):
+        self.conn.execute(
+            "INSERT INTO users (id, email, user_type, data) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET email = excluded.email, "
+            "user_type = excluded.user_type, data = excluded.data",
+            (user['id'], user.get('email'), user.get('user_type'), json.dumps(user, default=str))
+        )
+
+    def _put_application(self, app: dict) -> Optional[int]:
+        """Upsert an application and return its processing days"""
+        rejected = app.get("status") == "Rejected" or app.get("approved") == False
+        times = application_times(app)
+        days = processing_days(app, times)
+        submitted_day, finished_day = event_days(app, times)
+        self.conn.execute(
+            "INSERT INTO applications (id, user_id, office_level, office_name, status, "
+            "service_type, submitted_date, rejected, processing_days, submitted_day, "
+            "finished_day, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET user_id = excluded.user_id, "
+            "office_level = excluded.office_level, office_name = excluded.office_name, "
+            "status = excluded.status, service_type = excluded.service_type, "
+            "submitted_date = excluded.submitted_date, rejected = excluded.rejected, "
+            "processing_days = excluded.processing_days, "
+            "submitted_day = excluded.submitted_day, finished_day = excluded.finished_day, "
+            "data = excluded.data",
+            (app['id'], app.get('user_id'), app.get('target_office_level'),
+             app.get('target_office_name'), app.get('status'), app.get('service_type', 'unknown'),
+             app.get('submitted_date'), int(rejected), days, submitted_day, finished_day,
+             json.dumps(app, default=str))
+        )
+        return days
+
+    def _get_application(self, app_id: str):
+        """(application, processing days) or (None, None)"""
+        row = self.conn.execute(
+            "SELECT data, processing_days FROM applications WHERE id = ?", (app_id,)
+        ).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def _put_message(self, message: dict):
+        self.conn.execute(
+            "INSERT INTO messages (id, sender_id, recipient_id, data) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET sender_id = excluded.sender_id, "
+            "recipient_id = excluded.recipient_id, data = excluded.data",
+            (message['id'], message.get('sender_id'), message.get('recipient_id'),
+             json.dumps(message, default=str))
+        )
+
+    def _fetch_one(self, query: str, params: tuple) -> dict:
+        with self._lock:
+            row = self.conn.execute(query, params).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _fetch_all(self, query: str, params: tuple = ()) -> List[dict]:
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _aggregate(self, where: str, params: tuple) -> OfficeAggregate:
+        aggregate = OfficeAggregate()
+        with self._lock:
+            rows = self.conn.execute(STATS_QUERY.format(where=where), params).fetchall()
+        for row in rows:
+            aggregate.apply_counts(*row[2:])
+        return aggregate
+
+    # User operations
+    def create_user(self, user_data: dict) -> dict:
+        """Create a new user"""
+        with self._lock, self.conn:
+            self._put_user(user_data)
+        for listener in self.user_listeners:
+            listener(user_data['id'])
+        return user_data
+
+    def create_users(self, users: List[dict]) -> int:
+        """Create (or replace) many users in one transaction"""
+        with self._lock, self.conn:
+            for user_data in users:
+                self._put_user(user_data)
+        for listener in self.user_listeners:
+            listener(None)
+        return len(users)
+
+    def get_user_by_email(self, email: str) -> dict:
+        """Get user by email"""
+        return self._fetch_one("SELECT data FROM users WHERE email = ? LIMIT 1", (email,))
+
+    def get_user_by_id(self, user_id: str) -> dict:
+        """Get user by ID"""
+        return self._fetch_one("SELECT data FROM users WHERE id = ?", (user_id,))
+
+    def get_all_users(self) -> List[dict]:
+        """Get all users"""
+        return self._fetch_all("SELECT data FROM users ORDER BY rowid")
+
+    def reload_users(self, force: bool = False) -> bool:
+        """Users are always read from the database, so there is nothing to reload"""
+        return False
+
+    def get_officials(self, office_levels: List[str] = None) -> List[dict]:
+        """Get all officials, or only those at the given office levels"""
+        if office_levels is None:
+            return self._fetch_all("SELECT data FROM users WHERE user_type = 'official' ORDER BY rowid")
+        placeholders = ", ".join("?" for _ in office_levels)
+        return self._fetch_all(
+            "SELECT data FROM users WHERE user_type = 'official' "
+            f"AND json_extract(data, '$.office_level') IN ({placeholders}) ORDER BY rowid",
+            tuple(office_levels)
+        )
+
+    # Application operations
+    def create_application(self, app_data: dict) -> dict:
+        """Create a new application"""
+        with self._writing():
+            existing, existing_days = self._get_application(app_data['id'])
+            if existing is not None:
+                self._apply_rollups(existing, -1, existing_days)
+            days = self._put_application(app_data)
+            self._apply_rollups(app_data, 1, days)
+        return app_data
+
+    def create_applications(self, apps: List[dict], replace: bool = True) -> int:
+        """Create (or replace) many applications in one transaction.
+
+        With replace=False existing ids are left untouched and skipped.
+        Returns the number of applications written.
+        """
+        written = 0
+        with self._writing():
+            for app_data in apps:
+                existing, existing_days = self._get_application(app_data['id'])
+                if existing is not None:
+                    if not replace:
+                        continue
+                    self._apply_rollups(existing, -1, existing_days)
+                days = self._put_application(app_data)
+                self._apply_rollups(app_data, 1, days)
+                written += 1
+        return written
+
+    def get_application_by_id(self, app_id: str) -> dict:
+        """Get application by ID"""
+        return self._fetch_one("SELECT data FROM applications WHERE id = ?", (app_id,))
+
+    def update_application(self, app_id: str, updates: dict) -> dict:
+        """Update an application"""
+        with self._writing():
+            app, days = self._get_application(app_id)
+            if app is None:
+                return None
+            self._apply_rollups(app, -1, days)
+            app.update(updates)
+            days = self._put_application(app)
+            self._apply_rollups(app, 1, days)
+        return app
+
+    def update_applications(self, updates: Dict[str, dict]) -> Dict[str, dict]:
+        """Update several applications in one transaction.
+
+        Returns the updated applications by id; unknown ids are skipped.
+        """
+        updated = {}
+        with self._writing():
+            for app_id, changes in updates.items():
+                app, days = self._get_application(app_id)
+                if app is None:
+                    continue
+                self._apply_rollups(app, -1, days)
+                app.update(changes)
+                days = self._put_application(app)
+                self._apply_rollups(app, 1, days)
+                updated[app_id] = app
+        return updated
+
+    def delete_application(self, app_id: str) -> bool:
+        """Delete an application"""
+        with self._writing():
+            app, days = self._get_application(app_id)
+            if app is None:
+                return False
+            self.conn.execute("DELETE FROM applications WHERE id = ?", (app_id,))
+            self._apply_rollups(app, -1, days)
+        return True
+
+    def get_applications_by_user(self, user_id: str) -> List[dict]:
+        """Get all applications for a user"""
+        return self._fetch_all(
+            "SELECT data FROM applications WHERE user_id = ? ORDER BY rowid", (user_id,)
+        )
+
+    def get_applications_by_office(self, office_level: str, office_name: str) -> List[dict]:
+        """Get all applications for a specific office"""
+        return self._fetch_all(
+            "SELECT data FROM applications WHERE office_level = ? AND office_name = ? ORDER BY rowid",
+            (office_level, office_name)
+        )
+
+    def iter_applications_by_office(self, office_level: str, office_name: str,
+                                    chunk_size: int = 500):
+        """Yield an office's applications one at a time (for streaming exports)"""
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT rowid, data FROM applications "
+                    "WHERE office_level = ? AND office_name = ? AND rowid > ? "
+                    "ORDER BY rowid LIMIT ?",
+                    (office_level, office_name, last_rowid, chunk_size)
+                ).fetchall()
+            if not rows:
+                return
+            for rowid, data in rows:
+                yield json.loads(data)
+            last_rowid = rows[-1][0]
+    
+    def get_applications_page(self, office: Tuple[str, str] = None, user_id: str = None,
+                              status: str = None, service_type: str = None,
+                              before: Optional[Tuple[str, str]] = None,
+                              limit: int = 50) -> List[dict]:
+        """Get up to limit applications of an office or user, newest first.
+        
+        before is the (submitted_date, id) of the last item of the previous page.
+        """
+        if office is not None:
+            conditions, params = ["office_level = ?", "office_name = ?"], list(office)
+        else:
+            conditions, params = ["user_id = ?"], [user_id]
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if service_type is not None:
+            conditions.append("service_type = ?")
+            params.append(service_type)
+        if before is not None:
+            conditions.append("(submitted_date, id) < (?, ?)")
+            params.extend(before)
+        params.append(limit)
+        return self._fetch_all(
+            f"SELECT data FROM applications WHERE {' AND '.join(conditions)} "
+            "ORDER BY submitted_date DESC, id DESC LIMIT ?", tuple(params)
+        )
+    
+    def get_office_aggregate(self, office_level: str, office_name: str) -> OfficeAggregate:
+        """Get status/type/processing-time counters for an office"""
+        return self._aggregate(
+            "WHERE office_level = ? AND office_name = ?", (office_level, office_name)
+        )
+
+    def get_levels_aggregate(self, office_levels: List[str]) -> OfficeAggregate:
+        """Get combined counters for every office at the given levels"""
+        placeholders = ", ".join("?" for _ in office_levels) or "NULL"
+        return self._aggregate(f"WHERE office_level IN ({placeholders})", tuple(office_levels))
+
+    def get_trends(self, offices: List[Tuple[str, str]], **options) -> List[dict]:
+        """Daily or weekly submitted/completed/rejected counts, see TrendStore.series"""
+        with self._lock:
+            return self.trends.series(offices, **options)
+
+    def collection_sizes(self) -> Dict[str, int]:
+        """Number of records in each collection"""
+        with self._lock:
+            sizes = {"citizens": 0, "officials": 0}
+            for user_type, count in self.conn.execute(
+                "SELECT user_type, COUNT(*) FROM users GROUP BY user_type"
+            ):
+                sizes["officials" if user_type == "official" else "citizens"] += count
+            for table in ("applications", "messages"):
+                sizes[table] = self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        return sizes
+
+    def get_all_applications(self) -> List[dict]:
+        """Get all applications"""
+        return self._fetch_all("SELECT data FROM applications ORDER BY rowid")
+
+    # Message operations
+    def create_message(self, message_data: dict) -> dict:
+        """Create a new message"""
+        with self._lock, self.conn:
+            self._put_message(message_data)
+        return message_data
+
+    def create_messages(self, messages: List[dict]) -> int:
+        """Create (or replace) many messages in one transaction"""
+        with self._lock, self.conn:
+            for message_data in messages:
+                self._put_message(message_data)
+        return len(messages)
+
+    def get_message_by_id(self, message_id: str) -> dict:
+        """Get message by ID"""
+        return self._fetch_one("SELECT data FROM messages WHERE id = ?", (message_id,))
+
+    def get_messages_for_user(self, user_id: str) -> List[dict]:
+        """Get all messages for a user (sent or received)"""
+        return self._fetch_all(
+            "SELECT data FROM messages WHERE recipient_id = ? "
+            "UNION SELECT data FROM messages WHERE sender_id = ?", (user_id, user_id)
+        )
+
+    def get_received_messages(self, user_id: str) -> List[dict]:
+        """Get messages received by a user"""
+        return self._fetch_all(
+            "SELECT data FROM messages WHERE recipient_id = ? ORDER BY rowid", (user_id,)
+        )
+
+    def get_sent_messages(self, user_id: str) -> List[dict]:
+        """Get messages sent by a user"""
+        return self._fetch_all(
+            "SELECT data FROM messages WHERE sender_id = ? ORDER BY rowid", (user_id,)
+        )
+
+    def mark_message_read(self, message_id: str) -> dict:
+        """Mark a message as read"""
+        with self._lock, self.conn:
+            message = self.get_message_by_id(message_id)
+            if message is None:
+                return None
+            message['read'] = True
+            self._put_message(message)
+        return message
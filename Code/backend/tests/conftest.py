@@ -0,0 +1,28 @@
+import json
+import os
+import shutil
+import sys
+
+import pytest
+
+# The backend modules import each other as top-level modules
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# database.py creates its global instance at import; keep it on the sample data
+os.environ.setdefault("DB_DATA_DIR", os.path.join(BACKEND_DIR, "data"))
+
+SAMPLE_DIR = os.path.join(BACKEND_DIR, "data")
+
+
+def sample_records(collection: str) -> list:
+    with open(os.path.join(SAMPLE_DIR, f"{collection}.json")) as f:
+        return list(json.load(f).values())
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """A writable copy of the sample data directory"""
+    for name in ("citizens", "officials", "applications", "messages", "hierarchy"):
+        shutil.copy(os.path.join(SAMPLE_DIR, f"{name}.json"), tmp_path)
+    return str(tmp_path)
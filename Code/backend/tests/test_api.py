@@ -0,0 +1,189 @@
+import base64
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import metrics
+import responses
+from auth import get_current_user
+from database import Database
+from conftest import sample_records
+
+WARD_5 = ("local", "Ward 5 - Pokhara Ward Office")
+
+
+def official(office_level: str, office_name: str) -> dict:
+    return next(user for user in sample_records("officials")
+                if (user.get("office_level"), user.get("office_name")) == (office_level, office_name))
+
+
+@pytest.fixture
+def db(data_dir, monkeypatch):
+    database = Database(data_dir, persistence_mode="json")
+    monkeypatch.setattr(main, "db", database)
+    return database
+
+
+@pytest.fixture
+def client(db):
+    with TestClient(main.app) as client:
+        yield client
+    main.app.dependency_overrides.clear()
+
+
+def login(user: dict):
+    main.app.dependency_overrides[get_current_user] = lambda: user
+
+
+def cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def test_office_page_follows_cursor(client):
+    login(official(*WARD_5))
+    first = client.get("/api/office/applications/page", params={"limit": 5}).json()
+    second = client.get("/api/office/applications/page",
+                        params={"limit": 5, "cursor": first["next_cursor"]}).json()
+
+    assert len(first["items"]) == len(second["items"]) == 5
+    assert not {item["id"] for item in first["items"]} & {item["id"] for item in second["items"]}
+
+
+@pytest.mark.parametrize("value", [
+    "not base64 json",
+    cursor([1, 2]),
+    cursor([None, "APP1"]),
+    cursor(["2026-01-01T00:00:00", 5]),
+    cursor(["only one"]),
+    cursor({"submitted_date": "x", "id": "y"}),
+    cursor("2026-01-01"),
+])
+def test_malformed_cursor_is_rejected(client, value):
+    login(official(*WARD_5))
+    response = client.get("/api/office/applications/page", params={"cursor": value})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/api/officials", {}),
+    ("/api/office/applications", {}),
+    ("/api/office/applications/page", {"limit": 20}),
+    ("/api/office/applications/page", {"limit": 20, "fields": "status,submitted_date"}),
+])
+def test_fast_responses_match_validated_ones(client, monkeypatch, path, params):
+    login(official(*WARD_5))
+    validated = client.get(path, params=params).json()
+
+    monkeypatch.setattr(responses, "FAST_RESPONSES", True)
+    fast = client.get(path, params=params)
+
+    assert fast.headers["content-type"] == "application/json"
+    assert fast.json() == validated
+
+
+def test_metrics_token_is_required_when_set(client, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scrape-secret")
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert "sarkaha_collection_size" in response.text
+
+
+def test_metrics_are_hidden_when_disabled(client, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+
+    assert client.get("/metrics").status_code == 404
+
+
+def sample_records_by_id(collection: str) -> dict:
+    return {record["id"]: record for record in sample_records(collection)}
+
+
+def office_application_ids(db, office) -> list:
+    return [application["id"] for application in db.get_applications_by_office(*office)]
+
+
+def test_batch_update_reports_each_item(client, db):
+    login(official(*WARD_5))
+    first, second = office_application_ids(db, WARD_5)[:2]
+    elsewhere = office_application_ids(db, ("local", "Ward 7 - Pokhara Ward Office"))[0]
+    response = client.put("/api/applications/batch", json={"items": [
+        {"id": first, "status": "In Progress", "progress": 40},
+        {"id": "APPMISSING"},
+        {"id": first, "status": "Completed"},
+        {"id": elsewhere, "status": "Completed"},
+        {"id": second, "status": "Rejected", "rejection_message": "Missing documents"},
+    ]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["updated"] == 2
+    assert [result["status_code"] for result in body["results"]] == [200, 404, 409, 403, 200]
+    assert body["results"][0]["application"]["status"] == "In Progress"
+    assert db.get_application_by_id(first)["progress"] == 40
+    assert db.get_application_by_id(second)["rejected_date"] is not None
+    assert db.get_application_by_id(elsewhere) == sample_records_by_id("applications")[elsewhere]
+
+
+def test_batch_update_size_is_limited(client, monkeypatch):
+    login(official(*WARD_5))
+    monkeypatch.setattr(main, "MAX_BATCH_UPDATE", 2)
+    response = client.put("/api/applications/batch",
+                          json={"items": [{"id": f"APP{i}"} for i in range(3)]})
+
+    assert response.status_code == 400
+
+
+def import_line(**fields) -> str:
+    record = {
+        "full_name": "Sita Sharma", "email": "sita@example.com", "phone": "9800000000",
+        "address": "Pokhara", "service_type": "Birth Certificate", "citizenship_number": "12-34",
+        "target_office_level": WARD_5[0], "target_office_name": WARD_5[1],
+    }
+    record.update(fields)
+    return json.dumps(record)
+
+
+def test_import_adds_new_applications_and_rejects_bad_lines(client, db, monkeypatch):
+    user = official(*WARD_5)
+    login(user)
+    published = []
+    monkeypatch.setattr(main, "_publish_application", published.append)
+    existing = office_application_ids(db, ("local", "Ward 7 - Pokhara Ward Office"))[0]
+    before = db.get_application_by_id(existing).copy()
+    body = "\n".join([
+        import_line(id="APPIMPORT1"),
+        import_line(),
+        "{not json",
+        import_line(id=existing),
+        import_line(email="not an email"),
+        import_line(id="APPIMPORT1"),
+        import_line(target_office_name="Ward 7 - Pokhara Ward Office"),
+        "",
+    ])
+    response = client.post("/api/applications/import", content=body,
+                           headers={"Content-Type": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["received"], report["imported"], report["failed"]) == (7, 2, 5)
+    errors = {error["line"]: error["detail"] for error in report["errors"]}
+    assert set(errors) == {3, 4, 5, 6, 7}
+    assert errors[3].startswith("Invalid JSON")
+    assert errors[4] == f"Application {existing} already exists"
+    assert errors[6] == "Application APPIMPORT1 already exists"
+    assert "Not allowed" in errors[7]
+
+    imported = db.get_application_by_id("APPIMPORT1")
+    assert imported["user_id"] == user["id"] and imported["status"] == "Submitted"
+    assert db.get_application_by_id(existing) == before
+    assert len(db.get_applications_by_office(*WARD_5)) == 42
+    assert [application["id"] for application in published][0] == "APPIMPORT1"
+    assert len(published) == 2
@@ -0,0 +1,244 @@
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+import database
+from database import Database
+from conftest import sample_records
+
+
+@pytest.fixture
+def sample_application():
+    return sample_records("applications")[0]
+
+
+def new_application(template: dict, number: int) -> dict:
+    return dict(template, id=f"APPTEST{number:04d}", status="Submitted", progress=10)
+
+
+def derived_state(db: Database):
+    """Records and the indexes/counters kept alongside them, in comparable form"""
+    return {
+        "applications": db.applications,
+        "by_user": {key: sorted(bucket) for key, bucket in db.applications_by_user.state().items()},
+        "aggregates": {
+            key: (aggregate.total, aggregate.status_counts, aggregate.type_counts)
+            for key, aggregate in db.office_aggregates.state().items() if aggregate.total
+        },
+        "trends": db.trends.state(),
+        "messages": db.messages,
+    }
+
+
+def fresh_state(data_dir: str):
+    """Derived state of a plain load from the JSON files and the log, without snapshots"""
+    snapshot_enabled, database.SNAPSHOT_ENABLED = database.SNAPSHOT_ENABLED, False
+    db = Database(data_dir, persistence_mode="wal", multiprocess=False)
+    try:
+        return derived_state(db)
+    finally:
+        db.wal.close()
+        database.SNAPSHOT_ENABLED = snapshot_enabled
+
+
+def test_wal_replays_changes_after_crash(data_dir, sample_application, monkeypatch):
+    monkeypatch.setattr(database, "SNAPSHOT_ENABLED", False)
+    db = Database(data_dir, persistence_mode="wal")
+    created = new_application(sample_application, 1)
+    db.create_application(created)
+    db.update_application(sample_application["id"], {"status": "Completed", "progress": 100,
+                                                     "completed_date": "2026-01-05T10:00:00"})
+    deleted_id = next(app_id for app_id in db.applications if app_id != sample_application["id"]
+                      and app_id != created["id"])
+    db.delete_application(deleted_id)
+    expected = derived_state(db)
+    # Crash: no close() or compaction, and a half-written entry at the end
+    db.wal._file.write('{"op": "put", "collection": "applications", "id": "APPTORN"')
+    db.wal._file.flush()
+
+    with open(os.path.join(data_dir, "applications.json")) as f:
+        on_disk = json.load(f)
+    assert created["id"] not in on_disk and deleted_id in on_disk
+
+    recovered = Database(data_dir, persistence_mode="wal")
+    assert derived_state(recovered) == expected
+    assert recovered.get_application_by_id(sample_application["id"])["status"] == "Completed"
+    assert recovered.get_application_by_id(deleted_id) is None
+    assert recovered.get_application_by_id("APPTORN") is None
+
+
+def test_failed_compaction_keeps_the_log(data_dir, sample_application, monkeypatch):
+    db = Database(data_dir, persistence_mode="wal")
+    created = new_application(sample_application, 1)
+    db.create_application(created)
+
+    save = database.atomic_write_json
+    def disk_full(filepath, data):
+        if filepath.endswith("applications.json"):
+            raise OSError(28, "No space left on device")
+        save(filepath, data)
+    monkeypatch.setattr(database, "atomic_write_json", disk_full)
+    assert not db.compact()
+    assert db.wal.entries == 1
+
+    restarted = Database(data_dir, persistence_mode="wal")
+    assert restarted.get_application_by_id(created["id"]) == created
+
+    monkeypatch.setattr(database, "atomic_write_json", save)
+    assert db.compact()
+    assert db.wal.entries == 0
+    assert fresh_state(data_dir)["applications"][created["id"]] == created
+
+
+def read_applications(data_dir: str) -> dict:
+    with open(os.path.join(data_dir, "applications.json")) as f:
+        return json.load(f)
+
+
+def test_failed_flush_is_retried(data_dir, sample_application, monkeypatch):
+    monkeypatch.setattr(database, "FLUSH_INTERVAL", 0.05)
+    save = database.atomic_write_json
+    failing = {"applications.json"}
+    def disk_full(filepath, data):
+        if os.path.basename(filepath) in failing:
+            raise OSError(28, "No space left on device")
+        save(filepath, data)
+    monkeypatch.setattr(database, "atomic_write_json", disk_full)
+
+    db = Database(data_dir, persistence_mode="flush")
+    created = new_application(sample_application, 1)
+    db.create_application(created)
+    assert not db.flush()
+    assert "applications" in db._dirty
+
+    # The flusher keeps retrying once the disk has room again
+    failing.clear()
+    deadline = time.monotonic() + 5
+    while created["id"] not in read_applications(data_dir) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert read_applications(data_dir)[created["id"]] == created
+    db.close()
+
+
+def test_close_writes_changes_a_failed_flush_left(data_dir, sample_application, monkeypatch):
+    monkeypatch.setattr(database, "FLUSH_INTERVAL", 3600)
+    save = database.atomic_write_json
+    def disk_full(filepath, data):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(database, "atomic_write_json", disk_full)
+
+    db = Database(data_dir, persistence_mode="flush")
+    created = new_application(sample_application, 1)
+    db.create_application(created)
+    assert not db.flush()
+
+    monkeypatch.setattr(database, "atomic_write_json", save)
+    db.close()
+    assert read_applications(data_dir)[created["id"]] == created
+
+
+def test_snapshot_is_used_only_while_json_files_are_unchanged(data_dir, sample_application,
+                                                              monkeypatch):
+    monkeypatch.setattr(database, "SNAPSHOT_ENABLED", True)
+    db = Database(data_dir, persistence_mode="json")
+    db.load()
+    assert db.write_snapshot()
+    expected = derived_state(db)
+
+    parsed = []
+    load_json = Database._load_json
+    monkeypatch.setattr(Database, "_load_json",
+                        lambda self, filepath, default: parsed.append(os.path.basename(filepath))
+                        or load_json(self, filepath, default))
+
+    unchanged = Database(data_dir, persistence_mode="json")
+    assert derived_state(unchanged) == expected
+    assert parsed == []
+
+    # Edited behind the database's back, e.g. by hand or by an older deployment
+    path = os.path.join(data_dir, "applications.json")
+    with open(path) as f:
+        applications = json.load(f)
+    applications[sample_application["id"]]["status"] = "Rejected"
+    with open(path, "w") as f:
+        json.dump(applications, f)
+
+    edited = Database(data_dir, persistence_mode="json")
+    assert edited.get_application_by_id(sample_application["id"])["status"] == "Rejected"
+    # Groups whose files are unchanged still come from their snapshot
+    edited.messages
+    assert parsed == ["applications.json"]
+    assert derived_state(edited) == fresh_state(data_dir)
+
+
+def test_workers_converge_across_compactions(data_dir, sample_application, monkeypatch):
+    monkeypatch.setattr(database, "WAL_COMPACT_EVERY", 7)
+    # Sync explicitly instead of from the follower threads
+    monkeypatch.setattr(database, "SYNC_INTERVAL", 3600)
+    first = Database(data_dir, multiprocess=True)
+    second = Database(data_dir, multiprocess=True)
+    try:
+        first.load()
+        second.load()
+        for number in range(40):
+            writer = first if number % 2 else second
+            writer.create_application(new_application(sample_application, number))
+            if number % 5 == 0:
+                other = second if writer is first else first
+                other.update_application(f"APPTEST{number:04d}", {"status": "In Progress"})
+        first.sync()
+        second.sync()
+        assert derived_state(first) == derived_state(second)
+        assert first.get_application_by_id("APPTEST0010")["status"] == "In Progress"
+
+        # One worker falls more than a compaction behind and reloads from the files
+        for number in range(40, 60):
+            first.create_application(new_application(sample_application, number))
+        assert second.wal.follow() is None
+        assert second.sync()
+        assert derived_state(second) == derived_state(first)
+    finally:
+        first.close()
+        second.close()
+
+    assert fresh_state(data_dir) == derived_state(first)
+
+
+def test_reads_are_safe_during_concurrent_writes(data_dir, sample_application, monkeypatch):
+    monkeypatch.setattr(database, "SNAPSHOT_ENABLED", False)
+    db = Database(data_dir, persistence_mode="flush")
+    db.load()
+    office = (sample_application["target_office_level"], sample_application["target_office_name"])
+    stop = threading.Event()
+
+    def write():
+        number = 0
+        while not stop.is_set():
+            batch = [new_application(sample_application, number + i) for i in range(20)]
+            db.create_applications(batch)
+            for application in batch:
+                db.delete_application(application["id"])
+            number += 20
+
+    # Switch threads as often as possible, so reads interleave with writes
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        deadline = time.monotonic() + 1.5
+        while time.monotonic() < deadline:
+            db.get_applications_page(office=office, limit=500)
+            db.get_applications_by_office(*office)
+            db.get_office_aggregate(*office).to_stats("office", office[1], office[0])
+            list(db.iter_applications_by_office(*office))
+            db.get_all_applications()
+    finally:
+        stop.set()
+        writer.join()
+        sys.setswitchinterval(switch_interval)
+        db.close()
@@ -0,0 +1,69 @@
+import json
+import os
+import sys
+
+import generate_sample_applications
+from database import Database
+from hierarchy import OfficeHierarchy
+from models import Application, Message, User
+
+NOW = 1767225600.0  # 2026-01-01T00:00:00Z
+COLLECTIONS = ("citizens", "officials", "applications", "messages")
+
+
+def generate(out, monkeypatch, *options):
+    monkeypatch.setattr(sys, "argv", [
+        "generate_sample_applications.py", "--out", str(out), "--now", str(NOW),
+        "--applications", "300", "--citizens", "50", "--messages", "40",
+        "--provinces", "1", "--districts", "2", "--municipalities", "2", "--wards", "3",
+        *options,
+    ])
+    generate_sample_applications.main()
+    data = {}
+    for collection in COLLECTIONS:
+        with open(os.path.join(out, f"{collection}.json")) as f:
+            data[collection] = json.load(f)
+    return data
+
+
+def without_password_hashes(users: dict) -> dict:
+    # bcrypt salts every hash differently
+    return {user_id: {k: v for k, v in user.items() if k != "hashed_password"}
+            for user_id, user in users.items()}
+
+
+def test_same_seed_generates_the_same_dataset(tmp_path, monkeypatch):
+    first = generate(tmp_path / "first", monkeypatch)
+    second = generate(tmp_path / "second", monkeypatch)
+    other_seed = generate(tmp_path / "other", monkeypatch, "--seed", "7")
+
+    assert first["applications"] == second["applications"]
+    assert first["messages"] == second["messages"]
+    for collection in ("citizens", "officials"):
+        assert without_password_hashes(first[collection]) == without_password_hashes(second[collection])
+    assert first["applications"] != other_seed["applications"]
+
+
+def test_generated_records_fit_the_models_and_hierarchy(tmp_path, monkeypatch):
+    data = generate(tmp_path, monkeypatch)
+    hierarchy = OfficeHierarchy.load(os.path.join(tmp_path, "hierarchy.json"))
+    offices = {node.office for node in hierarchy.nodes.values() if node.office is not None}
+
+    assert len(data["applications"]) == 300
+    assert len(data["citizens"]) == 50
+    for app_id, application in data["applications"].items():
+        assert Application.model_validate(application).id == app_id
+        assert (application["target_office_level"], application["target_office_name"]) in offices
+        assert application["user_id"] in data["citizens"]
+        assert application["submitted_date"] < "2026-01-01"
+    for message in data["messages"].values():
+        Message.model_validate(message)
+        assert message["recipient_id"] in data["officials"]
+    for user in (*data["citizens"].values(), *data["officials"].values()):
+        User.model_validate(user)
+
+    # The JSON backend loads the output as its data directory, and every
+    # application rolls up to the root of the generated hierarchy
+    db = Database(str(tmp_path), persistence_mode="json")
+    assert len(db.applications) == 300
+    assert db.hierarchy.root.aggregate.total == 300
@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+import responses
+from models import Application, Message, User
+from conftest import sample_records
+
+
+@pytest.fixture
+def fast_responses(monkeypatch):
+    monkeypatch.setattr(responses, "FAST_RESPONSES", True)
+    monkeypatch.setattr(responses, "VALIDATE_RESPONSES", False)
+
+
+@pytest.mark.parametrize("collection, model", [
+    ("applications", Application),
+    ("messages", Message),
+    ("officials", User),
+    ("citizens", User),
+])
+def test_trusted_matches_validated_serialization(fast_responses, collection, model):
+    records = sample_records(collection)
+    validated = [model.model_validate(record).model_dump(mode="json") for record in records]
+
+    response = responses.trusted(records, model)
+
+    assert json.loads(response.body) == validated
+
+
+def test_trusted_fills_missing_defaults(fast_responses):
+    official = dict(sample_records("officials")[0], hashed_password="secret")
+    official.pop("is_monitor", None)
+    official.pop("monitors", None)
+
+    content = json.loads(responses.trusted(official, User).body)
+
+    assert content["is_monitor"] is None
+    assert content["monitors"] is None
+    assert "hashed_password" not in content
+    assert set(content) == set(User.model_fields)
+
+
+def test_trusted_passes_content_through_when_disabled(monkeypatch):
+    monkeypatch.setattr(responses, "FAST_RESPONSES", False)
+    records = sample_records("applications")
+
+    assert responses.trusted(records, Application) is records
@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from database import Database
+from sqlite_database import SQLiteDatabase
+from conftest import sample_records
+
+WARD_5 = ("local", "Ward 5 - Pokhara Ward Office")
+
+
+@pytest.fixture
+def backends(data_dir):
+    """The JSON and the SQLite backend, both loaded from the sample data"""
+    json_db = Database(data_dir, persistence_mode="json")
+    sqlite_db = SQLiteDatabase(os.path.join(data_dir, "test.db"), data_dir)
+    yield json_db, sqlite_db
+    json_db.close()
+    sqlite_db.close()
+
+
+def by_id(records) -> dict:
+    return {record["id"]: record for record in records}
+
+
+def observations(db) -> dict:
+    """What the routes read from a backend, in order-insensitive form where
+    the backends do not promise an order"""
+    applications = sample_records("applications")
+    user_id = applications[0]["user_id"]
+    official = next(user for user in sample_records("officials") if user.get("office_name") == WARD_5[1])
+    hierarchy_nodes = {node_id: node.stats() for node_id, node in db.hierarchy.nodes.items()}
+    return {
+        "applications": by_id(db.get_all_applications()),
+        "by_id": [db.get_application_by_id(app["id"]) for app in applications[:10]],
+        "by_user": by_id(db.get_applications_by_user(user_id)),
+        "by_office": by_id(db.get_applications_by_office(*WARD_5)),
+        "export": by_id(db.iter_applications_by_office(*WARD_5)),
+        "page": [app["id"] for app in db.get_applications_page(office=WARD_5, limit=15)],
+        "page_status": [app["id"] for app in db.get_applications_page(
+            office=WARD_5, status="Completed", limit=15)],
+        "user_page": [app["id"] for app in db.get_applications_page(user_id=user_id, limit=15)],
+        "office_stats": db.get_office_aggregate(*WARD_5).to_stats("ward-5", WARD_5[1], WARD_5[0]),
+        "levels_stats": db.get_levels_aggregate(["local", "district"]).to_stats("levels", "", ""),
+        "hierarchy": hierarchy_nodes,
+        "trends": db.get_trends([WARD_5], days=120, interval="week", last_day=20454),
+        "user": db.get_user_by_email(official["email"]),
+        "users": by_id(db.get_all_users()),
+        "officials": by_id(db.get_officials(["local"])),
+        "messages": by_id(db.get_messages_for_user(official["id"])),
+        "received": by_id(db.get_received_messages(official["id"])),
+        "sizes": db.collection_sizes(),
+    }
+
+
+def apply_changes(db):
+    applications = sample_records("applications")
+    office_ids = [app["id"] for app in applications if (app["target_office_level"],
+                                                        app["target_office_name"]) == WARD_5]
+    db.create_applications([
+        dict(applications[0], id=f"APPPARITY{i}", target_office_level=WARD_5[0],
+             target_office_name=WARD_5[1], submitted_date=f"2025-12-2{i}T10:00:00")
+        for i in range(5)
+    ])
+    db.update_application(office_ids[0], {"status": "Completed", "progress": 100,
+                                          "completed_date": "2025-12-31T10:00:00"})
+    db.update_applications({office_ids[1]: {"status": "Rejected", "rejected_date": "2025-12-31T11:00:00"}})
+    db.delete_application(office_ids[2])
+    db.create_user(dict(sample_records("citizens")[0], id="citizen-parity", email="parity@example.com"))
+    message = sample_records("messages")[0]
+    db.create_message(dict(message, id="msg-parity"))
+    db.mark_message_read("msg-parity")
+
+
+def test_backends_load_the_same_data(backends):
+    json_db, sqlite_db = backends
+
+    assert observations(sqlite_db) == observations(json_db)
+
+
+def test_backends_agree_after_the_same_writes(backends):
+    json_db, sqlite_db = backends
+    for db in backends:
+        apply_changes(db)
+
+    assert observations(sqlite_db) == observations(json_db)
+    assert sqlite_db.get_application_by_id("APPPARITY3") == json_db.get_application_by_id("APPPARITY3")
@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from database import Database
+from sqlite_database import SQLiteDatabase
+from trends import TrendStore
+from conftest import sample_records
+
+LAST_DAY = 20454  # 2026-01-01
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def db(request, data_dir):
+    if request.param == "json":
+        database = Database(data_dir, persistence_mode="json")
+    else:
+        database = SQLiteDatabase(os.path.join(data_dir, "test.db"), data_dir)
+    yield database
+    database.close()
+
+
+def recount(db) -> dict:
+    trends = TrendStore()
+    trends.rebuild(db.get_all_applications())
+    return trends.state()
+
+
+def change_applications(db):
+    """Create, complete, reject, move and delete applications"""
+    applications = sample_records("applications")
+    pending = [app for app in applications if app["status"] not in ("Completed", "Rejected")]
+    db.create_application(dict(applications[0], id="APPTREND1", status="Submitted",
+                               submitted_date="2025-12-30T09:15:00+05:45"))
+    db.update_application(pending[0]["id"], {"status": "Completed",
+                                             "completed_date": "2025-12-31T10:00:00"})
+    db.update_applications({
+        pending[1]["id"]: {"status": "Rejected", "rejected_date": "2025-12-31T11:00:00Z"},
+        pending[2]["id"]: {"status": "Rejected"},
+        applications[3]["id"]: {"target_office_name": "Ward 9 - Pokhara Ward Office"},
+    })
+    db.delete_application(applications[4]["id"])
+
+
+def test_trend_counters_match_a_recount_after_writes(db):
+    db.trends  # Seed the counters before the writes, so they are kept up by deltas
+    change_applications(db)
+
+    assert db.trends.state() == recount(db)
+
+
+def test_sqlite_seeds_trend_counters_like_a_recount(data_dir):
+    path = os.path.join(data_dir, "test.db")
+    writer = SQLiteDatabase(path, data_dir)
+    change_applications(writer)
+    writer.close()
+
+    reopened = SQLiteDatabase(path, data_dir)
+    try:
+        assert reopened.trends.state() == recount(reopened)
+    finally:
+        reopened.close()
+
+
+def test_series_counts_each_event_on_its_day(db):
+    office = ("local", "Ward 9 - Pokhara Ward Office")
+    before = db.get_trends([office], days=3, last_day=LAST_DAY)
+    template = sample_records("applications")[0]
+    db.create_application(dict(template, id="APPTREND2", target_office_level=office[0],
+                               target_office_name=office[1], status="Completed",
+                               submitted_date="2025-12-30T08:00:00",
+                               completed_date="2025-12-31T08:00:00"))
+    db.create_application(dict(template, id="APPTREND3", target_office_level=office[0],
+                               target_office_name=office[1], status="Rejected",
+                               submitted_date="2025-12-31T08:00:00", rejected_date=None))
+    after = db.get_trends([office], days=3, last_day=LAST_DAY)
+
+    delta = [{event: b[event] - a[event] for event in ("submitted", "completed", "rejected")}
+             for a, b in zip(before, after)]
+    assert [bucket["start"] for bucket in after] == ["2025-12-30", "2025-12-31", "2026-01-01"]
+    assert delta == [
+        {"submitted": 1, "completed": 0, "rejected": 0},
+        {"submitted": 1, "completed": 1, "rejected": 1},
+        {"submitted": 0, "completed": 0, "rejected": 0},
+    ]
@@ -0,0 +1,166 @@
+"""
+Per-office daily counters for trend charts.
+
+Every application adds one count to the day it was submitted (under its
+current status) and, once finished, one to the day it was completed or
+rejected. Counters are kept per office -> UTC day -> (event, status,
+service_type) and updated as deltas on each mutation, so a 90-day chart
+reads 90 small dicts per office instead of scanning and date-parsing
+applications.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aggregates import OfficeKey, Timestamps, application_times, office_key
+
+SECONDS_PER_DAY = 86400
+EPOCH = date(1970, 1, 1)
+EVENTS = ("submitted", "completed", "rejected")
+INTERVALS = ("day", "week")
+
+# (event, status, service_type) -> count
+DayCounters = Dict[Tuple[str, str, str], int]
+
+
+def day_index(timestamp: float) -> int:
+    """UTC day number (days since 1970-01-01) of an epoch timestamp"""
+    return int(timestamp // SECONDS_PER_DAY)
+
+
+def today_index() -> int:
+    return day_index(datetime.now(timezone.utc).timestamp())
+
+
+def bucket_start(day: int, interval: str) -> int:
+    """First day of the bucket holding day (weeks start on Monday)"""
+    if interval == "week":
+        # Day 0 was a Thursday
+        return day - (day + 3) % 7
+    return day
+
+
+def trend_events(app: dict, times: Timestamps) -> List[Tuple[int, str, str, str]]:
+    """(day, event, status, service_type) counts contributed by one application.
+
+    Rejections are dated by rejected_date; older records without one count
+    on the day they were submitted.
+    """
+    submitted, completed, rejected = times
+    status = app.get("status")
+    service_type = app.get("service_type", "unknown")
+    events = []
+    if submitted is not None:
+        events.append((day_index(submitted), "submitted", status, service_type))
+    if status == "Completed" and completed is not None:
+        events.append((day_index(completed), "completed", status, service_type))
+    if status == "Rejected":
+        when = rejected if rejected is not None else submitted
+        if when is not None:
+            events.append((day_index(when), "rejected", status, service_type))
+    return events
+
+
+def event_days(app: dict, times: Timestamps = None) -> Tuple[Optional[int], Optional[int]]:
+    """(submitted day, completed or rejected day) of an application, as
+    counted by trend_events; the event of the second follows from status"""
+    if times is None:
+        times = application_times(app)
+    submitted_day = finished_day = None
+    for day, event, _, _ in trend_events(app, times):
+        if event == "submitted":
+            submitted_day = day
+        else:
+            finished_day = day
+    return submitted_day, finished_day
+
+
+def finished_event(status: str) -> str:
+    """Event counted on an application's finished day"""
+    return "completed" if status == "Completed" else "rejected"
+
+
+class TrendStore:
+    """Daily counters per (office_level, office_name)"""
+
+    def __init__(self):
+        self._offices: Dict[OfficeKey, Dict[int, DayCounters]] = {}
+
+    def apply(self, app: dict, times: Timestamps = None, sign: int = 1):
+        """Add (sign=1) or remove (sign=-1) an application's counts"""
+        if times is None:
+            times = application_times(app)
+        key = office_key(app)
+        days = self._offices.setdefault(key, {})
+        for day, event, status, service_type in trend_events(app, times):
+            counters = days.setdefault(day, {})
+            bucket = (event, status, service_type)
+            value = counters.get(bucket, 0) + sign
+            if value:
+                counters[bucket] = value
+            else:
+                counters.pop(bucket, None)
+                if not counters:
+                    del days[day]
+        if not days:
+            del self._offices[key]
+
+    def add_counts(self, key: OfficeKey, day: int, event: str, status: str,
+                   service_type: str, count: int):
+        """Add a pre-counted group of events to an office's day"""
+        counters = self._offices.setdefault(key, {}).setdefault(day, {})
+        bucket = (event, status, service_type)
+        counters[bucket] = counters.get(bucket, 0) + count
+
+    def rebuild(self, apps: Iterable[dict], times_func=application_times):
+        self._offices = {}
+        for app in apps:
+            self.apply(app, times_func(app))
+
+    def state(self):
+        """Counters for a snapshot"""
+        return self._offices
+
+    def load_state(self, state):
+        self._offices = state
+
+    def series(self, offices: Iterable[OfficeKey], days: int = 90, interval: str = "day",
+               status: Optional[str] = None, service_type: Optional[str] = None,
+               last_day: int = None) -> List[dict]:
+        """Submitted/completed/rejected counts per bucket over the last days days.
+
+        status narrows the submitted series to applications currently in that
+        status; service_type narrows every series.
+        """
+        if last_day is None:
+            last_day = today_index()
+        first_day = last_day - days + 1
+        buckets: Dict[int, Dict[str, int]] = {}
+        start = bucket_start(first_day, interval)
+        while start <= last_day:
+            buckets[start] = dict.fromkeys(EVENTS, 0)
+            start += 7 if interval == "week" else 1
+
+        for key in offices:
+            office_days = self._offices.get(key)
+            if not office_days:
+                continue
+            # Sparse offices: walk their days; busy ones: look up each day in range
+            if len(office_days) < days:
+                day_counters = ((d, c) for d, c in office_days.items() if first_day <= d <= last_day)
+            else:
+                day_counters = ((d, office_days[d]) for d in range(first_day, last_day + 1)
+                                if d in office_days)
+            for day, counters in day_counters:
+                totals = buckets[bucket_start(day, interval)]
+                for (event, event_status, event_type), count in counters.items():
+                    if service_type is not None and event_type != service_type:
+                        continue
+                    if status is not None and event == "submitted" and event_status != status:
+                        continue
+                    totals[event] += count
+
+        return [
+            {"start": (EPOCH + timedelta(days=start)).isoformat(), **totals}
+            for start, totals in buckets.items()
+        ]
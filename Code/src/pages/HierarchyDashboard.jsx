@@ -2,7 +2,7 @@ import React, { useState, useEffect } from 'react'
 import { PieChart, Pie, BarChart, Bar, ScatterChart, Scatter, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer, Cell } from 'recharts'
 import { TrendingUp, Users, FileText, AlertCircle, Send, Mail, MailOpen, Inbox, Maximize2, X, Minimize2, ChevronDown, ChevronUp } from 'lucide-react'
 import { useAuth } from '../context/AuthContext'
-import { officeAPI } from '../services/api'
+import { officeAPI, subscribeToEvents } from '../services/api'
 
 const HierarchyDashboard = () => {
   const { user } = useAuth()
@@ -45,6 +45,39 @@ const HierarchyDashboard = () => {
     }
   }, [user])
 
+  // Refresh rolled-up stats when a monitored office changes, at most every 2 seconds
+  useEffect(() => {
+    if (!user?.is_monitor) return
+
+    let timer = null
+    const refreshStats = () => {
+      if (timer) return
+      timer = setTimeout(async () => {
+        timer = null
+        try {
+          setHierarchyData(await officeAPI.getHierarchyStats())
+        } catch (err) {
+          console.error('Failed to refresh hierarchy data:', err)
+        }
+      }, 2000)
+    }
+
+    const unsubscribe = subscribeToEvents({
+      application: refreshStats,
+      application_deleted: refreshStats,
+      message: (message) => setMessages(prev => [message, ...prev.filter(m => m.id !== message.id)]),
+      message_read: ({ id }) => setMessages(prev => prev.map(m => m.id === id ? { ...m, read: true } : m)),
+      resync: () => {
+        refreshStats()
+        loadMessages()
+      }
+    })
+    return () => {
+      unsubscribe()
+      clearTimeout(timer)
+    }
+  }, [user])
+
   // Handle ESC key to close maximized chart
   useEffect(() => {
     const handleEscKey = (e) => {
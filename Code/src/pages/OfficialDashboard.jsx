@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react'
 import { BarChart3, Users, Clock, CheckCircle, AlertTriangle, TrendingUp, MessageSquare, FileText, ArrowUpDown, RotateCcw, Trash2, XCircle, Mail, MailOpen, Inbox } from 'lucide-react'
-import { officeAPI, applicationAPI } from '../services/api'
+import { officeAPI, applicationAPI, subscribeToEvents } from '../services/api'
 import { useAuth } from '../context/AuthContext'
 
 const OfficialDashboard = () => {
@@ -32,6 +32,32 @@ const OfficialDashboard = () => {
     loadMessages()
   }, [])
 
+  // Apply pushed changes instead of re-fetching the whole office
+  useEffect(() => {
+    const refreshStats = () => {
+      officeAPI.getStats().then(setStats).catch(err => console.error('Failed to refresh stats:', err))
+    }
+
+    return subscribeToEvents({
+      application: (app) => {
+        setApplications(prev => prev.some(a => a.id === app.id)
+          ? prev.map(a => a.id === app.id ? app : a)
+          : [app, ...prev])
+        refreshStats()
+      },
+      application_deleted: ({ id }) => {
+        setApplications(prev => prev.filter(a => a.id !== id))
+        refreshStats()
+      },
+      message: (message) => setMessages(prev => [message, ...prev.filter(m => m.id !== message.id)]),
+      message_read: ({ id }) => setMessages(prev => prev.map(m => m.id === id ? { ...m, read: true } : m)),
+      resync: () => {
+        loadDashboardData()
+        loadMessages()
+      }
+    })
+  }, [])
+
   const loadMessages = async () => {
     try {
       const received = await officeAPI.getReceivedMessages()
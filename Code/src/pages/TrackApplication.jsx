@@ -10,7 +10,7 @@ import {
   Building2,
   Package,
 } from "lucide-react";
-import { applicationAPI } from "../services/api";
+import { applicationAPI, subscribeToEvents } from "../services/api";
 
 const TrackApplication = () => {
   const [searchParams] = useSearchParams();
@@ -27,6 +27,22 @@ const TrackApplication = () => {
     }
   }, [searchParams]);
 
+  // Follow status changes of the tracked application
+  useEffect(() => {
+    if (!application?.id) return;
+    const trackedId = application.id;
+
+    return subscribeToEvents(
+      {
+        application: (data) => {
+          if (data.id === trackedId) setApplication(data);
+        },
+        resync: () => handleSearch(trackedId),
+      },
+      { applications: [trackedId] }
+    );
+  }, [application?.id]);
+
   const handleSearch = async (id = applicationId) => {
     if (!id.trim()) return;
 
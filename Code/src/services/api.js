@@ -267,3 +267,28 @@ export const officeAPI = {
   }
 };
 
+
+// ============= EVENTS API =============
+
+// Subscribe to server-sent updates. handlers maps event names ('application',
+// 'application_deleted', 'message', 'message_read', 'resync') to callbacks.
+// Returns a function that closes the stream.
+export const subscribeToEvents = (handlers, { applications = [] } = {}) => {
+  const params = new URLSearchParams();
+  const token = getAuthToken();
+
+  // EventSource cannot send an Authorization header
+  if (token) {
+    params.set('token', token);
+  }
+  if (applications.length) {
+    params.set('applications', applications.join(','));
+  }
+
+  const source = new EventSource(`${API_BASE_URL}/events?${params}`);
+  Object.entries(handlers).forEach(([event, handler]) => {
+    source.addEventListener(event, (e) => handler(JSON.parse(e.data)));
+  });
+
+  return () => source.close();
+};